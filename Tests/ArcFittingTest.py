@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import math
+import StringIO
+
+from pycam.Geometry.Point import Point
+from pycam.Toolpath.ArcFitting import get_arc_segments
+from pycam.Exporters.GCodeExporter import GCodeGenerator, PATH_MODES
+
+
+TOLERANCE = 0.01
+
+def get_arc_points(center, radius, start_angle, end_angle, steps):
+    return [(center[0] + radius * math.cos(angle),
+                center[1] + radius * math.sin(angle), 0.0)
+            for angle in [start_angle + (end_angle - start_angle) * index \
+                / float(steps) for index in range(steps + 1)]]
+
+def check_segments(points, segments):
+    """ the segments cover all points and the arcs are close to them """
+    start = 0
+    for end, center, clockwise in segments:
+        assert end > start
+        if not center is None:
+            radius = math.hypot(points[start][0] - center[0],
+                    points[start][1] - center[1])
+            for point in points[start:end + 1]:
+                assert abs(math.hypot(point[0] - center[0],
+                        point[1] - center[1]) - radius) <= TOLERANCE
+        start = end
+    assert start == len(points) - 1
+
+def get_gcode_moves(text):
+    """ parse linear moves and arcs: (code, start, end, center) """
+    moves = []
+    position = {"X": None, "Y": None, "Z": None}
+    code = None
+    for line in text.splitlines():
+        words = line.split("(")[0].split()
+        values = {}
+        for word in words:
+            if word[0] == "G":
+                code = word
+            elif word[0] in "XYZIJ":
+                values[word[0]] = float(word[1:])
+        if not [key for key in values if key in "XYZ"]:
+            continue
+        start = (position["X"], position["Y"])
+        for key in "XYZ":
+            if key in values:
+                position[key] = values[key]
+        end = (position["X"], position["Y"])
+        if code in ("G2", "G3"):
+            center = (start[0] + values["I"], start[1] + values["J"])
+        else:
+            center = None
+        moves.append((code, start, end, center))
+    return moves
+
+
+if __name__ == "__main__":
+
+    # a single arc (counter-clockwise)
+    points = get_arc_points((1, 2), 5, 0, 1.5 * math.pi, 60)
+    segments = get_arc_segments(points, TOLERANCE)
+    check_segments(points, segments)
+    assert len(segments) == 1
+    end, center, clockwise = segments[0]
+    assert abs(center[0] - 1) < TOLERANCE and abs(center[1] - 2) < TOLERANCE
+    assert not clockwise
+    # the reversed arc is clockwise
+    segments = get_arc_segments(points[::-1], TOLERANCE)
+    assert [item[2] for item in segments] == [True]
+
+    # an arc followed by an arc in the opposite direction: the point of
+    # inflection ends a segment
+    first_arc = get_arc_points((0, 0), 5, 0, 0.5 * math.pi, 20)
+    second_arc = get_arc_points((0, 10), 5, -0.5 * math.pi, -math.pi, 20)
+    points = first_arc + second_arc[1:]
+    inflection = len(first_arc) - 1
+    segments = get_arc_segments(points, TOLERANCE)
+    check_segments(points, segments)
+    assert inflection in [item[0] for item in segments]
+
+    # the corners of squares and zigzag lines are kept as lines
+    for points in ([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 0)],
+            [(index, index % 2, 0) for index in range(10)],
+            [(index, 0, 0) for index in range(10)]):
+        segments = get_arc_segments(points, TOLERANCE)
+        check_segments(points, segments)
+        assert [item[1] for item in segments] == [None] * (len(points) - 1)
+
+    # GCode: arcs are written as G2/G3 with a consistent center
+    destination = StringIO.StringIO()
+    generator = GCodeGenerator(destination, safety_height=5)
+    generator.set_path_mode(PATH_MODES["exact_path"],
+            arc_tolerance=TOLERANCE)
+    moves = [(Point(5, 0, 5), True), (Point(5, 0, -1), False)]
+    # clockwise arc followed by a square corner
+    moves.extend([(Point(x, y, -1), False) for x, y, z
+            in get_arc_points((0, 0), 5, 0, -0.75 * math.pi, 40)[1:]])
+    moves.extend([(Point(-3, -6, -1), False), (Point(0, -6, -1), False)])
+    # counter-clockwise arc
+    moves.extend([(Point(x, y, -1), False) for x, y, z
+            in get_arc_points((0, -3), 3, -0.5 * math.pi, 0.5 * math.pi,
+                30)[1:]])
+    generator.add_moves(moves)
+    generator.finish()
+    gcode_moves = get_gcode_moves(destination.getvalue())
+    arcs = [move for move in gcode_moves if move[0] in ("G2", "G3")]
+    assert [move[0] for move in arcs] == ["G2", "G3"], arcs
+    for code, start, end, center in arcs:
+        # the start and the end of an arc have the same distance from its
+        # center (apart from the rounding of the coordinates)
+        start_radius = math.hypot(start[0] - center[0], start[1] - center[1])
+        end_radius = math.hypot(end[0] - center[0], end[1] - center[1])
+        assert abs(start_radius - end_radius) < 0.001, \
+                (code, start, end, center)
+    assert abs(arcs[0][3][0]) < 0.001 and abs(arcs[0][3][1]) < 0.001
+    assert abs(arcs[1][3][0]) < 0.001 and abs(arcs[1][3][1] + 3) < 0.001
+    # the corner of the square part is kept as a straight line
+    line_ends = [move[2] for move in gcode_moves if move[0] == "G1"]
+    assert (-3, -6) in line_ends and (0, -6) in line_ends, line_ends
+    print "OK"
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import time
+
+from pycam.Geometry.Point import Point
+from pycam.Geometry.utils import INFINITE
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Importers.TestModel import get_test_model
+
+
+if __name__ == "__main__":
+
+    model = get_test_model()
+    triangles = model.get_triangle_arrays()
+    print "# triangles:", len(triangles)
+    steps = 60
+    xs = [-7 + 14.0 * index / steps for index in range(steps + 1)]
+    ys = [0.3] * len(xs)
+
+    # The scalar ToroidalCutter samples the edges of the triangles at
+    # discrete points (see "intersect_torus_edge"). Thus it underestimates
+    # the contact height with edges, while the batch calculation finds the
+    # exact maximum.
+    for cutter, tolerance in ((CylindricalCutter(1), 1e-9),
+            (SphericalCutter(1), 1e-9), (ToroidalCutter(1, 0.25), 1e-3)):
+        start = time.time()
+        batch_heights = cutter.drop_batch(triangles, xs, ys)
+        batch_time = time.time() - start
+        start = time.time()
+        max_diff = 0
+        for x, y, batch_height in zip(xs, ys, batch_heights):
+            height = -INFINITE
+            for t in model.triangles():
+                cl = cutter.drop(t, start=Point(x, y, 10))
+                if cl and (cl.z > height):
+                    height = cl.z
+            max_diff = max(max_diff, abs(height - batch_height))
+            assert batch_height > height - 1e-9, \
+                    "%s: batch height below scalar height at (%g, %g)" \
+                    % (cutter, x, y)
+        scalar_time = time.time() - start
+        print "%s: max. difference = %g (batch: %fs, scalar: %fs)" \
+                % (cutter, max_diff, batch_time, scalar_time)
+        assert max_diff < tolerance, "%s: difference %g exceeds %g" \
+                % (cutter, max_diff, tolerance)
+    print "OK"
+
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import random
+
+import numpy
+
+from pycam.Geometry.TriangleKdtree import FlatTriangleKdtree
+from pycam.Importers.TestModel import get_test_model
+
+
+def get_random_boxes(count, size):
+    minx = [random.uniform(-10, 10) for index in range(count)]
+    miny = [random.uniform(-10, 10) for index in range(count)]
+    maxx = [x + random.uniform(0, size) for x in minx]
+    maxy = [y + random.uniform(0, size) for y in miny]
+    return minx, maxx, miny, maxy
+
+def get_brute_force_result(boxes, minx, maxx, miny, maxy):
+    return set([index for index, (bminx, bmaxx, bminy, bmaxy)
+            in enumerate(zip(*boxes))
+            if (bminx <= maxx) and (bmaxx >= minx) and (bminy <= maxy)
+                and (bmaxy >= miny)])
+
+def check_tree(tree, boxes, queries):
+    for query in zip(*queries):
+        expected = get_brute_force_result(boxes, *query)
+        result = tree.search(*query).tolist()
+        assert len(result) == len(set(result)), "duplicate results"
+        assert set(result) == expected, \
+                "search %s: %s instead of %s" % (query, result, expected)
+    box_indices, items = tree.search_bulk(*queries)
+    assert len(box_indices) == len(items)
+    bulk_results = [set() for query in queries[0]]
+    for box_index, item in zip(box_indices.tolist(), items.tolist()):
+        assert not item in bulk_results[box_index], "duplicate bulk results"
+        bulk_results[box_index].add(item)
+    for query, bulk_result in zip(zip(*queries), bulk_results):
+        assert bulk_result == get_brute_force_result(boxes, *query), \
+                "search_bulk %s" % str(query)
+
+
+if __name__ == "__main__":
+
+    random.seed(42)
+    for count in (0, 1, 15, 16, 17, 100, 1000):
+        for size in (0, 0.5, 5):
+            boxes = get_random_boxes(count, size)
+            queries = [list(values) for values in get_random_boxes(50, 3)]
+            # a point, a rectangle covering everything and one outside
+            for query, values in zip(queries, ((1, -20, 30), (1, 20, 31),
+                    (1, -20, 30), (1, 20, 31))):
+                query.extend(values)
+            for bucket_size in (1, 4, 16):
+                tree = FlatTriangleKdtree(*boxes, bucket_size=bucket_size)
+                check_tree(tree, boxes, queries)
+                # restore the tree from its arrays
+                order, leaf_bounds = tree.get_arrays()
+                restored = FlatTriangleKdtree(*boxes,
+                        bucket_size=bucket_size, order=order,
+                        leaf_bounds=[leaf_bounds[dim] for dim in range(4)])
+                check_tree(restored, boxes, queries)
+    # the triangles of a model (including shared bounds)
+    triangles = get_test_model().triangles()
+    boxes = [[t.minx for t in triangles], [t.maxx for t in triangles],
+            [t.miny for t in triangles], [t.maxy for t in triangles]]
+    tree = FlatTriangleKdtree.from_triangles(triangles, bucket_size=2)
+    queries = [numpy.linspace(-8, 8, 17), numpy.linspace(-7, 9, 17),
+            numpy.linspace(-8, 8, 17)[::-1], numpy.linspace(-7, 9, 17)[::-1]]
+    queries[2], queries[3] = numpy.minimum(queries[2], queries[3]), \
+            numpy.maximum(queries[2], queries[3])
+    check_tree(tree, boxes, queries)
+    print "OK"
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+
+import sys
+sys.path.insert(0,'.')
+
+import math
+import time
+
+from pycam.Geometry.Point import Point
+from pycam.Cutters.SphericalCutter import SphericalCutter
+from pycam.Cutters.CylindricalCutter import CylindricalCutter
+from pycam.Cutters.ToroidalCutter import ToroidalCutter
+from pycam.Importers.TestModel import get_test_model
+from pycam.Simulation.HeightMap import HeightMap
+
+
+def get_expected_height(cutter, distance, cut_height, stock_height):
+    """ the height of the material at a given horizontal distance from the
+    path of the cutter tip
+    """
+    if distance >= cutter.radius:
+        return stock_height
+    if isinstance(cutter, CylindricalCutter):
+        return cut_height
+    elif isinstance(cutter, SphericalCutter):
+        return cut_height + cutter.radius \
+                - math.sqrt(cutter.radius ** 2 - distance ** 2)
+    else:
+        flat_radius = cutter.majorradius
+        if distance <= flat_radius:
+            return cut_height
+        return cut_height + cutter.minorradius \
+                - math.sqrt(cutter.minorradius ** 2 \
+                    - (distance - flat_radius) ** 2)
+
+def check_straight_move(cutter):
+    """ compare the result of a single horizontal move with the analytic
+    shape of the groove
+    """
+    start_x, end_x, cut_height, stock_height = -2.0, 2.0, 0.5, 2.0
+    height_map = HeightMap((-5, -3, 0), (5, 3, stock_height), 0.1)
+    height_map.simulate([(Point(start_x, 0, cut_height), False),
+            (Point(end_x, 0, cut_height), False)], cutter)
+    for row in range(height_map.yres):
+        y = height_map.miny + (row + 0.5) * height_map.dy
+        for col in range(height_map.xres):
+            x = height_map.minx + (col + 0.5) * height_map.dx
+            # distance from the straight line including its round ends
+            nearest_x = min(max(x, start_x), end_x)
+            distance = math.hypot(x - nearest_x, y)
+            expected = get_expected_height(cutter, distance, cut_height,
+                    stock_height)
+            assert abs(height_map.z[row, col] - expected) < 1e-9, \
+                    "%s: height at (%g, %g) is %g instead of %g" \
+                    % (cutter, x, y, height_map.z[row, col], expected)
+
+
+if __name__ == "__main__":
+
+    for cutter in (CylindricalCutter(1.0), SphericalCutter(1.0),
+            ToroidalCutter(1.0, 0.25)):
+        check_straight_move(cutter)
+
+    model = get_test_model()
+    triangles = model.get_triangle_arrays()
+    cutter = SphericalCutter(0.5)
+    low = (model.minx - 1, model.miny - 1, model.minz)
+    high = (model.maxx + 1, model.maxy + 1, model.maxz + 0.5)
+    # a simple finishing pass (DropCutter along the x axis)
+    moves = [(Point(low[0], low[1], high[2]), True)]
+    steps = 240
+    xs = [low[0] + (high[0] - low[0]) * index / steps
+            for index in range(steps + 1)]
+    y = low[1]
+    while y <= high[1]:
+        heights = cutter.drop_batch(triangles, xs, [y] * len(xs))
+        for x, z in zip(xs, heights):
+            moves.append((Point(x, y, max(z, low[2])), False))
+        xs.reverse()
+        y += 0.1
+    print "# moves:", len(moves)
+    height_map = HeightMap(low, high, 0.02)
+    start = time.time()
+    height_map.simulate(moves, cutter, model=model)
+    print "simulation time: %fs (%d x %d)" % (time.time() - start,
+            height_map.xres, height_map.yres)
+    stats = height_map.get_statistics()
+    for key in sorted(stats.keys()):
+        print "%s: %g" % (key, stats[key])
+    assert stats["removed_volume"] > 0
+    assert stats["min_height"] >= low[2]
+    # the drop cutter path follows the model closely
+    assert stats["max_gouge"] < 0.005
+    print "OK"
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import random
+import time
+
+from pycam.Geometry.Point import Point
+from pycam.Geometry.Path import Path
+from pycam.Toolpath import Toolpath
+from pycam.Toolpath.PathOrder import EndpointGrid, get_path_order
+
+
+def get_square_path(x, y, z, size):
+    path = Path()
+    for px, py in ((x, y), (x + size, y), (x + size, y + size),
+            (x, y + size), (x, y)):
+        path.append(Point(px, py, z))
+    return path
+
+def get_nearest_brute_force(locations, location):
+    distances = [sum([(a - b) ** 2 for a, b in zip(other, location)])
+            for other in locations]
+    return distances.index(min(distances))
+
+
+if __name__ == "__main__":
+
+    # single-path layers (zero-size grids) far away from each other
+    paths = [get_square_path(50 * index, 0, -index, 10) for index in range(5)]
+    toolpath = Toolpath(paths)
+    start = time.time()
+    toolpath.optimize_path_order(safety_height=5)
+    duration = time.time() - start
+    print "single-path layers: %fs" % duration
+    assert duration < 5
+    assert len(toolpath.paths) == len(paths)
+
+    # trivial orders (one and two paths)
+    order, flipped = get_path_order([(10, 0, 0)], [(20, 0, 0)], (1000, 0, 0))
+    assert (order, flipped) == ([0], [False])
+    order, flipped = get_path_order([(10, 0, 0)], [(20, 0, 0)], (1000, 0, 0),
+            allow_reverse=True)
+    assert (order, flipped) == ([0], [True])
+    order, flipped = get_path_order([(0, 0, 0), (100, 0, 0)],
+            [(10, 0, 0), (90, 0, 0)], (200, 0, 0), allow_reverse=True)
+    assert (order, flipped) == ([1, 0], [False, True])
+
+    # the nearest neighbour search of the grid (including queries far away
+    # from the grid and locations along a line)
+    random.seed(1)
+    for locations in ([(random.uniform(0, 100), random.uniform(0, 50), 0)
+                for index in range(300)],
+            [(random.uniform(0, 100), 3, 0) for index in range(300)]):
+        grid = EndpointGrid(locations)
+        for query in range(100):
+            location = (random.uniform(-1000, 1000),
+                    random.uniform(-1000, 1000), 0)
+            assert grid.get_nearest(location) \
+                    == get_nearest_brute_force(locations, location)
+
+    # every path is used exactly once
+    starts = [(random.uniform(0, 100), random.uniform(0, 100), 0)
+            for index in range(200)]
+    ends = [(x + 1, y, z) for x, y, z in starts]
+    order, flipped = get_path_order(starts, ends, (0, 0, 0),
+            allow_reverse=True, time_budget=1)
+    assert sorted(order) == range(len(starts))
+    print "OK"
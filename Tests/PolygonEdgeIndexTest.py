@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import math
+import random
+
+from pycam.Geometry.Point import Point
+from pycam.Geometry.Line import Line
+from pycam.Geometry.Polygon import Polygon, PolygonEdgeIndex
+
+
+def get_star_points(count, inner_radius, outer_radius):
+    """ a spiky polygon: most edges span a large part of its height """
+    points = []
+    for index in range(count):
+        angle = 2 * math.pi * index / count
+        if index % 2 == 0:
+            radius = outer_radius
+        else:
+            radius = inner_radius
+        points.append(Point(round(radius * math.cos(angle), 3),
+                round(radius * math.sin(angle), 3), 0))
+    return points
+
+def get_polygon(points):
+    polygon = Polygon()
+    for index in range(len(points)):
+        polygon.append(Line(points[index - 1], points[index]))
+    return polygon
+
+
+if __name__ == "__main__":
+
+    random.seed(7)
+    points = get_star_points(400, 1, 10)
+    ys = [random.uniform(-11, 11) for index in range(200)] \
+            + [point.y for point in points[:50]]
+    for is_closed in (True, False):
+        index = PolygonEdgeIndex(points, is_closed)
+        assert len(index.edges) == len(points) - (0 if is_closed else 1)
+        for y in ys:
+            # the same edges as a linear scan
+            crossing = [edge_index for edge_index, (x1, y1, x2, y2)
+                    in enumerate(index.edges)
+                    if min(y1, y2) < y <= max(y1, y2)]
+            assert sorted(index.get_crossing_edges(y)) == crossing
+            in_range = [edge_index for edge_index, (x1, y1, x2, y2)
+                    in enumerate(index.edges)
+                    if (min(y1, y2) <= y + 1) and (max(y1, y2) >= y)]
+            assert index.get_edges_in_range(y, y + 1) == in_range
+    # single queries (linear scan) and bulk queries (edge index) agree
+    queries = [Point(random.uniform(-11, 11), random.uniform(-11, 11), 0)
+            for index in range(300)]
+    polygon = get_polygon(points)
+    single = [polygon.is_point_inside(point) for point in queries]
+    assert polygon._edge_index is None
+    assert polygon.are_points_inside(queries) == single
+    assert polygon._edge_index is not None
+    assert [polygon.is_point_inside(point) for point in queries] == single
+    assert True in single and False in single
+    # the pieces of a split line alternate between inside and outside
+    inner, outer = polygon.split_line(Line(Point(-11, 0.5, 0),
+            Point(11, 0.5, 0)))
+    assert inner and outer
+    for line in inner:
+        middle = line.p1.add(line.p2).div(2)
+        assert polygon.is_point_inside(middle)
+    print "OK"
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import math
+
+from pycam.Geometry.PolygonOffset import get_offset_contours, MITER_LIMIT
+
+
+def get_area(points):
+    """ signed area (positive for counter-clockwise contours) """
+    area = 0
+    for index in range(len(points)):
+        (x1, y1), (x2, y2) = points[index - 1], points[index]
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+def get_areas(contours, offset):
+    return sorted([get_area(points)
+            for points in get_offset_contours(contours, offset)])
+
+def assert_areas(contours, offset, expected, tolerance=1e-6):
+    areas = get_areas(contours, offset)
+    assert len(areas) == len(expected), \
+            "offset %g: areas %s instead of %s" % (offset, areas, expected)
+    for area, expected_area in zip(areas, sorted(expected)):
+        assert abs(area - expected_area) <= tolerance, \
+                "offset %g: areas %s instead of %s" % (offset, areas, expected)
+
+
+if __name__ == "__main__":
+
+    square = [(0, 0), (10, 0), (10, 10), (0, 10)]
+    assert_areas([(square, True)], 1, [144])
+    assert_areas([(square, True)], -1, [64])
+    assert_areas([(square, True)], 0, [100])
+    # shrinking beyond the size of the area removes it
+    assert_areas([(square, True)], -6, [])
+    # an area with a hole (the hole shrinks if the area grows)
+    outer = [(0, 0), (20, 0), (20, 20), (0, 20)]
+    inner = [(5, 5), (5, 15), (15, 15), (15, 5)]
+    assert_areas([(outer, True), (inner, True)], -1, [324, -144])
+    assert_areas([(outer, True), (inner, True)], 1, [484, -64])
+    assert_areas([(outer, True), (inner, True)], -3, [])
+    # the thin base of a U-shape disappears: the arms are separated
+    u_shape = [(0, 0), (10, 0), (10, 10), (8, 10), (8, 1), (2, 1), (2, 10),
+            (0, 10)]
+    assert_areas([(u_shape, True)], -0.6, [0.8 * 8.8, 0.8 * 8.8])
+    # overlapping areas are merged
+    shifted = [(x + 5, y + 5) for x, y in square]
+    assert_areas([(square, True), (shifted, True)], 0, [175])
+    assert_areas([(square, True), (shifted, True)], 1, [144 + 144 - 7 * 7])
+    # open lines are surrounded with round caps
+    areas = get_areas([([(0, 0), (10, 0)], False)], 1)
+    assert len(areas) == 1
+    assert abs(areas[0] - (20 + math.pi)) < 0.01, areas
+    # a circle
+    count = 360
+    circle = [(50 * math.cos(2 * math.pi * index / count),
+            50 * math.sin(2 * math.pi * index / count))
+            for index in range(count)]
+    polygon_area = get_area(circle)
+    areas = get_areas([(circle, True)], -2)
+    assert len(areas) == 1
+    assert abs(areas[0] / polygon_area - (48.0 / 50) ** 2) < 1e-4, areas
+    # Outside corners sharper than the miter limit are cut off: the tip of
+    # a thin triangle does not exceed the distance "MITER_LIMIT * offset".
+    offset = 0.5
+    triangle = [(0, 0), (10, 0), (0, 1)]
+    result = get_offset_contours([(triangle, True)], offset)
+    assert len(result) == 1
+    max_x = max([x for x, y in result[0]])
+    assert 10 + offset < max_x <= 10 + MITER_LIMIT * offset + 1e-6, max_x
+    # right angles are not cut off (see the square above)
+    print "OK"
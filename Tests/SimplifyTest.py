@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+sys.path.insert(0,'.')
+
+import math
+import random
+
+from pycam.Geometry.Point import Point
+from pycam.Geometry.utils import epsilon
+import pycam.Toolpath.Simplify
+from pycam.Toolpath.Simplify import get_simplified_indices, \
+        get_simplified_mask
+from pycam.PathProcessors.PathAccumulator import PathAccumulator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def get_distance_to_segment(point, start, end):
+    vector = [end[i] - start[i] for i in range(3)]
+    offset = [point[i] - start[i] for i in range(3)]
+    length_sq = sum([value * value for value in vector])
+    if length_sq > 0:
+        factor = sum([offset[i] * vector[i] for i in range(3)]) / length_sq
+        factor = min(1, max(0, factor))
+        offset = [offset[i] - factor * vector[i] for i in range(3)]
+    return math.sqrt(sum([value * value for value in offset]))
+
+def check_simplified(coords, kept, tolerance):
+    """ the first and the last point are kept and all removed points are close
+    to the straight line between their remaining neighbours
+    """
+    assert kept[0] == 0 and kept[-1] == len(coords) - 1
+    assert kept == sorted(set(kept))
+    for first, last in zip(kept[:-1], kept[1:]):
+        for index in range(first + 1, last):
+            assert get_distance_to_segment(coords[index], coords[first],
+                    coords[last]) <= tolerance * (1 + 1e-9)
+
+def get_paths(count):
+    """ random walks, zigzag lines and random points on a small grid """
+    random.seed(3)
+    paths = []
+    for path_index in range(count):
+        coords = []
+        x = y = 0
+        for index in range(random.randint(1, 200)):
+            if path_index % 3 == 0:
+                x += random.random()
+                y += random.gauss(0, 0.1)
+            elif path_index % 3 == 1:
+                x += 1
+                y = (index // 7) % 2
+            else:
+                x, y = random.randint(0, 3), random.randint(0, 3)
+            coords.append((float(x), float(y), 0.0))
+        paths.append(coords)
+    return paths
+
+
+if __name__ == "__main__":
+
+    # default tolerance: only points on a straight line are removed
+    coords = [(index, 0, 0) for index in range(10)] \
+            + [(9, index, 0) for index in range(1, 5)] \
+            + [(10, 4.001, 0), (11, 4, 0), (12, 4, 0)]
+    assert get_simplified_indices(coords) == [0, 9, 13, 14, 15, 16]
+    # a small bump is removed by a bigger tolerance
+    assert get_simplified_indices(coords, tolerance=0.01) == [0, 9, 13, 16]
+    # sine curve: the deviation stays below the tolerance
+    coords = [(0.01 * index, math.sin(0.01 * index), 0)
+            for index in range(2000)]
+    for tolerance in (epsilon, 0.001, 0.01, 0.1):
+        kept = get_simplified_indices(coords, tolerance=tolerance)
+        check_simplified(coords, kept, tolerance)
+        assert len(kept) < len(coords)
+    # short and long paths with and without numpy give the same result
+    for path_index, coords in enumerate(get_paths(300)):
+        tolerance = (None, 0.01, 0.1, 0.5)[path_index % 4]
+        kept = get_simplified_indices(coords, tolerance=tolerance)
+        check_simplified(coords, kept, tolerance or epsilon)
+        if numpy:
+            saved_numpy = pycam.Toolpath.Simplify.numpy
+            pycam.Toolpath.Simplify.numpy = None
+            try:
+                assert get_simplified_indices(coords,
+                        tolerance=tolerance) == kept
+            finally:
+                pycam.Toolpath.Simplify.numpy = saved_numpy
+            mask = get_simplified_mask(numpy.array(coords).reshape(-1, 3),
+                    [0, len(coords)], tolerance=tolerance)
+            assert numpy.nonzero(mask)[0].tolist() == kept
+    # multiple paths (including empty and short ones) at once
+    if numpy:
+        points = numpy.array([(index, 0, 0) for index in range(10)],
+                dtype=numpy.float64)
+        mask = get_simplified_mask(points, [0, 0, 2, 2, 10, 10])
+        assert numpy.nonzero(mask)[0].tolist() == [0, 1, 2, 9]
+    # the path processors use the given tolerance
+    for tolerance, expected in ((None, 6), (0.01, 3)):
+        processor = PathAccumulator(tolerance=tolerance)
+        processor.new_direction(0)
+        processor.new_scanline()
+        for point in ((0, 0, 0), (1, 0, 0), (2, 0.001, 0), (3, 0, 0),
+                (4, 0, 0), (4, 1, 0)):
+            processor.append(Point(*point))
+        processor.end_scanline()
+        assert [len(path.points) for path in processor.paths] == [expected]
+    print "OK"
@@ -29,6 +29,11 @@ from pycam.Geometry.intersection import intersect_cylinder_point, \
         intersect_cylinder_line
 import uuid
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class BaseCutter(IDGenerator):
 
@@ -133,6 +138,80 @@ class BaseCutter(IDGenerator):
 
         return self.intersect(BaseCutter.vertical, triangle, start=start)[0]
 
+    def drop_batch(self, triangles, xs, ys):
+        """ Calculate the drop height of the cutter for many positions at once.
+        This is the vectorized equivalent of "drop". It requires numpy.
+
+        @param triangles: the triangles to be checked
+        @type triangles: pycam.Geometry.TriangleArrays.TriangleArrays
+        @param xs: x coordinates of the cutter locations
+        @type xs: numpy.ndarray
+        @param ys: y coordinates of the cutter locations
+        @type ys: numpy.ndarray
+        @returns: the highest cutter location (z) for every position; positions
+            without any contact are set to -INFINITE
+        @rtype: numpy.ndarray
+        """
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        result = numpy.empty(len(xs))
+        result.fill(-INFINITE)
+        for pos_indices, tri_indices in triangles.get_candidate_pairs(xs, ys,
+                self.distance_radius + epsilon):
+            heights = self.get_drop_heights(triangles, tri_indices,
+                    xs[pos_indices], ys[pos_indices])
+            # The position indices are sorted - thus we can combine the
+            # results for each position via "reduceat".
+            starts = numpy.nonzero(numpy.diff(pos_indices))[0] + 1
+            starts = numpy.concatenate(([0], starts))
+            maxima = numpy.maximum.reduceat(heights, starts)
+            targets = pos_indices[starts]
+            result[targets] = numpy.maximum(result[targets], maxima)
+        return result
+
+    def get_drop_heights(self, triangles, tri_indices, xs, ys):
+        """ Calculate the drop height for pairs of triangles and positions.
+        All parameters are arrays of equal length. Pairs without a contact
+        return -INFINITE.
+        This method is used by "drop_batch" and needs to be implemented by
+        all cutter shapes.
+        """
+        raise NotImplementedError("Inherited class of BaseCutter does not " \
+                + "implement the required function 'get_drop_heights'.")
+
+    def get_profile_heights(self, dist):
+        """ Return the height of the lower surface of the cutter (relative to
+        its location) for the given horizontal distances from its axis.
+        Distances beyond the radius of the cutter return INFINITE. The
+        required distance (model margin) is ignored.
+        This method is used by the simulation and needs to be implemented by
+        all cutter shapes.
+        """
+        raise NotImplementedError("Inherited class of BaseCutter does not " \
+                + "implement the required function 'get_profile_heights'.")
+
+    def _get_edge_intervals(self, starts, ends, xs, ys, radius):
+        """ Calculate the part of each edge, that is within the given
+        horizontal distance of the positions (xs, ys).
+        @returns: the interval (t0, t1) along each edge (clipped to 0..1) and
+            a mask of the valid (non-empty) intervals
+        """
+        dx = ends[:, 0] - starts[:, 0]
+        dy = ends[:, 1] - starts[:, 1]
+        wx = starts[:, 0] - xs
+        wy = starts[:, 1] - ys
+        a = dx * dx + dy * dy
+        b = dx * wx + dy * wy
+        c = wx * wx + wy * wy - radius * radius
+        disc = b * b - a * c
+        # vertical edges are handled as vertices
+        valid = (a > 0) & (disc >= 0)
+        a = numpy.where(valid, a, 1)
+        root = numpy.sqrt(numpy.where(valid, disc, 0))
+        t0 = numpy.maximum((-b - root) / a, 0)
+        t1 = numpy.minimum((-b + root) / a, 1)
+        return t0, t1, valid & (t0 <= t1)
+
     def intersect_circle_triangle(self, direction, triangle, start=None):
         (cl, ccp, cp, d) = self.intersect_circle_plane(direction, triangle,
                 start=start)
@@ -27,6 +27,10 @@ from pycam.Geometry.intersection import intersect_circle_plane, \
         intersect_circle_point, intersect_circle_line
 from pycam.Cutters.BaseCutter import BaseCutter
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 try:
     import OpenGL.GL as GL
@@ -134,6 +138,46 @@ class CylindricalCutter(BaseCutter):
         self.center = Point(location.x, location.y,
                 location.z - self.get_required_distance())
 
+    def get_profile_heights(self, dist):
+        dist = numpy.asarray(dist, dtype=numpy.float64)
+        return numpy.where(dist <= self.radius, 0.0, INFINITE)
+
+    def get_drop_heights(self, triangles, tri_indices, xs, ys):
+        radius = self.distance_radius
+        # the bottom of the cutter is shifted down by the required distance
+        offset = self.get_required_distance()
+        result = numpy.empty(len(tri_indices))
+        result.fill(-INFINITE)
+        # contact with the plane of the triangle: the contact point is at the
+        # border of the circle (in the direction of the plane's ascent)
+        normals = triangles.get_upward_normals(tri_indices)
+        nxy = numpy.sqrt(normals[:, 0] ** 2 + normals[:, 1] ** 2)
+        nxy_valid = numpy.where(nxy > 0, nxy, 1)
+        cp_x = xs - radius * normals[:, 0] / nxy_valid
+        cp_y = ys - radius * normals[:, 1] / nxy_valid
+        valid = (normals[:, 2] > 0) \
+                & triangles.is_point_inside(tri_indices, cp_x, cp_y)
+        heights = triangles.get_plane_heights(tri_indices, cp_x, cp_y) + offset
+        result = numpy.where(valid, numpy.maximum(result, heights), result)
+        # contact with the edges and vertices: the highest point of the part
+        # of an edge below the circle is one of the ends of this part
+        for starts, ends in triangles.get_edges():
+            starts = starts[tri_indices]
+            ends = ends[tri_indices]
+            t0, t1, valid = self._get_edge_intervals(starts, ends, xs, ys,
+                    radius)
+            dz = ends[:, 2] - starts[:, 2]
+            heights = starts[:, 2] + numpy.maximum(t0 * dz, t1 * dz) + offset
+            result = numpy.where(valid, numpy.maximum(result, heights), result)
+        # single vertices (only necessary for vertical edges)
+        for vertices in triangles.get_vertices():
+            vertices = vertices[tri_indices]
+            dist_sq = (vertices[:, 0] - xs) ** 2 + (vertices[:, 1] - ys) ** 2
+            heights = vertices[:, 2] + offset
+            result = numpy.where(dist_sq <= radius * radius,
+                    numpy.maximum(result, heights), result)
+        return result
+
     def intersect_circle_plane(self, direction, triangle, start=None):
         if start is None:
             start = self.location
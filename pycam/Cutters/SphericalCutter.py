@@ -28,6 +28,10 @@ from pycam.Geometry.intersection import intersect_sphere_plane, \
         intersect_sphere_point, intersect_sphere_line
 from pycam.Cutters.BaseCutter import BaseCutter
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 try:
     import OpenGL.GL as GL
@@ -143,6 +147,70 @@ class SphericalCutter(BaseCutter):
         BaseCutter.moveto(self, location, **kwargs)
         self.center = Point(location.x, location.y, location.z + self.radius)
 
+    def get_profile_heights(self, dist):
+        dist = numpy.asarray(dist, dtype=numpy.float64)
+        inside = dist <= self.radius
+        heights = self.radius - numpy.sqrt(numpy.maximum(
+                self.radiussq - dist * dist, 0))
+        return numpy.where(inside, heights, INFINITE)
+
+    def get_drop_heights(self, triangles, tri_indices, xs, ys):
+        radius = self.distance_radius
+        radiussq = self.distance_radiussq
+        result = numpy.empty(len(tri_indices))
+        result.fill(-INFINITE)
+        # Contact with the plane of the triangle: the center of the sphere is
+        # located at a distance of "radius" along the normal of the plane.
+        normals = triangles.get_upward_normals(tri_indices)
+        p1 = triangles.p1[tri_indices]
+        nz_valid = numpy.where(normals[:, 2] > 0, normals[:, 2], 1)
+        center_z = p1[:, 2] + (radius - normals[:, 0] * (xs - p1[:, 0]) \
+                - normals[:, 1] * (ys - p1[:, 1])) / nz_valid
+        cp_x = xs - radius * normals[:, 0]
+        cp_y = ys - radius * normals[:, 1]
+        valid = (normals[:, 2] > 0) \
+                & triangles.is_point_inside(tri_indices, cp_x, cp_y)
+        heights = center_z - self.radius
+        result = numpy.where(valid, numpy.maximum(result, heights), result)
+        # contact with the edges: the distance between the center of the sphere
+        # and the line equals the radius
+        for starts, ends in triangles.get_edges():
+            starts = starts[tri_indices]
+            ends = ends[tri_indices]
+            direction = ends - starts
+            length = numpy.sqrt((direction ** 2).sum(axis=1))
+            length = numpy.where(length > 0, length, 1)
+            ux = direction[:, 0] / length
+            uy = direction[:, 1] / length
+            uz = direction[:, 2] / length
+            wx = xs - starts[:, 0]
+            wy = ys - starts[:, 1]
+            k = wx * ux + wy * uy
+            # quadratic equation for the height of the sphere's center
+            # (relative to the start of the edge)
+            a = ux * ux + uy * uy
+            b = -2 * k * uz
+            c = wx * wx + wy * wy - k * k - radiussq
+            disc = b * b - 4 * a * c
+            # vertical edges are handled as vertices
+            valid = (a > 0) & (disc >= 0)
+            a = numpy.where(valid, a, 1)
+            rel_z = (-b + numpy.sqrt(numpy.where(valid, disc, 0))) / (2 * a)
+            # the position of the contact point along the edge
+            t = (k + rel_z * uz) / length
+            valid &= (t >= 0) & (t <= 1)
+            heights = starts[:, 2] + rel_z - self.radius
+            result = numpy.where(valid, numpy.maximum(result, heights), result)
+        # contact with the vertices
+        for vertices in triangles.get_vertices():
+            vertices = vertices[tri_indices]
+            dist_sq = (vertices[:, 0] - xs) ** 2 + (vertices[:, 1] - ys) ** 2
+            valid = dist_sq <= radiussq
+            heights = vertices[:, 2] - self.radius \
+                    + numpy.sqrt(numpy.where(valid, radiussq - dist_sq, 0))
+            result = numpy.where(valid, numpy.maximum(result, heights), result)
+        return result
+
     def intersect_sphere_plane(self, direction, triangle, start=None):
         if start is None:
             start = self.location
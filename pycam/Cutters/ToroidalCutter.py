@@ -28,6 +28,10 @@ from pycam.Geometry.intersection import intersect_torus_plane, \
         intersect_cylinder_point, intersect_cylinder_line, intersect_circle_line
 from pycam.Cutters.BaseCutter import BaseCutter
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 try:
     import OpenGL.GL as GL
@@ -115,6 +119,89 @@ class ToroidalCutter(BaseCutter):
         BaseCutter.moveto(self, location, **kwargs)
         self.center = Point(location.x, location.y, location.z+self.minorradius)
 
+    def get_profile_heights(self, dist):
+        dist = numpy.asarray(dist, dtype=numpy.float64)
+        inside = dist <= self.radius
+        outside = numpy.maximum(dist - self.majorradius, 0)
+        heights = self.minorradius - numpy.sqrt(numpy.maximum(
+                self.minorradiussq - outside * outside, 0))
+        return numpy.where(inside, heights, INFINITE)
+
+    def _get_profile_heights(self, dist):
+        """ Return the height of the cutter's lower surface (relative to the
+        cutter location) for the given horizontal distances from its axis.
+        The inner part of the torus is treated as a flat disk at the level of
+        the lowest point of the tube.
+        """
+        outside = numpy.maximum(dist - self.distance_majorradius, 0)
+        return self.minorradius - numpy.sqrt(numpy.maximum(
+                self.distance_minorradiussq - outside * outside, 0))
+
+    def get_drop_heights(self, triangles, tri_indices, xs, ys):
+        major = self.distance_majorradius
+        minor = self.distance_minorradius
+        outer_radius = major + minor
+        result = numpy.empty(len(tri_indices))
+        result.fill(-INFINITE)
+        # Contact with the plane of the triangle: the tube touches the plane
+        # at the side of the plane's ascent.
+        normals = triangles.get_upward_normals(tri_indices)
+        p1 = triangles.p1[tri_indices]
+        nxy = numpy.sqrt(normals[:, 0] ** 2 + normals[:, 1] ** 2)
+        nxy_valid = numpy.where(nxy > 0, nxy, 1)
+        nz_valid = numpy.where(normals[:, 2] > 0, normals[:, 2], 1)
+        ring_x = xs - major * normals[:, 0] / nxy_valid
+        ring_y = ys - major * normals[:, 1] / nxy_valid
+        center_z = p1[:, 2] + (minor - normals[:, 0] * (ring_x - p1[:, 0]) \
+                - normals[:, 1] * (ring_y - p1[:, 1])) / nz_valid
+        cp_x = ring_x - minor * normals[:, 0]
+        cp_y = ring_y - minor * normals[:, 1]
+        valid = (normals[:, 2] > 0) \
+                & triangles.is_point_inside(tri_indices, cp_x, cp_y)
+        heights = center_z - self.minorradius
+        result = numpy.where(valid, numpy.maximum(result, heights), result)
+        # Contact with the edges: the height along the edge minus the profile
+        # of the cutter is a concave function. Thus a golden section search
+        # finds its maximum.
+        golden = (numpy.sqrt(5) - 1) / 2
+        for starts, ends in triangles.get_edges():
+            starts = starts[tri_indices]
+            ends = ends[tri_indices]
+            low, high, valid = self._get_edge_intervals(starts, ends, xs, ys,
+                    outer_radius)
+            direction = ends - starts
+            def get_heights(t):
+                dist = numpy.sqrt(
+                        (starts[:, 0] + t * direction[:, 0] - xs) ** 2 \
+                        + (starts[:, 1] + t * direction[:, 1] - ys) ** 2)
+                return starts[:, 2] + t * direction[:, 2] \
+                        - self._get_profile_heights(dist)
+            t1 = high - golden * (high - low)
+            t2 = low + golden * (high - low)
+            h1 = get_heights(t1)
+            h2 = get_heights(t2)
+            for index in range(40):
+                move_up = h1 < h2
+                low = numpy.where(move_up, t1, low)
+                high = numpy.where(move_up, high, t2)
+                t1, t2 = numpy.where(move_up, t2, high - golden * (high - low)), \
+                        numpy.where(move_up, low + golden * (high - low), t1)
+                new_heights = get_heights(numpy.where(move_up, t2, t1))
+                h1, h2 = numpy.where(move_up, h2, new_heights), \
+                        numpy.where(move_up, new_heights, h1)
+            heights = numpy.maximum(numpy.maximum(h1, h2),
+                    numpy.maximum(get_heights(low), get_heights(high)))
+            result = numpy.where(valid, numpy.maximum(result, heights), result)
+        # contact with the vertices
+        for vertices in triangles.get_vertices():
+            vertices = vertices[tri_indices]
+            dist = numpy.sqrt((vertices[:, 0] - xs) ** 2 \
+                    + (vertices[:, 1] - ys) ** 2)
+            heights = vertices[:, 2] - self._get_profile_heights(dist)
+            result = numpy.where(dist <= outer_radius,
+                    numpy.maximum(result, heights), result)
+        return result
+
     def intersect_torus_plane(self, direction, triangle, start=None):
         if start is None:
             start = self.location
@@ -21,9 +21,17 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import decimal
+import itertools
+import math
 import os
 
+from pycam.Toolpath.ArcFitting import get_arc_segments
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 DEFAULT_HEADER = ("G40 (disable tool radius compensation)",
                 "G49 (disable tool length compensation)",
@@ -33,6 +41,10 @@ DEFAULT_HEADER = ("G40 (disable tool radius compensation)",
 
 PATH_MODES = {"exact_path": 0, "exact_stop": 1, "continuous": 2}
 MAX_DIGITS = 12
+# the output is written in blocks of (at least) this size (in bytes)
+WRITE_BUFFER_SIZE = 2 ** 16
+# number of moves to be converted at once by "add_moves" (requires numpy)
+MOVES_CHUNK_SIZE = 2 ** 14
 
 
 def _get_num_of_significant_digits(number):
@@ -55,14 +67,53 @@ def _get_num_of_significant_digits(number):
             return MAX_DIGITS
 
 
-def _get_num_converter(step_width):
-    """ Return a float-to-decimal conversion function with a prevision suitable
-    for the given step width.
+def _get_fixed_point(value, scale):
+    """ Convert a float into a fixed-point integer (value * scale). """
+    return int(math.floor(value * scale + 0.5))
+
+
+def _format_fixed_point(value, digits):
+    """ Return the decimal representation of a fixed-point integer with the
+    given number of fractional digits.
+    """
+    if digits == 0:
+        return "%d" % value
+    text = "%0*d" % (digits + 1, abs(value))
+    if value < 0:
+        sign = "-"
+    else:
+        sign = ""
+    return "%s%s.%s" % (sign, text[:-digits], text[-digits:])
+
+
+def _get_digit_columns(values, digits):
+    """ Vectorized equivalent of "_format_fixed_point" for an array of
+    fixed-point integers.
+    The result is an array of characters (one row per value). Leading
+    positions are padded with zero bytes.
     """
-    digits = _get_num_of_significant_digits(step_width)
-    format_string = "%%.%df" % digits
-    return lambda number: decimal.Decimal(format_string % number)
-    
+    scale = 10 ** digits
+    abs_values = numpy.abs(values)
+    integers = abs_values // scale
+    width = len(str(int(integers.max())))
+    # sign + integer digits + dot + fractional digits
+    columns = numpy.zeros((len(values), 1 + width + (digits and digits + 1)),
+            dtype=numpy.uint8)
+    columns[:, 0] = numpy.where(values < 0, ord("-"), 0)
+    for index in range(width):
+        power = 10 ** (width - 1 - index)
+        # leading zeros are removed (except for the last integer digit)
+        columns[:, 1 + index] = numpy.where(
+                (integers >= power) | (power == 1),
+                ord("0") + (integers // power) % 10, 0)
+    if digits:
+        fractions = abs_values % scale
+        columns[:, 1 + width] = ord(".")
+        for index in range(digits):
+            power = 10 ** (digits - 1 - index)
+            columns[:, 2 + width + index] = ord("0") + (fractions // power) % 10
+    return columns
+
 
 class GCodeGenerator(object):
 
@@ -89,8 +140,12 @@ class GCodeGenerator(object):
         self.toggle_spindle_status = toggle_spindle_status
         self.spindle_delay = spindle_delay
         self.comment = comment
-        # define all axes steps and the corresponding formatters
-        self._axes_formatter = []
+        # Define the precision of all axes. Positions are handled as fixed
+        # point integers (value * scale) with a number of fractional digits
+        # suitable for the minimum step width of each axis.
+        self._axes_digits = []
+        self._axes_scale = []
+        self._axes_min_step = []
         if not minimum_steps:
             # default: minimum steps for all axes = 0.0001
             minimum_steps = [0.0001]
@@ -99,8 +154,13 @@ class GCodeGenerator(object):
                 step_width = minimum_steps[i]
             else:
                 step_width = minimum_steps[-1]
-            conv = _get_num_converter(step_width)
-            self._axes_formatter.append((conv(step_width), conv))
+            digits = _get_num_of_significant_digits(step_width)
+            scale = 10 ** digits
+            self._axes_digits.append(digits)
+            self._axes_scale.append(scale)
+            self._axes_min_step.append(_get_fixed_point(step_width, scale))
+        self._buffer = []
+        self._buffer_size = 0
         self._finished = False
         if comment:
             self.add_comment(comment)
@@ -116,6 +176,8 @@ class GCodeGenerator(object):
         self.last_rapid = None
         self.last_tool_id = None
         self.last_feedrate = 100
+        # lines are replaced with arcs (G2/G3) if a tolerance is given
+        self._arc_tolerance = None
         if touch_off_on_startup or touch_off_on_tool_change:
             self.store_touch_off_position(touch_off_position)
         self.touch_off_on_startup = touch_off_on_startup
@@ -195,7 +257,21 @@ class GCodeGenerator(object):
             self.append("S%.5f" % spindle_speed)
 
     def set_path_mode(self, mode, motion_tolerance=None,
-            naive_cam_tolerance=None):
+            naive_cam_tolerance=None, arc_tolerance=None):
+        """ define the path mode of the machine and the fitting of arcs
+
+        @value mode: one of the items of PATH_MODES
+        @type mode: int
+        @value motion_tolerance: maximum deviation of the machine (G64 P)
+        @type motion_tolerance: float
+        @value naive_cam_tolerance: tolerance of the collinear line detection
+            of the machine (G64 Q)
+        @type naive_cam_tolerance: float
+        @value arc_tolerance: sequences of cutting moves within the xy plane
+            are replaced with arcs (G2/G3) that do not deviate from the lines
+            by more than this tolerance. Arcs are disabled for "None" or zero.
+        @type arc_tolerance: float
+        """
         result = ""
         if mode == PATH_MODES["exact_path"]:
             result = "G61 (exact path mode)"
@@ -214,6 +290,10 @@ class GCodeGenerator(object):
             raise ValueError("GCodeGenerator: invalid path mode (%s)" \
                     % str(mode))
         self.append(result)
+        if arc_tolerance:
+            self._arc_tolerance = arc_tolerance
+        else:
+            self._arc_tolerance = None
 
     def add_moves(self, moves, tool_id=None, comment=None):
         if not comment is None:
@@ -238,8 +318,31 @@ class GCodeGenerator(object):
         if not skip_safety_height_move:
             self.add_move_to_safety()
         self.set_spindle_status(True)
-        for pos, rapid in moves:
-            self.add_move(pos, rapid=rapid)
+        if self._arc_tolerance:
+            self._add_moves_with_arcs(moves)
+        elif numpy is None:
+            for pos, rapid in moves:
+                self.add_move(pos, rapid=rapid)
+        elif hasattr(moves, "positions"):
+            # columnar moves (see pycam.Toolpath.PathArrays.MoveArrays)
+            for start in range(0, len(moves), MOVES_CHUNK_SIZE):
+                end = start + MOVES_CHUNK_SIZE
+                self._add_moves_chunk(moves.positions[start:end],
+                        moves.rapid[start:end])
+        else:
+            moves = iter(moves)
+            while True:
+                chunk = list(itertools.islice(moves, MOVES_CHUNK_SIZE))
+                if not chunk:
+                    break
+                try:
+                    coords = numpy.array([(pos.x, pos.y, pos.z)
+                            for pos, rapid in chunk], dtype=numpy.float64)
+                except AttributeError:
+                    coords = numpy.array([tuple(pos) for pos, rapid in chunk],
+                            dtype=numpy.float64)
+                rapids = numpy.array([bool(rapid) for pos, rapid in chunk])
+                self._add_moves_chunk(coords, rapids)
         # go back to safety height
         self.add_move_to_safety()
         self.set_spindle_status(False)
@@ -269,17 +372,18 @@ class GCodeGenerator(object):
         @value rapid: is this a rapid move?
         @type rapid: bool
         """
+        try:
+            coords = (position.x, position.y, position.z)
+        except AttributeError:
+            coords = position
         new_pos = []
-        for index, attr in enumerate("xyz"):
-            conv = self._axes_formatter[index][1]
-            if hasattr(position, attr):
-                value = getattr(position, attr)
-            else:
-                value = position[index]
+        for index in range(self.NUM_OF_AXES):
+            value = coords[index]
             if value is None:
                 new_pos.append(None)
             else:
-                new_pos.append(conv(value))
+                new_pos.append(_get_fixed_point(value,
+                        self._axes_scale[index]))
         # check if there was a significant move
         no_diff = True
         for index in range(len(new_pos)):
@@ -289,7 +393,7 @@ class GCodeGenerator(object):
                 no_diff = False
                 break
             diff = abs(new_pos[index] - self.last_position[index])
-            if diff >= self._axes_formatter[index][0]:
+            if diff >= self._axes_min_step[index]:
                 no_diff = False
                 break
         if no_diff:
@@ -302,7 +406,8 @@ class GCodeGenerator(object):
                 continue
             if not self.last_position or \
                     (new_pos[index] != self.last_position[index]):
-                pos_string.append("%s%s" % (axis_spec, new_pos[index]))
+                pos_string.append("%s%s" % (axis_spec, _format_fixed_point(
+                        new_pos[index], self._axes_digits[index])))
                 self.last_position[index] = new_pos[index]
         if rapid == self.last_rapid:
             prefix = ""
@@ -313,10 +418,167 @@ class GCodeGenerator(object):
         self.last_rapid = rapid
         self.append("%s %s" % (prefix, " ".join(pos_string)))
 
+    def _add_moves_with_arcs(self, moves):
+        """ add moves while replacing sequences of cutting moves at the same
+        height with arcs (see pycam.Toolpath.ArcFitting)
+        """
+        # subsequent cutting moves at the height of the current position
+        sequence = []
+        for pos, rapid in moves:
+            try:
+                coords = (pos.x, pos.y, pos.z)
+            except AttributeError:
+                coords = tuple(pos)
+            if sequence and not rapid and \
+                    (_get_fixed_point(coords[2], self._axes_scale[2]) \
+                        == self.last_position[2]):
+                sequence.append(coords)
+                continue
+            self._add_sequence_with_arcs(sequence)
+            self.add_move(coords, rapid=rapid)
+            if rapid or (None in self.last_position):
+                sequence = []
+            else:
+                # the current position is the start of the next sequence
+                sequence = [tuple([value / float(scale) for value, scale
+                        in zip(self.last_position, self._axes_scale)])]
+        self._add_sequence_with_arcs(sequence)
+
+    def _add_sequence_with_arcs(self, sequence):
+        """ add the cutting moves to the points of a sequence (the first
+        point is the current position)
+        """
+        if len(sequence) < 2:
+            return
+        for end, center, clockwise in get_arc_segments(sequence,
+                self._arc_tolerance):
+            if center is None:
+                self.add_move(sequence[end], rapid=False)
+            else:
+                self.add_arc(sequence[end], center, clockwise)
+
+    def add_arc(self, position, center, clockwise):
+        """ add the GCode for an arc (G2/G3) within the xy plane from the
+        current position to 'position'. The height is not changed.
+
+        @value position: the new position
+        @type position: Point or list(float)
+        @value center: the center of the arc (x and y)
+        @type center: Point or list(float)
+        @value clockwise: clockwise (G2) or counter-clockwise (G3) arc
+        @type clockwise: bool
+        """
+        try:
+            coords = (position.x, position.y)
+        except AttributeError:
+            coords = position
+        try:
+            center = (center.x, center.y)
+        except AttributeError:
+            pass
+        pos_string = []
+        for index, axis_spec in enumerate("XY"):
+            scale = self._axes_scale[index]
+            digits = self._axes_digits[index]
+            new_value = _get_fixed_point(coords[index], scale)
+            # the center is relative to the start of the arc
+            offset = _get_fixed_point(center[index], scale) \
+                    - self.last_position[index]
+            pos_string.append("%s%s" % (axis_spec,
+                    _format_fixed_point(new_value, digits)))
+            pos_string.append("%s%s" % ("IJ"[index],
+                    _format_fixed_point(offset, digits)))
+            self.last_position[index] = new_value
+        if clockwise:
+            prefix = "G2"
+        else:
+            prefix = "G3"
+        # the next linear move needs to specify its motion mode again
+        self.last_rapid = None
+        self.append("%s %s" % (prefix, " ".join(pos_string[0::2]
+                + pos_string[1::2])))
+
+    def _add_moves_chunk(self, coords, rapids):
+        """ Vectorized equivalent of "add_move" for an array of positions
+        and an array of rapid flags (requires numpy). The resulting lines are
+        identical.
+        """
+        positions = numpy.floor(coords * self._axes_scale + 0.5).astype(
+                numpy.int64)
+        min_steps = numpy.array(self._axes_min_step, dtype=numpy.int64)
+        # The significance of a move depends on the last written position.
+        # Skipped moves differ by less than one step. For steps up to the
+        # precision of the output (the usual case), these moves are equal to
+        # the last written position. Thus a comparison with the previous move
+        # is sufficient. Bigger steps require a sequential check.
+        last_known = [value is not None for value in self.last_position]
+        last = numpy.array([value or 0 for value in self.last_position],
+                dtype=numpy.int64)
+        if (min_steps <= 1).all():
+            previous = numpy.vstack((last, positions[:-1]))
+            significant = (numpy.abs(positions - previous) >= min_steps).any(
+                    axis=1)
+            significant[0] |= not all(last_known)
+        else:
+            significant = numpy.zeros(len(positions), dtype=numpy.bool_)
+            last_written = last.tolist()
+            for index, position in enumerate(positions.tolist()):
+                if (index == 0) and not all(last_known):
+                    significant[index] = True
+                else:
+                    for axis in range(self.NUM_OF_AXES):
+                        if abs(position[axis] - last_written[axis]) \
+                                >= self._axes_min_step[axis]:
+                            significant[index] = True
+                            break
+                if significant[index]:
+                    last_written = position
+        positions = positions[significant]
+        rapids = rapids[significant]
+        if len(positions) == 0:
+            return
+        # only changed axes are written
+        previous = numpy.vstack((last, positions[:-1]))
+        changed = positions != previous
+        changed[0] |= numpy.logical_not(last_known)
+        previous_rapids = numpy.concatenate(([self.last_rapid], rapids[:-1]))
+        new_mode = rapids != previous_rapids
+        if self.last_rapid is None:
+            new_mode[0] = True
+        self.last_position = positions[-1].tolist()
+        self.last_rapid = bool(rapids[-1])
+        # Assemble all lines in a matrix of characters. Unused columns are
+        # filled with zero bytes. These are removed afterwards.
+        blocks = []
+        mode = numpy.zeros((len(positions), 3), dtype=numpy.uint8)
+        mode[new_mode, 0] = ord("G")
+        mode[new_mode, 1] = numpy.where(rapids[new_mode], ord("0"), ord("1"))
+        mode[:, 2] = ord(" ")
+        blocks.append(mode)
+        any_previous_axis = numpy.zeros(len(positions), dtype=numpy.bool_)
+        for axis, axis_spec in enumerate("XYZ"):
+            axis_changed = changed[:, axis]
+            prefix = numpy.zeros((len(positions), 2), dtype=numpy.uint8)
+            prefix[axis_changed & any_previous_axis, 0] = ord(" ")
+            prefix[axis_changed, 1] = ord(axis_spec)
+            any_previous_axis |= axis_changed
+            numbers = _get_digit_columns(positions[:, axis],
+                    self._axes_digits[axis])
+            numbers[numpy.logical_not(axis_changed)] = 0
+            blocks.append(prefix)
+            blocks.append(numbers)
+        line_end = numpy.empty((len(positions), len(os.linesep)),
+                dtype=numpy.uint8)
+        line_end[:] = numpy.fromstring(os.linesep, dtype=numpy.uint8)
+        blocks.append(line_end)
+        text = numpy.hstack(blocks).ravel()
+        self._write(text[text != 0].tostring())
+
     def finish(self):
         self.add_move_to_safety()
         self.append("M2 (end program)")
         self._finished = True
+        self.flush()
 
     def add_comment(self, comment):
         if isinstance(comment, basestring):
@@ -333,5 +595,18 @@ class GCodeGenerator(object):
         if isinstance(command, basestring):
             command = [command]
         for line in command:
-            self.destination.write(line + os.linesep)
+            self._write(line + os.linesep)
+
+    def _write(self, text):
+        self._buffer.append(text)
+        self._buffer_size += len(text)
+        if self._buffer_size >= WRITE_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """ write all buffered lines to the destination """
+        if self._buffer:
+            self.destination.write("".join(self._buffer))
+            self._buffer = []
+            self._buffer_size = 0
 
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from pycam import VERSION
+import struct
+import zlib
+
+import numpy
+
+
+FORMAT_PNG = "png"
+FORMAT_NUMPY = "npy"
+FORMATS = (FORMAT_PNG, FORMAT_NUMPY)
+
+
+def get_format_from_filename(filename):
+    """ guess the export format by the extension of the filename (default:
+    png)
+    """
+    for image_format in FORMATS:
+        if filename.lower().endswith("." + image_format):
+            return image_format
+    return FORMAT_PNG
+
+
+class HeightMapExporter(object):
+    """ Export the heights of a simulated material block (see
+    pycam.Simulation.HeightMap).
+
+    Two formats are supported:
+      - png: a 16 bit grayscale image (black: lower limit of the stock, white:
+        upper limit of the stock). The top row of the image is the row with
+        the highest y value. The limits are stored in a text chunk.
+      - npy: the raw array of heights (numpy format; first row: lowest y value)
+    """
+
+    def __init__(self, height_map, image_format=FORMAT_PNG):
+        if not image_format in FORMATS:
+            raise ValueError("Invalid height map format: '%s' (expected " \
+                    % str(image_format) + "one of %s)" % ", ".join(FORMATS))
+        self.height_map = height_map
+        self.image_format = image_format
+
+    def write(self, stream):
+        if self.image_format == FORMAT_NUMPY:
+            numpy.save(stream, self.height_map.z)
+        else:
+            self._write_png(stream)
+
+    def _write_png_chunk(self, stream, chunk_type, data):
+        stream.write(struct.pack(">I", len(data)))
+        stream.write(chunk_type)
+        stream.write(data)
+        checksum = zlib.crc32(chunk_type + data) & 0xffffffff
+        stream.write(struct.pack(">I", checksum))
+
+    def _write_png(self, stream):
+        height_map = self.height_map
+        z_range = height_map.maxz - height_map.minz
+        if z_range <= 0:
+            z_range = 1
+        values = numpy.clip((height_map.z - height_map.minz) / z_range, 0, 1)
+        # big endian 16 bit values - the first row is the top of the image
+        values = numpy.round(values[::-1] * 0xffff).astype(">u2")
+        # every row starts with the filter type (0 = none)
+        rows = numpy.zeros((values.shape[0], 1 + 2 * values.shape[1]),
+                dtype=numpy.uint8)
+        rows[:, 1:] = values.view(numpy.uint8).reshape(values.shape[0], -1)
+        stream.write("\x89PNG\r\n\x1a\n")
+        # width, height, bit depth, color type (grayscale), compression,
+        # filter method, interlace method
+        self._write_png_chunk(stream, "IHDR", struct.pack(">IIBBBBB",
+                values.shape[1], values.shape[0], 16, 0, 0, 0, 0))
+        for key, value in (("Software", "PyCAM v%s" % VERSION),
+                ("Comment", "x=%r..%r y=%r..%r z=%r..%r" % (height_map.minx,
+                    height_map.maxx, height_map.miny, height_map.maxy,
+                    height_map.minz, height_map.maxz))):
+            self._write_png_chunk(stream, "tEXt", "%s\0%s" % (key, value))
+        self._write_png_chunk(stream, "IDAT", zlib.compress(rows.tostring()))
+        self._write_png_chunk(stream, "IEND", "")
+
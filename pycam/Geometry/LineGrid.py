@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Find intersecting lines via a uniform grid (xy plane).
+# Every line is registered in all grid cells that it passes through. Only
+# lines sharing a cell are candidates for an intersection. Thus the
+# calculation takes roughly O(n + k) for n lines with k intersections -
+# instead of O(n^2) for checking every pair.
+# The size of the cells is based on the average length of the lines.
+
+from pycam.Geometry.utils import epsilon
+import math
+
+
+class SegmentGrid(object):
+
+    def __init__(self, segments, cell_size=None, margin=epsilon):
+        """ register the segments in a uniform grid
+
+        @value segments: the start and end points (x, y) of each segment
+        @type segments: list(tuple(tuple(float)))
+        @value cell_size: the width and height of a grid cell (default:
+            average xy extent of the segments)
+        @type cell_size: float
+        @value margin: segments closer than this distance are candidates
+        @type margin: float
+        """
+        self.segments = segments
+        self.margin = margin
+        if cell_size is None:
+            if segments:
+                cell_size = float(sum([max(abs(x2 - x1), abs(y2 - y1))
+                        for (x1, y1), (x2, y2) in segments])) / len(segments)
+            else:
+                cell_size = 1
+        self.cell_size = max(cell_size, 2 * epsilon)
+        self._cells = {}
+        for index, segment in enumerate(segments):
+            for key in self._get_cells(segment):
+                self._cells.setdefault(key, []).append(index)
+
+    def _get_cells(self, segment):
+        """ return the keys of all cells touched by the segment (including
+        the margin)
+        """
+        size = self.cell_size
+        margin = self.margin
+        (x1, y1), (x2, y2) = segment
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        column_low = int(math.floor((x1 - margin) / size))
+        column_high = int(math.floor((x2 + margin) / size))
+        for column in range(column_low, column_high + 1):
+            # the part of the segment within this column
+            xa = min(max(x1, column * size), x2)
+            xb = min(max(x1, (column + 1) * size), x2)
+            if x2 - x1 < epsilon:
+                ya, yb = y1, y2
+            else:
+                slope = float(y2 - y1) / (x2 - x1)
+                ya = y1 + (xa - x1) * slope
+                yb = y1 + (xb - x1) * slope
+            row_low = int(math.floor((min(ya, yb) - margin) / size))
+            row_high = int(math.floor((max(ya, yb) + margin) / size))
+            for row in range(row_low, row_high + 1):
+                yield (column, row)
+
+    def _is_overlap(self, index1, index2):
+        """ check if the bounding boxes of two segments overlap """
+        (x1, y1), (x2, y2) = self.segments[index1]
+        (x3, y3), (x4, y4) = self.segments[index2]
+        margin = self.margin
+        return (min(x1, x2) <= max(x3, x4) + margin) \
+                and (min(x3, x4) <= max(x1, x2) + margin) \
+                and (min(y1, y2) <= max(y3, y4) + margin) \
+                and (min(y3, y4) <= max(y1, y2) + margin)
+
+    def get_candidate_pairs(self):
+        """ return all pairs of segment indexes (index1 < index2) sharing at
+        least one cell and overlapping bounding boxes
+        """
+        pairs = set()
+        for indexes in self._cells.itervalues():
+            for position, index1 in enumerate(indexes):
+                for index2 in indexes[position + 1:]:
+                    pair = (min(index1, index2), max(index1, index2))
+                    if (not pair in pairs) and self._is_overlap(*pair):
+                        pairs.add(pair)
+        return sorted(pairs)
+
+
+class LineGrid(SegmentGrid):
+
+    def __init__(self, lines, cell_size=None):
+        """ register the lines in a uniform grid
+
+        @value lines: the lines to be checked for intersections
+        @type lines: list(pycam.Geometry.Line.Line)
+        @value cell_size: the width and height of a grid cell (default:
+            average xy extent of the lines)
+        @type cell_size: float
+        """
+        self.lines = lines
+        super(LineGrid, self).__init__([((line.p1.x, line.p1.y),
+                (line.p2.x, line.p2.y)) for line in lines],
+                cell_size=cell_size)
+
+    def _is_overlap(self, index1, index2):
+        line1 = self.lines[index1]
+        line2 = self.lines[index2]
+        return not ((line1.minx > line2.maxx + epsilon) \
+                or (line2.minx > line1.maxx + epsilon) \
+                or (line1.miny > line2.maxy + epsilon) \
+                or (line2.miny > line1.maxy + epsilon) \
+                or (line1.minz > line2.maxz + epsilon) \
+                or (line2.minz > line1.maxz + epsilon))
+
+    def get_intersections(self, skip_pair=None):
+        """ calculate the intersections of all candidate pairs
+
+        @value skip_pair: optional function returning True for pairs of line
+            indexes that should not be checked (e.g. neighbours)
+        @type skip_pair: callable
+        @returns: the indexes of both lines and the point of intersection
+        @rtype: list(tuple(int, int, pycam.Geometry.Point.Point))
+        """
+        result = []
+        for index1, index2 in self.get_candidate_pairs():
+            if skip_pair and skip_pair(index1, index2):
+                continue
+            intersection, factor = self.lines[index1].get_intersection(
+                    self.lines[index2])
+            if intersection:
+                result.append((index1, index2, intersection))
+        return result
+
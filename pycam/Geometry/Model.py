@@ -23,6 +23,7 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 
 import uuid
 import math
+import weakref
 
 
 import pycam.Exporters.STLExporter
@@ -30,9 +31,13 @@ import pycam.Exporters.SVGExporter
 from pycam.Geometry.Triangle import Triangle
 from pycam.Geometry.Line import Line
 from pycam.Geometry.Plane import Plane
-from pycam.Geometry.Polygon import Polygon
-from pycam.Geometry.Point import Point, Vector
-from pycam.Geometry.TriangleKdtree import TriangleKdtree
+from pycam.Geometry.Polygon import Polygon, get_offset_polygons
+from pycam.Geometry.LineGrid import LineGrid
+from pycam.Geometry.Point import Point, Vector, get_hash_key, \
+        get_hash_keys_near
+from pycam.Geometry.TriangleKdtree import TriangleKdtree, FlatTriangleKdtree
+from pycam.Geometry.TriangleArrays import TriangleArrays, \
+        get_triangle_normals, is_numpy_available
 from pycam.Geometry.Matrix import TRANSFORMATIONS
 from pycam.Toolpath import Bounds
 from pycam.Geometry.utils import INFINITE, epsilon
@@ -47,6 +52,11 @@ try:
 except ImportError:
     GL_enabled = False
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 log = pycam.Utils.log.get_logger()
 
@@ -230,6 +240,7 @@ class Model(BaseModel):
         # enable/disable kdtree
         self._use_kdtree = use_kdtree
         self._t_kdtree = None
+        self._t_arrays = None
         self.__flat_groups_cache = {}
         self.__uuid = None
         
@@ -257,6 +268,7 @@ class Model(BaseModel):
             self._triangles.append(item)
             # we assume, that the kdtree needs to be rebuilt again
             self._dirty = True
+            self._t_arrays = None
 
     def reset_cache(self):
         super(Model, self).reset_cache()
@@ -265,7 +277,12 @@ class Model(BaseModel):
 
     def _update_caches(self):
         if self._use_kdtree:
-            self._t_kdtree = TriangleKdtree(self.triangles())
+            if is_numpy_available():
+                self._t_kdtree = FlatTriangleKdtree.from_triangles(
+                        self._triangles)
+            else:
+                self._t_kdtree = TriangleKdtree(self._triangles)
+        self._t_arrays = None
         self.__uuid = str(uuid.uuid4())
         self.__flat_groups_cache = {}
         # the kdtree is up-to-date again
@@ -280,14 +297,28 @@ class Model(BaseModel):
             # update the kdtree, if new triangles were added meanwhile
             if self._dirty:
                 self._update_caches()
-            return self._t_kdtree.Search(minx, maxx, miny, maxy)
+            if isinstance(self._t_kdtree, FlatTriangleKdtree):
+                return [self._triangles[index] for index in
+                        self._t_kdtree.search(minx, maxx, miny, maxy)]
+            else:
+                return self._t_kdtree.Search(minx, maxx, miny, maxy)
         return self._triangles
 
+    def get_triangle_arrays(self):
+        """ Return a "struct of arrays" representation of all triangles.
+        This is required for vectorized calculations (e.g. the batch
+        DropCutter). The result is cached until the model is changed.
+        """
+        if self._t_arrays is None:
+            self._t_arrays = TriangleArrays.from_triangles(self._triangles)
+        return self._t_arrays
+
     def get_waterline_contour(self, plane, callback=None):
         collision_lines = []
-        progress_max = 2 * len(self._triangles)
+        triangles = self.triangles()
+        progress_max = 2 * len(triangles)
         counter = 0
-        for t in self._triangles:
+        for t in triangles:
             if callback and callback(percent=100.0 * counter / progress_max):
                 return
             collision_line = plane.intersect_triangle(t, counter_clockwise=True)
@@ -352,6 +383,369 @@ class Model(BaseModel):
         return self.__flat_groups_cache[min_area]
 
 
+class MeshModel(Model):
+    """ A triangle model based on shared numpy arrays.
+
+    The vertices are stored only once. Each face refers to its three
+    (clockwise ordered) vertices by index. The normals of all faces are kept
+    in an array, too. Vertices and normals use single precision (just like
+    STL files). This requires only a small fraction of the memory used by a
+    list of Triangle objects. The bounding boxes of the faces are calculated
+    only for the spatial index (see '_get_face_index').
+    Triangle objects are created on demand (see 'triangles'). They are cached
+    as long as they are referenced elsewhere.
+    """
+
+    # number of appended triangles to be converted into arrays at once
+    APPEND_CHUNK_SIZE = 10000
+
+    def __init__(self, vertices=None, faces=None, normals=None,
+            use_kdtree=True):
+        # The bounding box arrays of the faces are used instead of a kdtree.
+        super(MeshModel, self).__init__(use_kdtree=False)
+        self._new_triangles = []
+        self._new_chunks = []
+        self._views = weakref.WeakValueDictionary()
+        if vertices is None:
+            self._set_mesh(numpy.zeros((0, 3)), numpy.zeros((0, 3)),
+                    numpy.zeros((0, 3)))
+        else:
+            self._set_mesh(vertices, faces, normals)
+
+    @classmethod
+    def from_corners(cls, corners, normals=None):
+        """ create a model from an (n,3,3) array containing the three
+        (clockwise ordered) vertices of every triangle - identical vertices
+        are merged
+        """
+        vertices, faces = cls._get_shared_vertices(corners)
+        return cls(vertices, faces, normals)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """ Restore a model from the result of 'get_arrays' without any
+        calculations. The arrays may be read-only (e.g. memory-mapped).
+        """
+        model = cls()
+        model._vertices = arrays["vertices"]
+        model._faces = arrays["faces"]
+        model._normals = arrays["normals"]
+        face_bounds = arrays["face_bounds"]
+        leaf_bounds = arrays["index_leaf_bounds"]
+        model._face_index = FlatTriangleKdtree(
+                *[face_bounds[dim] for dim in range(4)],
+                order=arrays["index_order"],
+                leaf_bounds=[leaf_bounds[dim] for dim in range(4)])
+        model._update_mesh_limits()
+        return model
+
+    def get_arrays(self):
+        """ Return all arrays describing the model and its spatial index.
+        See 'from_arrays'.
+        """
+        index = self._get_face_index()
+        order, leaf_bounds = index.get_arrays()
+        return {"vertices": self.vertices, "faces": self._faces,
+                "normals": self._normals, "face_bounds": numpy.array(
+                    [index.minx, index.maxx, index.miny, index.maxy]),
+                "index_order": order, "index_leaf_bounds": leaf_bounds}
+
+    @staticmethod
+    def _get_shared_vertices(corners):
+        corners = numpy.asarray(corners, dtype=numpy.float32).reshape(-1, 3)
+        vertices, faces = numpy.unique(corners, axis=0, return_inverse=True)
+        return vertices, faces.reshape(-1, 3)
+
+    def _set_mesh(self, vertices, faces, normals=None):
+        """ All vertices are expected to be used by at least one face. """
+        self._vertices = numpy.asarray(vertices,
+                dtype=numpy.float32).reshape(-1, 3)
+        self._faces = numpy.asarray(faces, dtype=numpy.int32).reshape(-1, 3)
+        self._normals = numpy.zeros(self._faces.shape, dtype=numpy.float32)
+        if not normals is None:
+            normals = numpy.asarray(normals).reshape(-1, 3)
+        # process the faces in chunks - this limits the temporary memory usage
+        for start in range(0, len(self._faces), self.APPEND_CHUNK_SIZE):
+            end = start + self.APPEND_CHUNK_SIZE
+            # use the given normals - except for invalid ones
+            if normals is None:
+                chunk_normals = numpy.zeros(self._faces[start:end].shape)
+            else:
+                chunk_normals = normals[start:end].astype(numpy.float64)
+            lengths = numpy.sqrt((chunk_normals ** 2).sum(axis=1))
+            invalid = lengths == 0
+            lengths[invalid] = 1
+            chunk_normals /= lengths[:, numpy.newaxis]
+            if invalid.any():
+                invalid_faces = self._faces[start:end][invalid]
+                chunk_normals[invalid] = get_triangle_normals(
+                        *[self._vertices[invalid_faces[:, index]].astype(
+                                numpy.float64)
+                            for index in range(3)])
+            self._normals[start:end] = chunk_normals
+        self._views.clear()
+        self._update_mesh_limits()
+        self._dirty = True
+        self._t_arrays = None
+        self._face_index = None
+
+    def _update_mesh_limits(self):
+        if len(self._faces) > 0:
+            self.minx, self.miny, self.minz = \
+                    self._vertices.min(axis=0).tolist()
+            self.maxx, self.maxy, self.maxz = \
+                    self._vertices.max(axis=0).tolist()
+        else:
+            self.minx = self.miny = self.minz = None
+            self.maxx = self.maxy = self.maxz = None
+
+    def _convert_new_triangles(self):
+        coords = []
+        normals = []
+        for t in self._new_triangles:
+            for p in (t.p1, t.p2, t.p3):
+                coords.append((float(p.x), float(p.y), float(p.z)))
+            normals.append((float(t.normal.x), float(t.normal.y),
+                    float(t.normal.z)))
+        self._new_chunks.append((numpy.array(coords).reshape(-1, 3, 3),
+                numpy.array(normals).reshape(-1, 3)))
+        self._new_triangles = []
+
+    def _merge_new_triangles(self):
+        """ incorporate all triangles added via 'append' into the arrays """
+        if self._new_triangles:
+            self._convert_new_triangles()
+        if self._new_chunks:
+            corners = [self._vertices[self._faces]]
+            normals = [self._normals]
+            for chunk_corners, chunk_normals in self._new_chunks:
+                corners.append(chunk_corners)
+                normals.append(chunk_normals)
+            self._new_chunks = []
+            vertices, faces = self._get_shared_vertices(
+                    numpy.concatenate(corners))
+            self._set_mesh(vertices, faces, numpy.concatenate(normals))
+
+    @property
+    def vertices(self):
+        self._merge_new_triangles()
+        return self._vertices
+
+    @property
+    def faces(self):
+        self._merge_new_triangles()
+        return self._faces
+
+    @property
+    def normals(self):
+        self._merge_new_triangles()
+        return self._normals
+
+    def __len__(self):
+        return len(self._faces) + len(self._new_triangles) \
+                + sum([len(chunk[0]) for chunk in self._new_chunks])
+
+    def __add__(self, other_model):
+        if isinstance(other_model, MeshModel):
+            offset = len(self.vertices)
+            return self.__class__(
+                    numpy.concatenate((self.vertices, other_model.vertices)),
+                    numpy.concatenate((self.faces,
+                        other_model.faces + offset)),
+                    numpy.concatenate((self.normals, other_model.normals)))
+        else:
+            return super(MeshModel, self).__add__(other_model)
+
+    def __getstate__(self):
+        self._merge_new_triangles()
+        state = self.__dict__.copy()
+        # weak references can't be pickled
+        del state["_views"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views = weakref.WeakValueDictionary()
+
+    def copy(self):
+        return self.__class__(self.vertices.copy(), self.faces.copy(),
+                self.normals.copy())
+
+    def append(self, item):
+        if isinstance(item, Triangle):
+            self._update_limits(item)
+            self._new_triangles.append(item)
+            if len(self._new_triangles) >= self.APPEND_CHUNK_SIZE:
+                self._convert_new_triangles()
+            self._dirty = True
+            self._t_arrays = None
+
+    def next(self):
+        for start in range(0, len(self), self.APPEND_CHUNK_SIZE):
+            for triangle in self._get_triangles(numpy.arange(start,
+                    min(len(self), start + self.APPEND_CHUNK_SIZE))):
+                yield triangle
+
+    def get_children_count(self):
+        # see Triangle.get_children_count
+        return 7 * len(self)
+
+    def transform_by_matrix(self, matrix, transformed_list=None,
+            callback=None):
+        # accept 3x4 matrices as well as 3x3 matrices
+        full_matrix = numpy.zeros((3, 4))
+        for index, column in enumerate(matrix):
+            full_matrix[index, :len(column)] = column
+        rotation = full_matrix[:, :3]
+        vertices = numpy.dot(self.vertices, rotation.T) + full_matrix[:, 3]
+        # normals are transformed without the offset (see Vector)
+        normals = numpy.dot(self.normals, rotation.T)
+        self._set_mesh(vertices, self.faces, normals)
+        if callback:
+            callback()
+        self.reset_cache()
+
+    def reset_cache(self):
+        self._merge_new_triangles()
+        self._update_mesh_limits()
+        self._update_caches()
+
+    def _update_caches(self):
+        self._merge_new_triangles()
+        self._views.clear()
+        super(MeshModel, self)._update_caches()
+
+    def _get_triangles(self, indices):
+        """ return the Triangle objects of the faces with the given indices """
+        self._merge_new_triangles()
+        result = []
+        # triangles created at the same time share their vertices
+        points = {}
+        indices = numpy.asarray(indices)
+        faces = self._faces[indices].tolist()
+        coords = self._vertices[self._faces[indices]].tolist()
+        normals = self._normals[indices].tolist()
+        for index, face, corners, normal in zip(indices.tolist(), faces,
+                coords, normals):
+            triangle = self._views.get(index)
+            if triangle is None:
+                triangle_points = []
+                for vertex_index, coord in zip(face, corners):
+                    if not vertex_index in points:
+                        points[vertex_index] = Point(*coord)
+                    triangle_points.append(points[vertex_index])
+                triangle = Triangle(triangle_points[0], triangle_points[1],
+                        triangle_points[2], Vector(*normal))
+                self._views[index] = triangle
+            result.append(triangle)
+        return result
+
+    def triangles(self, minx=-INFINITE, miny=-INFINITE, minz=-INFINITE,
+            maxx=+INFINITE, maxy=+INFINITE, maxz=+INFINITE):
+        self._merge_new_triangles()
+        if (minx == miny == minz == -INFINITE) \
+                and (maxx == maxy == maxz == +INFINITE):
+            return self._get_triangles(numpy.arange(len(self._faces)))
+        # the z limits are ignored - just like TriangleKdtree.Search
+        return self._get_triangles(self._get_face_index().search(minx, maxx,
+                miny, maxy))
+
+    def _get_face_index(self):
+        self._merge_new_triangles()
+        if self._face_index is None:
+            self._face_index = FlatTriangleKdtree(*self._get_face_bounds())
+        return self._face_index
+
+    def _get_face_bounds(self):
+        """ return the bounding boxes of all faces in the xy plane as four
+        single precision arrays (minx, maxx, miny, maxy)
+        """
+        bounds = numpy.empty((4, len(self._faces)), dtype=numpy.float32)
+        for start in range(0, len(self._faces), self.APPEND_CHUNK_SIZE):
+            end = start + self.APPEND_CHUNK_SIZE
+            corners = self._vertices[self._faces[start:end], :2]
+            bounds[0, start:end], bounds[2, start:end] = \
+                    corners.min(axis=1).T
+            bounds[1, start:end], bounds[3, start:end] = \
+                    corners.max(axis=1).T
+        return bounds
+
+    def get_triangle_arrays(self):
+        if self._t_arrays is None:
+            faces = self.faces
+            # the arrays share the spatial index of the model
+            self._t_arrays = TriangleArrays(self._vertices[faces[:, 0]],
+                    self._vertices[faces[:, 1]], self._vertices[faces[:, 2]],
+                    index=self._get_face_index())
+        return self._t_arrays
+
+
+class PolygonEndIndex(object):
+    """ Spatial hash of the first and the last points of open polygons.
+
+    The points are stored in cells of quantized coordinates (see
+    'pycam.Geometry.Point.get_hash_key'). Thus polygons ending at a given
+    point are found in constant time.
+    Every polygon gets a sequence number, when it is added. This allows to
+    keep the order of the polygons of a ContourModel.
+    """
+
+    def __init__(self, polygons=None):
+        self._cells = {}
+        self._keys = {}
+        self._orders = {}
+        self._polygons = {}
+        self._next_order = 0
+        if polygons:
+            for polygon in polygons:
+                self.add(polygon)
+
+    def add(self, polygon):
+        """ register a new polygon - it is ordered after all previous ones """
+        self._orders[id(polygon)] = self._next_order
+        self._polygons[id(polygon)] = polygon
+        self._next_order += 1
+        self.update(polygon)
+
+    def _remove_ends(self, polygon):
+        for key in self._keys.pop(id(polygon), ()):
+            cell = self._cells[key]
+            cell.remove(id(polygon))
+            if not cell:
+                del self._cells[key]
+
+    def update(self, polygon):
+        """ refresh the registered ends of a polygon after it was changed """
+        self._remove_ends(polygon)
+        if polygon.is_closed or not polygon.get_points():
+            return
+        points = polygon.get_points()
+        keys = set((get_hash_key(points[0]), get_hash_key(points[-1])))
+        for key in keys:
+            self._cells.setdefault(key, []).append(id(polygon))
+        self._keys[id(polygon)] = keys
+
+    def remove(self, polygon):
+        self._remove_ends(polygon)
+        self._orders.pop(id(polygon), None)
+        self._polygons.pop(id(polygon), None)
+
+    def get_order(self, polygon):
+        """ return the sequence number of a polygon (or None) """
+        return self._orders.get(id(polygon), None)
+
+    def find(self, points):
+        """ return all open polygons starting or ending near any of the given
+        points - ordered by their sequence number
+        """
+        found = set()
+        for point in points:
+            for key in get_hash_keys_near(point):
+                found.update(self._cells.get(key, ()))
+        return [self._polygons[polygon_id]
+                for polygon_id in sorted(found, key=self._orders.get)]
+
+
 class ContourModel(BaseModel):
 
     def __init__(self, plane=None):
@@ -367,6 +761,8 @@ class ContourModel(BaseModel):
         self._plane_groups = [self._plane]
         self._item_groups.append(self._plane_groups)
         self._cached_offset_models = {}
+        # spatial hash of the open polygon ends (created on demand)
+        self._polygon_ends = None
         self._export_function = \
                 pycam.Exporters.SVGExporter.SVGExporterContourModel
 
@@ -386,6 +782,33 @@ class ContourModel(BaseModel):
         super(ContourModel, self).reset_cache()
         # reset the offset model cache
         self._cached_offset_models = {}
+        # the points of the polygons may have changed
+        self._polygon_ends = None
+
+    def _get_polygon_ends(self):
+        if self._polygon_ends is None:
+            self._polygon_ends = PolygonEndIndex(self._line_groups)
+        return self._polygon_ends
+
+    def _remove_line_group(self, polygon):
+        """ remove a polygon from the model and from the index of polygon ends
+        """
+        polygon_ends = self._get_polygon_ends()
+        order = polygon_ends.get_order(polygon)
+        # the line groups are sorted by their sequence number
+        low, high = 0, len(self._line_groups)
+        while (not order is None) and (low < high):
+            middle = (low + high) // 2
+            if polygon_ends.get_order(self._line_groups[middle]) < order:
+                low = middle + 1
+            else:
+                high = middle
+        if (low < len(self._line_groups)) and \
+                (self._line_groups[low] is polygon):
+            self._line_groups.pop(low)
+        else:
+            self._line_groups.remove(polygon)
+        polygon_ends.remove(polygon)
 
     def _merge_polygon_if_possible(self, other_polygon, allow_reverse=False):
         """ Check if the given 'other_polygon' can be connected to another
@@ -399,8 +822,9 @@ class ContourModel(BaseModel):
         connectors.append(other_polygon.get_points()[0])
         connectors.append(other_polygon.get_points()[-1])
         # filter all polygons that can be combined with 'other_polygon'
+        polygon_ends = self._get_polygon_ends()
         connectables = []
-        for lg in self._line_groups:
+        for lg in polygon_ends.find(connectors):
             if lg is other_polygon:
                 continue
             for connector in connectors:
@@ -421,7 +845,7 @@ class ContourModel(BaseModel):
                     if other_polygon.is_closed:
                         return
                     other_polygon.append(line)
-                self._line_groups.remove(polygon)
+                self._remove_line_group(polygon)
             elif other_polygon.get_points()[0] == polygon.get_points()[-1]:
                 lines = polygon.get_lines()
                 lines.reverse()
@@ -429,7 +853,7 @@ class ContourModel(BaseModel):
                     if other_polygon.is_closed:
                         return
                     other_polygon.append(line)
-                self._line_groups.remove(polygon)
+                self._remove_line_group(polygon)
             elif allow_reverse:
                 if other_polygon.get_points()[-1] == polygon.get_points()[-1]:
                     polygon.reverse_direction()
@@ -437,7 +861,7 @@ class ContourModel(BaseModel):
                         if other_polygon.is_closed:
                             return
                         other_polygon.append(line)
-                    self._line_groups.remove(polygon)
+                    self._remove_line_group(polygon)
                 elif other_polygon.get_points()[0] == polygon.get_points()[0]:
                     polygon.reverse_direction()
                     lines = polygon.get_lines()
@@ -446,7 +870,7 @@ class ContourModel(BaseModel):
                         if other_polygon.is_closed:
                             return
                         other_polygon.append(line)
-                    self._line_groups.remove(polygon)
+                    self._remove_line_group(polygon)
                 else:
                     pass
             else:
@@ -462,16 +886,20 @@ class ContourModel(BaseModel):
             if allow_reverse:
                 item_list.append(Line(item.p2, item.p1))
             found = False
-            # Going back from the end to start. The last line_group always has
-            # the highest chance of being suitable for the next line.
-            line_group_indexes = xrange(len(self._line_groups) - 1, -1, -1)
-            for line_group_index in line_group_indexes:
-                line_group = self._line_groups[line_group_index]
+            polygon_ends = self._get_polygon_ends()
+            # Only the polygons with an open end at one of the points of the
+            # line are candidates. Going back from the end to start. The last
+            # line_group always has the highest chance of being suitable for
+            # the next line.
+            line_groups = polygon_ends.find((item.p1, item.p2))
+            line_groups.reverse()
+            for line_group in line_groups:
                 for candidate in item_list:
                     if line_group.is_connectable(candidate):
                         line_group.append(candidate)
                         self._merge_polygon_if_possible(line_group,
                                 allow_reverse=allow_reverse)
+                        polygon_ends.update(line_group)
                         found = True
                         break
                 if found:
@@ -481,9 +909,12 @@ class ContourModel(BaseModel):
                 new_line_group = Polygon(plane=self._plane)
                 new_line_group.append(item)
                 self._line_groups.append(new_line_group)
+                polygon_ends.add(new_line_group)
         elif isinstance(item, Polygon):
             if not unify_overlaps or (len(self._line_groups) == 0):
                 self._line_groups.append(item)
+                if not self._polygon_ends is None:
+                    self._polygon_ends.add(item)
                 for subitem in item.next():
                     self._update_limits(subitem)
             else:
@@ -526,6 +957,7 @@ class ContourModel(BaseModel):
                         new_queue = processed
                 while len(self._line_groups) > 0:
                     self._line_groups.pop()
+                self._polygon_ends = None
                 print "Processed polygons: %s" % str([len(p.get_lines())
                         for p in processed_polygons])
                 print "New queue: %s" % str([len(p.get_lines())
@@ -569,7 +1001,7 @@ class ContourModel(BaseModel):
             progress_callback = None
         # try to connect all open polygons
         for poly in open_polygons:
-            self._line_groups.remove(poly)
+            self._remove_line_group(poly)
         poly_open_before = len(open_polygons)
         for poly in open_polygons:
             for line in poly.get_lines():
@@ -686,12 +1118,26 @@ class ContourModel(BaseModel):
         return result
 
     def get_offset_model(self, offset, callback=None):
+        """ calculate a contour model that surrounds the area of the current
+        model with a given offset.
+        All polygons are shifted at once - thus overlapping results are
+        merged and holes are taken into account.
+        @value offset: shifting distance; positive values enlarge the model
+        @type offset: float
+        @value callback: function to call after finishing a single step.
+            It should return True if the user interrupted the operation.
+        @type callback: callable
+        @returns: the new shifted model (or None if the operation was
+            interrupted)
+        @rtype: pycam.Geometry.Model.ContourModel
+        """
         result = ContourModel(plane=self._plane)
-        for group in self.get_polygons():
-            new_groups = group.get_offset_polygons(offset, callback=callback)
-            result.extend(new_groups)
-            if callback and callback():
-                return None
+        new_groups = get_offset_polygons(self.get_polygons(), offset,
+                callback=callback)
+        if new_groups is None:
+            return None
+        for group in new_groups:
+            result.append(group)
         return result
 
     def get_copy(self):
@@ -727,33 +1173,42 @@ class ContourModel(BaseModel):
                         # z overlaps as well
                         return True
             return False
-        # check each pair of line groups for intersections
-        intersections = []
-        for index1, group1 in enumerate(self._line_groups[:-1]):
-            for index2, group2 in enumerate(self._line_groups):
-                if index2 <= index1:
-                    # avoid double-checks
-                    continue
-                # check if both groups overlap - otherwise skip this pair
-                if check_bounds_of_groups(group1, group2):
-                    # check each pair of lines for intersections
-                    for line1 in group1.get_lines():
-                        for line2 in group2.get_lines():
-                            intersection, factor = line1.get_intersection(line2)
-                            if intersection:
-                                if find_all_collisions:
-                                    intersections.append((index1, index2))
-                                else:
-                                    # return just the place of intersection
-                                    return intersection
+        # collect the lines of all groups
+        lines = []
+        line_groups = []
+        line_indexes = []
+        for group_index, group in enumerate(self._line_groups):
+            for line_index, line in enumerate(group.get_lines()):
+                lines.append(line)
+                line_groups.append(group_index)
+                line_indexes.append(line_index)
             # update the progress visualization and quit if requested
             if callback and callback():
                 if find_all_collisions:
-                    return intersections
+                    return []
                 else:
                     return None
+        def skip_pair(index1, index2):
+            group_index1 = line_groups[index1]
+            group_index2 = line_groups[index2]
+            # check if both groups overlap - otherwise skip this pair
+            return (group_index1 == group_index2) or \
+                    not check_bounds_of_groups(self._line_groups[group_index1],
+                        self._line_groups[group_index2])
+        # only lines sharing a grid cell are checked for intersections
+        intersections = []
+        for index1, index2, intersection in LineGrid(lines).get_intersections(
+                skip_pair=skip_pair):
+            # order by groups first (as if checking each pair of groups)
+            intersections.append(((line_groups[index1], line_groups[index2],
+                    line_indexes[index1], line_indexes[index2]),
+                    intersection))
+        intersections.sort(key=lambda item: item[0])
         if find_all_collisions:
-            return intersections
+            return [(key[0], key[1]) for key, intersection in intersections]
+        elif intersections:
+            # return just the place of intersection
+            return intersections[0][1]
         else:
             return False
 
@@ -23,11 +23,47 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 
 from pycam.Geometry.utils import epsilon, sqrt, number
 from pycam.Geometry import IDGenerator
+import math
+
+
+# The size of the cells used for hashing points (see 'get_hash_key').
+# Cells much larger than epsilon reduce the number of cells to be checked for
+# a lookup (see 'get_hash_keys_near').
+HASH_CELL_SIZE = 16 * epsilon
 
 
 def _is_near(x, y):
     return abs(x - y) < epsilon
 
+def get_hash_key(point):
+    """ return the key of the cell containing the point (quantized
+    coordinates)
+    """
+    return (int(math.floor(point.x / HASH_CELL_SIZE)),
+            int(math.floor(point.y / HASH_CELL_SIZE)),
+            int(math.floor(point.z / HASH_CELL_SIZE)))
+
+def get_hash_keys_near(point):
+    """ return the keys of all cells, that could contain a point being equal
+    to the given point (see 'Point.__cmp__').
+    All coordinates of two equal points differ by less than 'epsilon'. Thus
+    only the cells overlapping with a box of +/- epsilon around the point are
+    relevant. The box reaches into a neighbouring cell along an axis only if
+    the point is closer than 'epsilon' to a border of its cell. This applies
+    to one eighth of all positions per axis (see HASH_CELL_SIZE). Thus two
+    out of three lookups need a single cell - the others need two, four or
+    (rarely) eight cells.
+    """
+    ranges = []
+    for value in (point.x, point.y, point.z):
+        low = int(math.floor((value - epsilon) / HASH_CELL_SIZE))
+        high = int(math.floor((value + epsilon) / HASH_CELL_SIZE))
+        ranges.append(range(low, high + 1))
+    for key_x in ranges[0]:
+        for key_y in ranges[1]:
+            for key_z in ranges[2]:
+                yield (key_x, key_y, key_z)
+
 
 class Point(IDGenerator):
 
@@ -20,7 +20,10 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import bisect
+
 from pycam.Geometry.Line import Line
+from pycam.Geometry.PolygonOffset import get_offset_contours
 from pycam.Geometry.Point import Point, Vector
 from pycam.Geometry.Plane import Plane
 from pycam.Geometry import TransformableContainer, IDGenerator, get_bisector
@@ -39,6 +42,10 @@ except ImportError:
 LINE_WIDTH_INNER = 0.7
 LINE_WIDTH_OUTER = 1.3
 
+# Building the edge index of a polygon takes as long as roughly ten linear
+# scans of its edges. Thus it is used only for this number of points or more.
+EDGE_INDEX_MIN_QUERIES = 16
+
 log = pycam.Utils.log.get_logger()
 
 
@@ -212,6 +219,91 @@ class PolygonSorter(object):
             return [poly.polygon for poly in self.sorter.get_polygons()]
 
 
+class PolygonEdgeIndex(object):
+    """ Segment tree of the edges of a polygon (xy plane).
+
+    The distinct y values of all vertices divide the plane into horizontal
+    slabs. The slabs are the leaves of an implicit binary tree: the children
+    of node 'i' are '2i' and '2i+1'. Every edge is stored only in the
+    O(log n) nodes covering its y range. The edges crossing a horizontal line
+    are collected along the path from the slab containing the line up to the
+    root. Thus the index is built in O(n log n) and the edges crossing a line
+    are found in O(log n + k).
+    """
+
+    def __init__(self, points, is_closed):
+        count = len(points)
+        if is_closed:
+            edge_count = count
+        else:
+            edge_count = max(0, count - 1)
+        self.edges = [(points[index].x, points[index].y,
+                    points[(index + 1) % count].x,
+                    points[(index + 1) % count].y)
+                for index in range(edge_count)]
+        self._ys = sorted(set([point.y for point in points]))
+        # the number of leaves is a power of two
+        self._leaf_count = 1
+        while self._leaf_count < len(self._ys) - 1:
+            self._leaf_count *= 2
+        # only nodes containing edges are stored
+        self._nodes = {}
+        for index, (x1, y1, x2, y2) in enumerate(self.edges):
+            low = bisect.bisect_left(self._ys, min(y1, y2)) + self._leaf_count
+            high = bisect.bisect_left(self._ys, max(y1, y2)) \
+                    + self._leaf_count
+            # add the edge to the nodes covering the slabs [low, high)
+            while low < high:
+                if low % 2 == 1:
+                    self._nodes.setdefault(low, []).append(index)
+                    low += 1
+                if high % 2 == 1:
+                    high -= 1
+                    self._nodes.setdefault(high, []).append(index)
+                low //= 2
+                high //= 2
+        # the indexes of all vertices sorted by their y value
+        self._vertex_order = sorted(range(count),
+                key=lambda index: points[index].y)
+        self._vertex_ys = [points[index].y for index in self._vertex_order]
+        self._count = count
+        self._edge_count = edge_count
+
+    def get_crossing_edges(self, y):
+        """ return the indexes of all edges with miny < y <= maxy """
+        slab = bisect.bisect_left(self._ys, y) - 1
+        if not 0 <= slab < len(self._ys) - 1:
+            return []
+        result = []
+        node = slab + self._leaf_count
+        while node > 0:
+            if node in self._nodes:
+                result.extend(self._nodes[node])
+            node //= 2
+        return result
+
+    def get_edges_in_range(self, miny, maxy):
+        """ return the indexes of all edges overlapping the given y range
+
+        An edge either spans the start of the range or it has a vertex
+        within the range.
+        """
+        result = set(self.get_crossing_edges(miny))
+        first = bisect.bisect_left(self._vertex_ys, miny)
+        last = bisect.bisect_right(self._vertex_ys, maxy)
+        for vertex in self._vertex_order[first:last]:
+            # the edges ending and starting at this vertex
+            for index in (vertex - 1, vertex):
+                if index < 0:
+                    if self._edge_count < self._count:
+                        # the first vertex of an open polygon
+                        continue
+                    index += self._count
+                if index < self._edge_count:
+                    result.add(index)
+        return sorted(result)
+
+
 class Polygon(TransformableContainer):
 
     def __init__(self, plane=None):
@@ -230,6 +322,7 @@ class Polygon(TransformableContainer):
         self.minz = None
         self._lines_cache = None
         self._area_cache = None
+        self._edge_index = None
         self._cached_offset_polygons = {}
 
     def copy(self):
@@ -263,8 +356,9 @@ class Polygon(TransformableContainer):
                     self._update_limits(line.p2)
                 else:
                     self.is_closed = True
-                # take care that the line_cache is flushed
-                self.reset_cache()
+                # Take care that the line_cache is flushed. The limits are
+                # still valid - a removed point was between its neighbours.
+                self._reset_shape_cache()
             else:
                 # the new Line can be added to the beginning of the polygon
                 if (len(self._points) > 1) \
@@ -277,8 +371,9 @@ class Polygon(TransformableContainer):
                     self._update_limits(line.p1)
                 else:
                     self.is_closed = True
-                # take care that the line_cache is flushed
-                self.reset_cache()
+                # Take care that the line_cache is flushed. The limits are
+                # still valid - a removed point was between its neighbours.
+                self._reset_shape_cache()
 
     def __len__(self):
         return len(self._points)
@@ -456,6 +551,8 @@ class Polygon(TransformableContainer):
                 (self.miny > polygon.maxy) or (self.maxy < polygon.miny) or \
                 (self.minz > polygon.maxz) or (self.maxz < polygon.minz):
             return False
+        if len(polygon._points) >= EDGE_INDEX_MIN_QUERIES:
+            self._get_edge_index()
         for point in polygon._points:
             if not self.is_point_inside(point):
                 return False
@@ -478,29 +575,66 @@ class Polygon(TransformableContainer):
                 self.minz, self.maxz):
             # the point is outside the rectangle boundary
             return False
+        if self._edge_index is None:
+            # a single query is faster without building the edge index
+            return self._is_point_inside_edges(
+                    self._get_crossing_edges_linear(p.y), p)
+        edges = self._edge_index.edges
+        return self._is_point_inside_edges([edges[index] for index
+                in self._edge_index.get_crossing_edges(p.y)], p)
+
+    def are_points_inside(self, points):
+        """ Test a list of points at once (see 'is_point_inside').
+        The edge index of the polygon is built only for many points (see
+        EDGE_INDEX_MIN_QUERIES).
+
+        @value points: the points to be checked
+        @type points: list(pycam.Geometry.Point.Point)
+        @returns: the "inside" state of each point
+        @rtype: list(bool)
+        """
+        if not self.is_closed:
+            return [False] * len(points)
+        if len(points) < EDGE_INDEX_MIN_QUERIES:
+            return [self.is_point_inside(p) for p in points]
+        edge_index = self._get_edge_index()
+        edges = edge_index.edges
+        limits = (self.minx, self.maxx, self.miny, self.maxy, self.minz,
+                self.maxz)
+        return [p.is_inside(*limits) \
+                    and self._is_point_inside_edges([edges[index] for index
+                        in edge_index.get_crossing_edges(p.y)], p)
+                for p in points]
+
+    def _get_crossing_edges_linear(self, y):
+        """ return the edges (x1, y1, x2, y2) of a closed polygon with
+        miny < y <= maxy - without the edge index
+        """
+        points = self._points
+        return [(p1.x, p1.y, p2.x, p2.y)
+                for p1, p2 in zip(points, points[1:] + points[:1])
+                if min(p1.y, p2.y) < y <= max(p1.y, p2.y)]
+
+    def _is_point_inside_edges(self, edges, p):
         # see http://www.alienryderflex.com/polygon/
         # Count the number of intersections of a ray along the x axis through
         # all polygon lines.
         # Odd number -> point is inside
         intersection_count_left = 0
         intersection_count_right = 0
-        for index in range(len(self._points)):
-            p1 = self._points[index]
-            p2 = self._points[(index + 1) % len(self._points)]
-            # Only count intersections with lines that are partly below
-            # the y level of the point. This solves the problem of intersections
-            # through shared vertices or lines that go along the y level of the
-            # point.
-            if ((p1.y < p.y) and (p.y <= p2.y)) \
-                    or ((p2.y < p.y) and (p.y <= p1.y)):
-                part_y = (p.y - p1.y) / (p2.y - p1.y)
-                intersection_x = p1.x + part_y * (p2.x - p1.x)
-                if intersection_x < p.x + epsilon:
-                    # count intersections to the left
-                    intersection_count_left += 1
-                if intersection_x > p.x - epsilon:
-                    # count intersections to the right
-                    intersection_count_right += 1
+        # Only count intersections with lines that are partly below the y
+        # level of the point (miny < p.y <= maxy). This solves the problem of
+        # intersections through shared vertices or lines that go along the y
+        # level of the point. The given edges are exactly these lines.
+        for x1, y1, x2, y2 in edges:
+            part_y = (p.y - y1) / (y2 - y1)
+            intersection_x = x1 + part_y * (x2 - x1)
+            if intersection_x < p.x + epsilon:
+                # count intersections to the left
+                intersection_count_left += 1
+            if intersection_x > p.x - epsilon:
+                # count intersections to the right
+                intersection_count_right += 1
         # odd intersection count -> inside
         left_odd = intersection_count_left % 2 == 1
         right_odd = intersection_count_right % 2 == 1
@@ -575,11 +709,21 @@ class Polygon(TransformableContainer):
             self.maxz = max(self.maxz, point.z)
         self._lines_cache = None
         self._area_cache = None
+        self._edge_index = None
 
-    def reset_cache(self):
+    def _reset_shape_cache(self):
         self._cached_offset_polygons = {}
         self._lines_cache = None
         self._area_cache = None
+        self._edge_index = None
+
+    def _get_edge_index(self):
+        if self._edge_index is None:
+            self._edge_index = PolygonEdgeIndex(self._points, self.is_closed)
+        return self._edge_index
+
+    def reset_cache(self):
+        self._reset_shape_cache()
         self.minx, self.miny, self.minz = None, None, None
         self.maxx, self.maxy, self.maxz = None, None, None
         # update the limit for each line
@@ -592,640 +736,32 @@ class Polygon(TransformableContainer):
         p3 = self._points[(index + 1) % len(self._points)]
         return get_bisector(p1, p2, p3, self.plane.n)
 
-    def get_offset_polygons_validated(self, offset):
-        def get_shifted_vertex(index, offset):
-            p1 = self._points[index]
-            p2 = self._points[(index + 1) % len(self._points)]
-            cross_offset = p2.sub(p1).cross(self.plane.n).normalized()
-            bisector_normalized = self.get_bisector(index)
-            factor = cross_offset.dot(bisector_normalized)
-            if factor != 0:
-                bisector_sized = bisector_normalized.mul(offset / factor)
-                return p1.add(bisector_sized)
-            else:
-                return p2
-        if offset * 2 >= self.get_max_inside_distance():
-            # no polygons will be left
-            return []
-        points = []
-        for index in range(len(self._points)):
-            points.append(get_shifted_vertex(index, offset))
-        max_dist = 1000 * epsilon
-        def test_point_near(p, others):
-            for o in others:
-                if p.sub(o).norm < max_dist:
-                    return True
-            return False
-        reverse_lines = []
-        shifted_lines = []
-        for index in range(len(points)):
-            next_index = (index + 1) % len(points)
-            p1 = points[index]
-            p2 = points[next_index]
-            diff = p2.sub(p1)
-            old_dir = self._points[next_index].sub(
-                    self._points[index]).normalized()
-            if diff.normalized() != old_dir:
-                # the direction turned around
-                if diff.norm > max_dist:
-                    # the offset was too big
-                    return None
-                else:
-                    reverse_lines.append(index)
-                shifted_lines.append((True, Line(p1, p2)))
-            else:
-                shifted_lines.append((False, Line(p1, p2)))
-        # look for reversed lines
-        index = 0
-        while index < len(shifted_lines):
-            line_reverse, line = shifted_lines[index]
-            if line_reverse:
-                prev_index = (index - 1) % len(shifted_lines)
-                next_index = (index + 1) % len(shifted_lines)
-                prev_reverse, prev_line = shifted_lines[prev_index]
-                while prev_reverse and (prev_index != next_index):
-                    prev_index = (prev_index - 1) % len(shifted_lines)
-                    prev_reverse, prev_line = shifted_lines[prev_index]
-                if prev_index == next_index:
-                    # no lines are left
-                    print "out 1"
-                    return []
-                next_reverse, next_line = shifted_lines[next_index]
-                while next_reverse and (prev_index != next_index):
-                    next_index = (next_index + 1) % len(shifted_lines)
-                    next_reverse, next_line = shifted_lines[next_index]
-                if prev_index == next_index:
-                    # no lines are left
-                    print "out 2"
-                    return []
-                if prev_line.p2.sub(next_line.p1).norm > max_dist:
-                    cp, dist = prev_line.get_intersection(next_line)
-                else:
-                    cp = prev_line.p2
-                if cp:
-                    shifted_lines[prev_index] = (False, Line(prev_line.p1, cp))
-                    shifted_lines[next_index] = (False, Line(cp, next_line.p2))
-                else:
-                    cp, dist = prev_line.get_intersection(next_line,
-                            infinite_lines=True)
-                    raise BaseException("Expected intersection not found: " + \
-                            "%s - %s - %s(%d) / %s(%d)" % \
-                            (cp, shifted_lines[prev_index+1:next_index],
-                                prev_line, prev_index, next_line, next_index))
-                if index > next_index:
-                    # we wrapped around the end of the list
-                    break
-                else:
-                    index = next_index + 1
-            else:
-                index += 1
-        non_reversed = [line for reverse, line in shifted_lines
-                if not reverse and line.len > 0]
-        # split the list of lines into groups (based on intersections)
-        split_points = []
-        index = 0
-        while index < len(non_reversed):
-            other_index = 0
-            while other_index < len(non_reversed):
-                other_line = non_reversed[other_index]
-                if (other_index == index) \
-                        or (other_index == ((index - 1) % len(non_reversed))) \
-                        or (other_index == ((index + 1) % len(non_reversed))):
-                    # skip neighbours
-                    other_index += 1
-                    continue
-                line = non_reversed[index]
-                cp, dist = line.get_intersection(other_line)
-                if cp:
-                    if not test_point_near(cp,
-                            (line.p1, line.p2, other_line.p1, other_line.p2)):
-                        # the collision is not close to an end of the line
-                        return None
-                    elif (cp == line.p1) or (cp == line.p2):
-                        # maybe we have been here before
-                        if not cp in split_points:
-                            split_points.append(cp)
-                    elif (cp.sub(line.p1).norm < max_dist) \
-                            or (cp.sub(line.p2).norm < max_dist):
-                        if cp.sub(line.p1).norm < cp.sub(line.p2).norm:
-                            non_reversed[index] = Line(cp, line.p2)
-                        else:
-                            non_reversed[index] = Line(line.p1, cp)
-                        non_reversed.pop(other_index)
-                        non_reversed.insert(other_index,
-                                Line(other_line.p1, cp))
-                        non_reversed.insert(other_index + 1,
-                                Line(cp, other_line.p2))
-                        split_points.append(cp)
-                        if other_index < index:
-                            index += 1
-                        # skip the second part of this line
-                        other_index += 1
-                    else:
-                        # the split of 'other_line' will be handled later
-                        pass
-                other_index += 1
-            index += 1
-        groups = [[]]
-        current_group = 0
-        split_here = False
-        for line in non_reversed:
-            if line.p1 in split_points:
-                split_here = True
-            if split_here:
-                split_here = False
-                # check if any preceeding group fits to the point
-                for index, group in enumerate(groups):
-                    if not group:
-                        continue
-                    if index == current_group:
-                        continue
-                    if group[0].p1 == group[-1].p2:
-                        # the group is already closed
-                        continue
-                    if line.p1 == group[-1].p2:
-                        current_group = index
-                        groups[current_group].append(line)
-                        break
-                else:
-                    current_group = len(groups)
-                    groups.append([line])
-            else:
-                groups[current_group].append(line)
-            if line.p2 in split_points:
-                split_here = True
-        def is_joinable(g1, g2):
-            if g1 and g2 and (g1[0].p1 != g1[-1].p2):
-                if g1[0].p1 == g2[-1].p2:
-                    return g2 + g1
-                if g2[0].p1 == g1[-1].p2:
-                    return g1 + g2
-            return None
-        # try to combine open groups
-        for index1, group1 in enumerate(groups):
-            if not group1:
-                continue
-            for index2, group2 in enumerate(groups):
-                if not group2:
-                    continue
-                if index2 <= index1:
-                    continue
-                if (group1[-1].p2 == group2[0].p1) \
-                        and (group1[0].p1 == group2[-1].p2):
-                    group1.extend(group2)
-                    groups[index2] = []
-                    break
-        result_polygons = []
-        print "********** GROUPS **************"
-        for a in groups:
-            print a
-        for group in groups:
-            if len(group) <= 2:
-                continue
-            poly = Polygon(self.plane)
-            #print "**************************************"
-            for line in group:
-                try:
-                    poly.append(line)
-                except ValueError:
-                    print "NON_REVERSED"
-                    for a in non_reversed:
-                        print a
-                    print groups
-                    print split_points
-                    print poly
-                    print line
-                    raise
-            if self.is_closed and ((not poly.is_closed) \
-                    or (self.is_outer() != poly.is_outer())):
-                continue
-            elif (not self.is_closed) and (poly.get_area() != 0):
-                continue
-            else:
-                result_polygons.append(poly)
-        return result_polygons
-
-    def get_offset_polygons_incremental(self, offset, depth=20):
-        if offset == 0:
-            return [self]
-        if self._cached_offset_polygons.has_key(offset):
-            return self._cached_offset_polygons[offset]
-        def is_better_offset(previous_offset, alternative_offset):
-            return ((offset < alternative_offset < 0) \
-                    or (0 < alternative_offset < offset)) \
-                    and (abs(alternative_offset) > abs(previous_offset))
-        # check the cache for a good starting point
-        best_offset = 0
-        best_offset_polygons = [self]
-        for cached_offset in self._cached_offset_polygons:
-            if is_better_offset(best_offset, cached_offset):
-                best_offset = cached_offset
-                best_offset_polygons = \
-                        self._cached_offset_polygons[cached_offset]
-        remaining_offset = offset - best_offset
-        result_polygons = []
-        for poly in best_offset_polygons:
-            result = poly.get_offset_polygons_validated(remaining_offset)
-            if not result is None:
-                result_polygons.extend(result)
-            else:
-                lower = number(0)
-                upper = remaining_offset
-                loop_limit = 90
-                while (loop_limit > 0):
-                    middle = (upper + lower) / 2
-                    result = poly.get_offset_polygons_validated(middle)
-                    if result is None:
-                        upper = middle
-                    else:
-                        if depth > 0:
-                            # the original polygon was splitted or modified
-                            print "Next level: %s" % str(middle)
-                            shifted_sub_polygons = []
-                            for sub_poly in result:
-                                shifted_sub_polygons.extend(
-                                        sub_poly.get_offset_polygons(
-                                            remaining_offset - middle,
-                                            depth=depth-1))
-                            result_polygons.extend(shifted_sub_polygons)
-                            break
-                        else:
-                            print "Maximum recursion level reached"
-                            break
-                    loop_limit -= 1
-                else:
-                    # no split event happened -> no valid shifted polygon
-                    pass
-        self._cached_offset_polygons[offset] = result_polygons
-        return result_polygons
-
     def get_offset_polygons(self, offset, callback=None):
-        def get_shifted_vertex(index, offset):
-            p1 = self._points[index]
-            p2 = self._points[(index + 1) % len(self._points)]
-            cross_offset = p2.sub(p1).cross(self.plane.n).normalized()
-            bisector_normalized = self.get_bisector(index)
-            factor = cross_offset.dot(bisector_normalized)
-            if factor != 0:
-                bisector_sized = bisector_normalized.mul(offset / factor)
-                return p1.add(bisector_sized)
-            else:
-                return p2
-        def simplify_polygon_intersections(lines):
-            new_group = lines[:]
-            # remove all non-adjacent intersecting lines (this splits the group)
-            if len(new_group) > 0:
-                group_starts = []
-                index1 = 0
-                fallout3 = 0
-                while index1 < len(new_group):
-                    index2 = 0
-                    fallout2 = len(new_group)
-                    fallout3 += 1
-                    while index2 < len(new_group):
-                        fallout2 -= 1
-                        index_distance = min(abs(index2 - index1), \
-                                abs(len(new_group) - (index2 - index1))) 
-                        if fallout3 > 10000:
-                            print "FALLOUT3"
-                            print index_distance, index2, index1, len(new_group), len(group_starts)
-                            import sys
-                            sys.exit(1)
-                        # skip neighbours
-                        if index_distance > 1:
-                            line1 = new_group[index1]
-                            line2 = new_group[index2]
-                            intersection, factor = line1.get_intersection(line2)
-                            if intersection and (intersection != line1.p1) \
-                                    and (intersection != line1.p2):
-                                del new_group[index1]
-                                new_group.insert(index1,
-                                        Line(line1.p1, intersection))
-                                new_group.insert(index1 + 1,
-                                        Line(intersection, line1.p2))
-                                # Shift all items in "group_starts" by one if
-                                # they reference a line whose index changed.
-                                for i in range(len(group_starts)):
-                                    if group_starts[i] > index1:
-                                        group_starts[i] += 1
-                                if not index1 + 1 in group_starts:
-                                    group_starts.append(index1 + 1)
-                                # don't update index2 -> maybe there are other hits
-                            elif intersection and (intersection == line1.p1):
-                                if not index1 in group_starts:
-                                    group_starts.append(index1)
-                                index2 += 1
-                            else:
-                                index2 += 1
-                        else:
-                            index2 += 1
-                    index1 += 1
-                # The lines intersect each other
-                # We need to split the group.
-                if len(group_starts) > 0:
-                    group_starts.sort()
-                    groups = []
-                    last_start = 0
-                    for group_start in group_starts:
-                        groups.append(new_group[last_start:group_start])
-                        last_start = group_start
-                    # Add the remaining lines to the first group or as a new
-                    # group.
-                    if groups[0][0].p1 == new_group[-1].p2:
-                        groups[0] = new_group[last_start:] + groups[0]
-                    else:
-                        groups.append(new_group[last_start:])
-                    # try to find open groups that can be combined
-                    combined_groups = []
-                    for index, current_group in enumerate(groups):
-                        # Check if the group is not closed: try to add it to
-                        # other non-closed groups.
-                        if current_group[0].p1 == current_group[-1].p2:
-                            # a closed group
-                            combined_groups.append(current_group)
-                        else:
-                            # the current group is open
-                            for other_group in groups[index + 1:]:
-                                if other_group[0].p1 != other_group[-1].p2:
-                                    # This group is also open - a candidate
-                                    # for merging?
-                                    if other_group[0].p1 == current_group[-1].p2:
-                                        current_group.reverse()
-                                        for line in current_group:
-                                            other_group.insert(0, line)
-                                        break
-                                    if other_group[-1].p2 == current_group[0].p1:
-                                        other_group.extend(current_group)
-                                        break
-                            else:
-                                # not suitable open group found
-                                combined_groups.append(current_group)
-                    return combined_groups
-                else:
-                    # just return one group without intersections
-                    return [new_group]
-            else:
-                return None
+        """ calculate the polygons surrounding this polygon with a given
+        offset (see 'get_offset_polygons' of this module)
+
+        Positive offsets enlarge outer polygons and shrink holes. Open
+        polygons are surrounded by a closed polygon (for positive offsets).
+        @returns: the shifted polygons (or None if the operation was
+            interrupted)
+        @rtype: list(Polygon)
+        """
         offset = number(offset)
         if offset == 0:
             return [self]
-        if offset * 2 >= self.get_max_inside_distance():
-            # This offset will not create a valid offset polygon.
-            # Sadly there is currently no other way to detect a complete flip of
-            # something like a circle.
-            log.debug("Skipping offset polygon: polygon is too small")
-            return []
-        points = []
-        for index in range(len(self._points)):
-            points.append(get_shifted_vertex(index, offset))
-        new_lines = []
-        for index in range(len(points)):
-            p1 = points[index]
-            p2 = points[(index + 1) % len(points)]
-            new_lines.append(Line(p1, p2))
-        if callback and callback():
-            return None
-        cleaned_line_groups = simplify_polygon_intersections(new_lines)
-        if cleaned_line_groups is None:
-            log.debug("Skipping offset polygon: intersections could not be " \
-                    + "simplified")
-            return None
-        else:
-            if not cleaned_line_groups:
-                log.debug("Skipping offset polygon: no polygons left after " \
-                        + "intersection simplification")
-            # remove all groups with a toggled direction
-            self_is_outer = self.is_outer()
-            groups = []
-            for lines in cleaned_line_groups:
-                if callback and callback():
-                    return None
-                group = Polygon(self.plane)
-                for line in lines:
-                    group.append(line)
-                if group.is_outer() != self_is_outer:
-                    # We ignore groups that changed the direction. These
-                    # parts of the original group are flipped due to the
-                    # offset.
-                    log.debug("Ignoring reversed polygon: %s / %s" % \
-                            (self.get_area(), group.get_area()))
-                    continue
-                # Remove polygons that should be inside the original,
-                # but due to float inaccuracies they are not.
-                if ((self.is_outer() and (offset < 0)) \
-                        or (not self.is_outer() and (offset > 0))) \
-                        and (not self.is_polygon_inside(group)):
-                    log.debug("Ignoring inaccurate polygon: %s / %s" \
-                            % (self.get_area(), group.get_area()))
-                    continue
-                groups.append(group)
-            if not groups:
-                log.debug("Skipping offset polygon: toggled polygon removed")
-            # remove all polygons that are within other polygons
-            result = []
-            for group in groups:
-                inside = False
-                for group_test in groups:
-                    if callback and callback():
-                        return None
-                    if group_test is group:
-                        continue
-                    if group_test.is_polygon_inside(group):
-                        inside = True
-                if not inside:
-                    result.append(group)
-            if not result:
-                log.debug("Skipping offset polygon: polygon is inside of " \
-                        + "another one")
-            return result
-
-    def get_offset_polygons_old(self, offset):
-        def get_parallel_line(line, offset):
-            if offset == 0:
-                return Line(line.p1, line.p2)
-            else:
-                cross_offset = line.dir.cross(self.plane.n).normalized().mul(offset)
-                # Prolong the line at the beginning and at the end - to allow
-                # overlaps. Use factor "2" to take care for star-like structure
-                # where a complete convex triangle would get cropped (two lines
-                # get lost instead of just one). Use the "abs" value to
-                # compensate negative offsets.
-                in_line = line.dir.mul(2 * abs(offset))
-                return Line(line.p1.add(cross_offset).sub(in_line),
-                        line.p2.add(cross_offset).add(in_line))
-        def do_lines_intersection(l1, l2):
-            """ calculate the new intersection between two neighbouring lines
-            """
-            # TODO: use Line.get_intersection instead of the code below
-            if l1.p2 == l2.p1:
-                # intersection is already fine
-                return
-            if (l1.p1 is None) or (l2.p1 is None):
-                # one line was already marked as obsolete
-                return
-            x1, x2, x3, x4 = l2.p1, l2.p2, l1.p1, l1.p2
-            a = x2.sub(x1)
-            b = x4.sub(x3)
-            c = x3.sub(x1)
-            # see http://mathworld.wolfram.com/Line-LineIntersection.html (24)
-            try:
-                factor = c.cross(b).dot(a.cross(b)) / a.cross(b).normsq
-            except ZeroDivisionError:
-                l2.p1 = None
-                return
-            if not (0 <= factor < 1):
-                # The intersection is always supposed to be within p1 and p2.
-                l2.p1 = None
-            else:
-                intersection = x1.add(a.mul(factor))
-                if Line(l1.p1, intersection).dir != l1.dir:
-                    # Remove lines that would change their direction due to the
-                    # new intersection. These are usually lines that become
-                    # obsolete due to a more favourable intersection of the two
-                    # neighbouring lines. This appears at small corners.
-                    l1.p1 = None
-                elif Line(intersection, l2.p2).dir != l2.dir:
-                    # see comment above
-                    l2.p1 = None
-                elif l1.p1 == intersection:
-                    # remove invalid lines (zero length)
-                    l1.p1 = None
-                elif l2.p2 == intersection:
-                    # remove invalid lines (zero length)
-                    l2.p1 = None
-                else:
-                    # shorten both lines according to the new intersection
-                    l1.p2 = intersection
-                    l2.p1 = intersection
-        def simplify_polygon_intersections(lines):
-            finished = False
-            new_group = lines[:]
-            while not finished:
-                if len(new_group) > 1:
-                    # Calculate new intersections for each pair of adjacent
-                    # lines.
-                    for index in range(len(new_group)):
-                        if (index == 0) and (not self.is_closed):
-                            # skip the first line if the group is not closed
-                            continue
-                        # this also works for index==0 (closed groups)
-                        l1 = new_group[index - 1]
-                        l2 = new_group[index]
-                        do_lines_intersection(l1, l2)
-                # Remove all lines that were marked as obsolete during
-                # intersection calculation.
-                clean_group = [line for line in new_group
-                        if not line.p1 is None]
-                finished = len(new_group) == len(clean_group)
-                if (len(clean_group) == 1) and self.is_closed:
-                    new_group = []
-                    finished = True
-                else:
-                    new_group = clean_group
-            # remove all non-adjacent intersecting lines (this splits the group)
-            if len(new_group) > 0:
-                group_starts = []
-                index1 = 0
-                while index1 < len(new_group):
-                    index2 = 0
-                    while index2 < len(new_group):
-                        index_distance = min(abs(index2 - index1), \
-                                abs(len(new_group) - (index2 - index1))) 
-                        # skip neighbours
-                        if index_distance > 1:
-                            line1 = new_group[index1]
-                            line2 = new_group[index2]
-                            intersection, factor = line1.get_intersection(line2)
-                            if intersection and (intersection != line1.p1) \
-                                    and (intersection != line1.p2):
-                                del new_group[index1]
-                                new_group.insert(index1,
-                                        Line(line1.p1, intersection))
-                                new_group.insert(index1 + 1,
-                                        Line(intersection, line1.p2))
-                                # Shift all items in "group_starts" by one if
-                                # they reference a line whose index changed.
-                                for i in range(len(group_starts)):
-                                    if group_starts[i] > index1:
-                                        group_starts[i] += 1
-                                if not index1 + 1 in group_starts:
-                                    group_starts.append(index1 + 1)
-                                # don't update index2 -> maybe there are other hits
-                            elif intersection and (intersection == line1.p1):
-                                if not index1 in group_starts:
-                                    group_starts.append(index1)
-                                index2 += 1
-                            else:
-                                index2 += 1
-                        else:
-                            index2 += 1
-                    index1 += 1
-                # The lines intersect each other
-                # We need to split the group.
-                if len(group_starts) > 0:
-                    group_starts.sort()
-                    groups = []
-                    last_start = 0
-                    for group_start in group_starts:
-                        groups.append(new_group[last_start:group_start])
-                        last_start = group_start
-                    # Add the remaining lines to the first group or as a new
-                    # group.
-                    if groups[0][0].p1 == new_group[-1].p2:
-                        groups[0] = new_group[last_start:] + groups[0]
-                    else:
-                        groups.append(new_group[last_start:])
-                    # try to find open groups that can be combined
-                    combined_groups = []
-                    for index, current_group in enumerate(groups):
-                        # Check if the group is not closed: try to add it to
-                        # other non-closed groups.
-                        if current_group[0].p1 == current_group[-1].p2:
-                            # a closed group
-                            combined_groups.append(current_group)
-                        else:
-                            # the current group is open
-                            for other_group in groups[index + 1:]:
-                                if other_group[0].p1 != other_group[-1].p2:
-                                    # This group is also open - a candidate
-                                    # for merging?
-                                    if other_group[0].p1 == current_group[-1].p2:
-                                        current_group.reverse()
-                                        for line in current_group:
-                                            other_group.insert(0, line)
-                                        break
-                                    if other_group[-1].p2 == current_group[0].p1:
-                                        other_group.extend(current_group)
-                                        break
-                            else:
-                                # not suitable open group found
-                                combined_groups.append(current_group)
-                    return combined_groups
-                else:
-                    # just return one group without intersections
-                    return [new_group]
-            else:
-                return None
-        new_lines = []
-        for line in self.get_lines():
-            new_lines.append(get_parallel_line(line, offset))
-        cleaned_line_groups = simplify_polygon_intersections(new_lines)
-        if cleaned_line_groups is None:
-            return None
+        if offset in self._cached_offset_polygons:
+            return self._cached_offset_polygons[offset]
+        if self.is_closed and not self.is_outer():
+            # a hole is treated as the outer polygon of the material around
+            result = get_offset_polygons([self.get_reversed()], -offset,
+                    callback=callback)
+            if not result is None:
+                result = [polygon.get_reversed() for polygon in result]
         else:
-            # remove all groups with a toggled direction
-            self_is_outer = self.is_outer()
-            groups = []
-            for lines in cleaned_line_groups:
-                group = Polygon(self.plane)
-                for line in lines:
-                    group.append(line)
-                if group.is_outer() == self_is_outer:
-                    # We ignore groups that changed the direction. These
-                    # parts of the original group are flipped due to the
-                    # offset.
-                    groups.append(group)
-            return groups
+            result = get_offset_polygons([self], offset, callback=callback)
+        if not result is None:
+            self._cached_offset_polygons[offset] = result
+        return result
 
     def get_cropped_polygons(self, minx, maxx, miny, maxy, minz, maxz):
         """ crop a line group according to a 3d bounding box
@@ -1357,24 +893,76 @@ class Polygon(TransformableContainer):
         # project the line onto the polygon's plane
         proj_line = self.plane.get_line_projection(line)
         intersections = []
-        for pline in self.get_lines():
-            cp, d = proj_line.get_intersection(pline)
-            if cp:
-                intersections.append((cp, d))
+        if self.minx is not None:
+            # only the polygon lines within the range of the line are relevant
+            lines = self.get_lines()
+            edge_index = self._get_edge_index()
+            minx = proj_line.minx - epsilon
+            maxx = proj_line.maxx + epsilon
+            for index in edge_index.get_edges_in_range(
+                    proj_line.miny - epsilon, proj_line.maxy + epsilon):
+                x1, y1, x2, y2 = edge_index.edges[index]
+                if (max(x1, x2) < minx) or (min(x1, x2) > maxx):
+                    continue
+                cp, d = proj_line.get_intersection(lines[index])
+                if cp:
+                    intersections.append((cp, d))
         # sort the intersections
         intersections.sort(key=lambda (cp, d): d)
         intersections.insert(0, (proj_line.p1, 0))
         intersections.append((proj_line.p2, 1))
         get_original_point = lambda d: line.p1.add(line.vector.mul(d))
+        pieces = []
         for index in range(len(intersections) - 1):
             p1, d1 = intersections[index]
             p2, d2 = intersections[index + 1]
             if p1 != p2:
-                middle = p1.add(p2).div(2)
-                new_line = Line(get_original_point(d1), get_original_point(d2))
-                if self.is_point_inside(middle):
-                    inner.append(new_line)
-                else:
-                    outer.append(new_line)
+                pieces.append((p1.add(p2).div(2), Line(get_original_point(d1),
+                        get_original_point(d2))))
+        inside_states = self.are_points_inside(
+                [middle for middle, new_line in pieces])
+        for (middle, new_line), is_inside in zip(pieces, inside_states):
+            if is_inside:
+                inner.append(new_line)
+            else:
+                outer.append(new_line)
         return (inner, outer)
 
+def get_offset_polygons(polygons, offset, callback=None):
+    """ shift the borders of the area covered by a group of polygons
+
+    All polygons are processed at once. Thus islands and holes are merged or
+    split according to the offset. Polygons at different heights are
+    processed separately.
+    @value polygons: closed outer polygons (counter-clockwise), holes
+        (clockwise) and open polygons (surrounded with the absolute offset)
+    @type polygons: list(Polygon)
+    @value offset: positive values enlarge the area
+    @type offset: float
+    @value callback: function to call after finishing a single step.
+        It should return True if the user interrupted the operation.
+    @type callback: callable
+    @returns: the resulting polygons (or None if the operation was
+        interrupted)
+    @rtype: list(Polygon)
+    """
+    layers = {}
+    for polygon in polygons:
+        if polygon.get_points():
+            layers.setdefault(polygon.minz, []).append(polygon)
+    result = []
+    for z in sorted(layers):
+        plane = layers[z][0].plane
+        contours = [([(point.x, point.y) for point in polygon.get_points()],
+                polygon.is_closed) for polygon in layers[z]]
+        offset_contours = get_offset_contours(contours, offset,
+                callback=callback)
+        if offset_contours is None:
+            return None
+        for contour in offset_contours:
+            points = [Point(x, y, z) for x, y in contour]
+            polygon = Polygon(plane=plane)
+            for index in range(len(points)):
+                polygon.append(Line(points[index - 1], points[index]))
+            result.append(polygon)
+    return result
@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Offset a group of closed and open contours (xy plane) at once.
+# The algorithm follows the approach of the "Clipper" library:
+#   1) Every contour is turned into a raw outline: each line is shifted by the
+#      offset and the shifted lines are connected at the corners (mitered
+#      corners on the outside, the original vertex on the inside). Open
+#      contours are surrounded by an outline with round caps at both ends.
+#      The raw outlines intersect themselves and each other.
+#   2) The raw outlines are converted to integer coordinates. Every segment
+#      is split at all intersections (found via a uniform grid). The
+#      intersections are calculated exactly and rounded to the integer grid.
+#   3) The split segments form a planar graph. Its faces are traced and the
+#      winding number of every face is calculated: the winding number changes
+#      by the weight of an edge when crossing it. The unbounded face of each
+#      connected component gets its winding number via a ray cast.
+#   4) The result is the boundary of all faces with a positive winding
+#      number. Outer contours are counter-clockwise, holes are clockwise.
+# The result is deterministic and the effort grows with O((n + k) log n) for
+# n segments and k intersections.
+
+from pycam.Geometry.LineGrid import SegmentGrid
+from pycam.Geometry.utils import epsilon
+import math
+
+
+# the resolution of the integer coordinates is a tenth of epsilon
+SCALE = 10.0 / epsilon
+# sharper outside corners are cut off (multiple of the offset)
+MITER_LIMIT = 2.0
+# maximum deviation of the round caps of open contours (relative to the offset)
+ARC_TOLERANCE = 0.002
+
+
+def _get_clean_points(points, is_closed):
+    """ remove consecutive duplicate points """
+    result = []
+    for point in points:
+        if (not result) or (abs(point[0] - result[-1][0]) >= epsilon) \
+                or (abs(point[1] - result[-1][1]) >= epsilon):
+            result.append(point)
+    if is_closed and (len(result) > 1) \
+            and (abs(result[0][0] - result[-1][0]) < epsilon) \
+            and (abs(result[0][1] - result[-1][1]) < epsilon):
+        result.pop()
+    return result
+
+def _get_direction(p1, p2):
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    length = math.hypot(dx, dy)
+    return (dx / length, dy / length)
+
+def _get_max_inset(p1, p2, p3):
+    """ half the length of the shorter line next to the vertex p2 """
+    return 0.5 * min(math.hypot(p2[0] - p1[0], p2[1] - p1[1]),
+            math.hypot(p3[0] - p2[0], p3[1] - p2[1]))
+
+def _add_join(outline, point, dir_in, dir_out, offset, max_inset):
+    """ connect the shifted incoming and outgoing line at a vertex
+
+    @value max_inset: the maximum length, that may be cut off the shifted
+        lines at an inside corner
+    """
+    # the shifted lines are on the right side (for positive offsets)
+    shift_in = (dir_in[1] * offset, -dir_in[0] * offset)
+    shift_out = (dir_out[1] * offset, -dir_out[0] * offset)
+    end_in = (point[0] + shift_in[0], point[1] + shift_in[1])
+    start_out = (point[0] + shift_out[0], point[1] + shift_out[1])
+    cross = dir_in[0] * dir_out[1] - dir_in[1] * dir_out[0]
+    dot = dir_in[0] * dir_out[0] + dir_in[1] * dir_out[1]
+    if (abs(cross) < epsilon) and (dot > 0):
+        # straight continuation
+        outline.append(end_in)
+    elif (cross * offset < 0) and (dot > -1 + epsilon):
+        # inside corner
+        if abs(offset * cross) / (1 + dot) <= max_inset:
+            # the shifted lines intersect within their length
+            factor = offset / (1 + dot)
+            outline.append((point[0] + (shift_in[0] + shift_out[0]) \
+                    / offset * factor, point[1] + (shift_in[1] \
+                    + shift_out[1]) / offset * factor))
+        else:
+            # the loop via the vertex is removed later
+            outline.extend((end_in, point, start_out))
+    elif 1 + dot >= 2 / MITER_LIMIT ** 2:
+        factor = offset / (1 + dot)
+        outline.append((point[0] + (shift_in[0] + shift_out[0]) / offset \
+                * factor, point[1] + (shift_in[1] + shift_out[1]) / offset \
+                * factor))
+    else:
+        # cut off the corner
+        distance = abs(offset)
+        outline.append((end_in[0] + dir_in[0] * distance,
+                end_in[1] + dir_in[1] * distance))
+        outline.append((start_out[0] - dir_out[0] * distance,
+                start_out[1] - dir_out[1] * distance))
+
+def _add_cap(outline, point, direction, radius):
+    """ add a half circle around the end of an open contour (without its
+    start and end point)
+    """
+    ratio = max(0, 1 - ARC_TOLERANCE)
+    steps = max(2, int(math.ceil(math.pi / (2 * math.acos(ratio)))))
+    # start on the right side of the direction
+    start_angle = math.atan2(-direction[0], direction[1])
+    for step in range(1, steps):
+        angle = start_angle + math.pi * step / steps
+        outline.append((point[0] + radius * math.cos(angle),
+                point[1] + radius * math.sin(angle)))
+
+def _get_side(points, offset):
+    """ shift an open contour to its right side """
+    directions = [_get_direction(p1, p2)
+            for p1, p2 in zip(points[:-1], points[1:])]
+    side = [(points[0][0] + directions[0][1] * offset,
+            points[0][1] - directions[0][0] * offset)]
+    for index in range(1, len(points) - 1):
+        _add_join(side, points[index], directions[index - 1],
+                directions[index], offset, _get_max_inset(points[index - 1],
+                    points[index], points[index + 1]))
+    side.append((points[-1][0] + directions[-1][1] * offset,
+            points[-1][1] - directions[-1][0] * offset))
+    return side, directions[-1]
+
+def _get_raw_outline(points, is_closed, offset):
+    if is_closed:
+        directions = [_get_direction(points[index], points[index + 1])
+                for index in range(-1, len(points) - 1)]
+        outline = []
+        for index, point in enumerate(points):
+            following = (index + 1) % len(points)
+            _add_join(outline, point, directions[index],
+                    directions[following], offset, _get_max_inset(
+                        points[index - 1], point, points[following]))
+        return outline
+    else:
+        radius = abs(offset)
+        forward, end_direction = _get_side(points, radius)
+        reversed_points = list(reversed(points))
+        backward, start_direction = _get_side(reversed_points, radius)
+        outline = forward
+        _add_cap(outline, points[-1], end_direction, radius)
+        outline.extend(backward)
+        _add_cap(outline, points[0], start_direction, radius)
+        return outline
+
+def _divide_rounded(numerator, denominator):
+    """ integer division (rounded) for a positive denominator """
+    return (2 * numerator + denominator) // (2 * denominator)
+
+def _get_split_points(segment1, segment2):
+    """ calculate the points where both segments need to be split
+
+    @returns: the split points of both segments (excluding their ends)
+    @rtype: tuple(list(tuple(int)))
+    """
+    (ax, ay), (bx, by) = segment1
+    (cx, cy), (dx, dy) = segment2
+    rx, ry = bx - ax, by - ay
+    sx, sy = dx - cx, dy - cy
+    qx, qy = cx - ax, cy - ay
+    denominator = rx * sy - ry * sx
+    if denominator == 0:
+        if qx * ry - qy * rx != 0:
+            # parallel
+            return (), ()
+        # collinear: split each segment at the ends of the other one
+        def get_inner_points(start, vector, points):
+            length_sq = vector[0] ** 2 + vector[1] ** 2
+            result = []
+            for point in points:
+                position = (point[0] - start[0]) * vector[0] \
+                        + (point[1] - start[1]) * vector[1]
+                if 0 < position < length_sq:
+                    result.append(point)
+            return result
+        return (get_inner_points(segment1[0], (rx, ry), segment2),
+                get_inner_points(segment2[0], (sx, sy), segment1))
+    factor1 = qx * sy - qy * sx
+    factor2 = qx * ry - qy * rx
+    if denominator < 0:
+        denominator, factor1, factor2 = -denominator, -factor1, -factor2
+    if not ((0 <= factor1 <= denominator) and (0 <= factor2 <= denominator)):
+        return (), ()
+    point = (ax + _divide_rounded(rx * factor1, denominator),
+            ay + _divide_rounded(ry * factor1, denominator))
+    splits1 = [point] if (point != segment1[0]) and (point != segment1[1]) \
+            else []
+    splits2 = [point] if (point != segment2[0]) and (point != segment2[1]) \
+            else []
+    return splits1, splits2
+
+def _get_weighted_edges(segments):
+    """ split all segments at their intersections
+
+    @returns: the weight of every edge (v1, v2) with v1 < v2 - the weight is
+        the number of segments going from v1 to v2 minus the number of
+        segments in the opposite direction
+    @rtype: dict
+    """
+    splits = [[] for segment in segments]
+    for index1, index2 in SegmentGrid(segments, margin=0).get_candidate_pairs():
+        splits1, splits2 = _get_split_points(segments[index1],
+                segments[index2])
+        splits[index1].extend(splits1)
+        splits[index2].extend(splits2)
+    edges = {}
+    for segment, points in zip(segments, splits):
+        start, end = segment
+        vector = (end[0] - start[0], end[1] - start[1])
+        points.sort(key=lambda point: (point[0] - start[0]) * vector[0] \
+                + (point[1] - start[1]) * vector[1])
+        points.append(end)
+        for point in points:
+            if point == start:
+                continue
+            if start < point:
+                key, weight = (start, point), 1
+            else:
+                key, weight = (point, start), -1
+            edges[key] = edges.get(key, 0) + weight
+            start = point
+    for key, weight in edges.items():
+        if weight == 0:
+            del edges[key]
+    return edges
+
+def _get_winding_function(edges):
+    """ return a function calculating the winding number of a position
+    (x - 0.5, y) for an integer vertex (x, y) via a ray cast to the left
+    """
+    edge_list = [(v1, v2, weight) for (v1, v2), weight in edges.iteritems()
+            if v1[1] != v2[1]]
+    if not edge_list:
+        return lambda vertex: 0
+    miny = min([min(v1[1], v2[1]) for v1, v2, weight in edge_list])
+    maxy = max([max(v1[1], v2[1]) for v1, v2, weight in edge_list])
+    # horizontal strips reduce the number of edges to be checked
+    height = (maxy - miny) // int(math.sqrt(len(edge_list))) + 1
+    strips = {}
+    for edge in edge_list:
+        v1, v2, weight = edge
+        for strip in range((min(v1[1], v2[1]) - miny) // height,
+                (max(v1[1], v2[1]) - miny) // height + 1):
+            strips.setdefault(strip, []).append(edge)
+    def get_winding(vertex):
+        # use doubled coordinates to avoid fractions
+        px, py = 2 * vertex[0] - 1, 2 * vertex[1]
+        winding = 0
+        for v1, v2, weight in strips.get((vertex[1] - miny) // height, ()):
+            ax, ay, bx, by = 2 * v1[0], 2 * v1[1], 2 * v2[0], 2 * v2[1]
+            if not (min(ay, by) <= py < max(ay, by)):
+                continue
+            # the sign of the horizontal distance between edge and position
+            distance = (ax - px) * (by - ay) + (py - ay) * (bx - ax)
+            if distance * (by - ay) < 0:
+                # the edge crosses the ray on the left side
+                if ay > by:
+                    winding += weight
+                else:
+                    winding -= weight
+        return winding
+    return get_winding
+
+def _get_filled_contours(edges):
+    """ trace the boundaries of all areas with a positive winding number
+
+    @returns: closed contours of integer vertices
+    @rtype: list(list(tuple(int)))
+    """
+    targets = []
+    weights = []
+    outgoing = {}
+    for (v1, v2), weight in sorted(edges.iteritems()):
+        # the half edges of an edge are stored next to each other
+        outgoing.setdefault(v1, []).append(len(targets))
+        targets.append(v2)
+        weights.append(weight)
+        outgoing.setdefault(v2, []).append(len(targets))
+        targets.append(v1)
+        weights.append(-weight)
+    # sort the half edges around each vertex (counter-clockwise)
+    positions = [None] * len(targets)
+    for vertex, half_edges in outgoing.iteritems():
+        half_edges.sort(key=lambda half_edge: math.atan2(
+                targets[half_edge][1] - vertex[1],
+                targets[half_edge][0] - vertex[0]))
+        for position, half_edge in enumerate(half_edges):
+            positions[half_edge] = position
+    def get_next(half_edge, is_valid=None):
+        # the next half edge of the face on the left side: turn clockwise
+        # starting from the reverse direction
+        half_edges = outgoing[targets[half_edge]]
+        position = positions[half_edge ^ 1]
+        for step in range(1, len(half_edges) + 1):
+            candidate = half_edges[(position - step) % len(half_edges)]
+            if (is_valid is None) or is_valid(candidate):
+                return candidate
+        return None
+    # trace the faces
+    faces = [None] * len(targets)
+    face_edges = []
+    for half_edge in range(len(targets)):
+        if faces[half_edge] is None:
+            face = len(face_edges)
+            current_edges = []
+            current = half_edge
+            while faces[current] is None:
+                faces[current] = face
+                current_edges.append(current)
+                current = get_next(current)
+            face_edges.append(current_edges)
+    # calculate the winding numbers of all faces
+    get_winding = _get_winding_function(edges)
+    windings = [None] * len(face_edges)
+    for vertex in sorted(outgoing):
+        half_edges = outgoing[vertex]
+        if not windings[faces[half_edges[0]]] is None:
+            continue
+        # The first vertex of a connected component is its lowest leftmost
+        # vertex. The unbounded face of the component is on the left side of
+        # the half edge with the largest angle.
+        outer_face = faces[half_edges[-1]]
+        windings[outer_face] = get_winding(vertex)
+        queue = [outer_face]
+        while queue:
+            face = queue.pop()
+            for half_edge in face_edges[face]:
+                other_face = faces[half_edge ^ 1]
+                if windings[other_face] is None:
+                    windings[other_face] = windings[face] - weights[half_edge]
+                    queue.append(other_face)
+    # collect the boundaries of the filled areas
+    is_boundary = lambda half_edge: (windings[faces[half_edge]] > 0) \
+            and (windings[faces[half_edge ^ 1]] <= 0)
+    used = [False] * len(targets)
+    contours = []
+    for half_edge in range(len(targets)):
+        if used[half_edge] or not is_boundary(half_edge):
+            continue
+        contour = []
+        current = half_edge
+        while not used[current]:
+            used[current] = True
+            contour.append(targets[current ^ 1])
+            current = get_next(current, is_valid=is_boundary)
+        contours.append(contour)
+    return contours
+
+def _get_simplified_contour(contour):
+    """ remove collinear vertices and vertices that are too close to their
+    neighbours
+    """
+    min_distance_sq = (2 * epsilon * SCALE) ** 2
+    changed = True
+    while changed and (len(contour) > 2):
+        changed = False
+        result = []
+        count = len(contour)
+        for index, vertex in enumerate(contour):
+            previous = result[-1] if result else contour[index - 1]
+            following = contour[(index + 1) % count]
+            if (vertex[0] - previous[0]) ** 2 + (vertex[1] - previous[1]) ** 2 \
+                    < min_distance_sq:
+                changed = True
+                continue
+            if (vertex[0] - previous[0]) * (following[1] - vertex[1]) \
+                    == (vertex[1] - previous[1]) * (following[0] - vertex[0]):
+                changed = True
+                continue
+            result.append(vertex)
+        contour = result
+    if len(contour) < 3:
+        return None
+    return contour
+
+def get_offset_contours(contours, offset, callback=None):
+    """ calculate the area covered by the contours and shift its borders
+
+    @value contours: the points (x, y) of each contour and its "closed" flag.
+        Closed outer contours need to be counter-clockwise, holes are
+        clockwise. Open contours are surrounded with the absolute offset.
+    @type contours: list(tuple(list(tuple(float)), bool))
+    @value offset: positive values enlarge the area
+    @type offset: float
+    @value callback: function to call after finishing a single step.
+        It should return True if the user interrupted the operation.
+    @type callback: callable
+    @returns: the closed contours of the resulting area (counter-clockwise
+        for outer contours, clockwise for holes) or None if the operation was
+        interrupted
+    @rtype: list(list(tuple(float)))
+    """
+    segments = []
+    for points, is_closed in contours:
+        points = _get_clean_points(points, is_closed)
+        if is_closed and (len(points) < 3):
+            continue
+        if not is_closed and ((len(points) < 2) or (offset == 0)):
+            continue
+        if offset == 0:
+            outline = points
+        else:
+            outline = _get_raw_outline(points, is_closed, offset)
+        vertices = [(int(round(x * SCALE)), int(round(y * SCALE)))
+                for x, y in outline]
+        for index in range(len(vertices)):
+            start, end = vertices[index - 1], vertices[index]
+            if start != end:
+                segments.append((start, end))
+    if callback and callback():
+        return None
+    edges = _get_weighted_edges(segments)
+    if callback and callback():
+        return None
+    result = []
+    for contour in _get_filled_contours(edges):
+        contour = _get_simplified_contour(contour)
+        if contour:
+            result.append([(x / SCALE, y / SCALE) for x, y in contour])
+    return result
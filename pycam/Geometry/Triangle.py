@@ -40,8 +40,8 @@ except ImportError:
 class Triangle(IDGenerator, TransformableContainer):
 
     __slots__ = ["id", "p1", "p2", "p3", "normal", "minx", "maxx", "miny",
-            "maxy", "minz", "maxz", "e1", "e2", "e3", "normal", "center",
-            "radius", "radiussq", "middle"]
+            "maxy", "minz", "maxz", "_e1", "_e2", "_e3", "_center", "_plane",
+            "_radius", "_radiussq", "_middle"]
 
     def __init__(self, p1=None, p2=None, p3=None, n=None):
         # points are expected to be in ClockWise order
@@ -59,9 +59,6 @@ class Triangle(IDGenerator, TransformableContainer):
         self.maxx = max(self.p1.x, self.p2.x, self.p3.x)
         self.maxy = max(self.p1.y, self.p2.y, self.p3.y)
         self.maxz = max(self.p1.z, self.p2.z, self.p3.z)
-        self.e1 = Line(self.p1, self.p2)
-        self.e2 = Line(self.p2, self.p3)
-        self.e3 = Line(self.p3, self.p1)
         # calculate normal, if p1-p2-pe are in clockwise order
         if self.normal is None:
             self.normal = self.p3.sub(self.p1).cross(self.p2.sub( \
@@ -70,14 +67,72 @@ class Triangle(IDGenerator, TransformableContainer):
             self.normal = self.normal.get_vector()
         # make sure that the normal has always a unit length
         self.normal = self.normal.normalized()
-        self.center = self.p1.add(self.p2).add(self.p3).div(3)
-        self.plane = Plane(self.center, self.normal)
+        # The remaining attributes are calculated on demand. This keeps the
+        # memory footprint of big models (e.g. 'MeshModel') small.
+        self._e1 = None
+        self._e2 = None
+        self._e3 = None
+        self._center = None
+        self._plane = None
+        self._radius = None
+        self._radiussq = None
+        self._middle = None
+
+    @property
+    def e1(self):
+        if self._e1 is None:
+            self._e1 = Line(self.p1, self.p2)
+        return self._e1
+
+    @property
+    def e2(self):
+        if self._e2 is None:
+            self._e2 = Line(self.p2, self.p3)
+        return self._e2
+
+    @property
+    def e3(self):
+        if self._e3 is None:
+            self._e3 = Line(self.p3, self.p1)
+        return self._e3
+
+    @property
+    def center(self):
+        if self._center is None:
+            self._center = self.p1.add(self.p2).add(self.p3).div(3)
+        return self._center
+
+    @property
+    def plane(self):
+        if self._plane is None:
+            self._plane = Plane(self.center, self.normal)
+        return self._plane
+
+    @property
+    def radius(self):
+        if self._radius is None:
+            self._calculate_circumcircle()
+        return self._radius
+
+    @property
+    def radiussq(self):
+        if self._radiussq is None:
+            self._calculate_circumcircle()
+        return self._radiussq
+
+    @property
+    def middle(self):
+        if self._middle is None:
+            self._calculate_circumcircle()
+        return self._middle
+
+    def _calculate_circumcircle(self):
         # calculate circumcircle (resulting in radius and middle)
         denom = self.p2.sub(self.p1).cross(self.p3.sub(self.p2)).norm
-        self.radius = (self.p2.sub(self.p1).norm \
+        self._radius = (self.p2.sub(self.p1).norm \
                 * self.p3.sub(self.p2).norm * self.p3.sub(self.p1).norm) \
                 / (2 * denom)
-        self.radiussq = self.radius ** 2
+        self._radiussq = self._radius ** 2
         denom2 = 2 * denom * denom
         alpha = self.p3.sub(self.p2).normsq \
                 * self.p1.sub(self.p2).dot(self.p1.sub(self.p3)) / denom2
@@ -85,7 +140,7 @@ class Triangle(IDGenerator, TransformableContainer):
                 * self.p2.sub(self.p1).dot(self.p2.sub(self.p3)) / denom2
         gamma = self.p1.sub(self.p2).normsq \
                 * self.p3.sub(self.p1).dot(self.p3.sub(self.p2)) / denom2
-        self.middle = Point(
+        self._middle = Point(
                 self.p1.x * alpha + self.p2.x * beta + self.p3.x * gamma,
                 self.p1.y * alpha + self.p2.y * beta + self.p3.y * gamma,
                 self.p1.z * alpha + self.p2.z * beta + self.p3.z * gamma)
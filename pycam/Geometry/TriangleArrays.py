@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+from pycam.Geometry.TriangleKdtree import FlatTriangleKdtree
+
+
+# maximum number of position/triangle combinations to be checked at once
+# without the spatial index (limits the memory usage of the batch operations)
+PAIR_CHUNK_SIZE = 2 ** 20
+# maximum number of positions to be checked at once via the spatial index
+POSITION_CHUNK_SIZE = 2 ** 14
+
+
+def is_numpy_available():
+    return not numpy is None
+
+
+def get_triangle_normals(p1, p2, p3):
+    """ calculate the unit normals of triangles given by three (n,3) arrays
+    of clockwise ordered vertices - invalid triangles (zero area) get a zero
+    normal
+    """
+    # the normal is calculated in the same way as in Triangle.reset_cache
+    normals = numpy.cross(p3 - p1, p2 - p1)
+    lengths = numpy.sqrt((normals ** 2).sum(axis=1))
+    lengths[lengths == 0] = 1
+    return normals / lengths[:, numpy.newaxis]
+
+
+class TriangleArrays(object):
+    """ A "struct of arrays" representation of a list of triangles.
+
+    Every attribute is a numpy array with one row per triangle. This allows
+    vectorized calculations (e.g. the batch DropCutter) without touching any
+    Point or Triangle objects.
+    The vertices are expected in the same (clockwise) order as used by
+    pycam.Geometry.Triangle.Triangle.
+    """
+
+    def __init__(self, p1, p2, p3, index=None):
+        self.p1 = numpy.asarray(p1, dtype=numpy.float64).reshape(-1, 3)
+        self.p2 = numpy.asarray(p2, dtype=numpy.float64).reshape(-1, 3)
+        self.p3 = numpy.asarray(p3, dtype=numpy.float64).reshape(-1, 3)
+        self.normals = get_triangle_normals(self.p1, self.p2, self.p3)
+        self.minx, self.miny, self.minz = [numpy.minimum(numpy.minimum(
+                self.p1[:, dim], self.p2[:, dim]), self.p3[:, dim])
+                for dim in range(3)]
+        self.maxx, self.maxy, self.maxz = [numpy.maximum(numpy.maximum(
+                self.p1[:, dim], self.p2[:, dim]), self.p3[:, dim])
+                for dim in range(3)]
+        # the spatial index is built on demand (see 'get_index')
+        self._index = index
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        coords = [[], [], []]
+        for t in triangles:
+            for index, p in enumerate((t.p1, t.p2, t.p3)):
+                coords[index].append((p.x, p.y, p.z))
+        return cls(*coords)
+
+    def __len__(self):
+        return len(self.p1)
+
+    def select(self, indices):
+        """ return a new TriangleArrays object containing only the triangles
+        with the given indices (or boolean mask)
+        """
+        return self.__class__(self.p1[indices], self.p2[indices],
+                self.p3[indices])
+
+    def get_index(self):
+        """ return the spatial index of the triangles (built on demand) """
+        if self._index is None:
+            self._index = FlatTriangleKdtree(self.minx, self.maxx, self.miny,
+                    self.maxy)
+        return self._index
+
+    def get_candidate_pairs(self, xs, ys, radius):
+        """ Generate all combinations of positions and triangles, whose
+        bounding boxes are within 'radius' of each other.
+        The pairs are returned in chunks as two arrays of position and
+        triangle indices. The position indices are sorted in ascending order.
+        Small problems are solved by checking all combinations. The spatial
+        index is used otherwise.
+        """
+        if (len(self) == 0) or (len(xs) == 0):
+            return
+        if len(self) * len(xs) <= PAIR_CHUNK_SIZE:
+            chunk_x = xs[:, numpy.newaxis]
+            chunk_y = ys[:, numpy.newaxis]
+            mask = (self.minx <= chunk_x + radius) \
+                    & (self.maxx >= chunk_x - radius) \
+                    & (self.miny <= chunk_y + radius) \
+                    & (self.maxy >= chunk_y - radius)
+            pos_indices, tri_indices = numpy.nonzero(mask)
+            if len(pos_indices) > 0:
+                yield pos_indices, tri_indices
+            return
+        index = self.get_index()
+        for start in range(0, len(xs), POSITION_CHUNK_SIZE):
+            chunk_x = xs[start:start + POSITION_CHUNK_SIZE]
+            chunk_y = ys[start:start + POSITION_CHUNK_SIZE]
+            pos_indices, tri_indices = index.search_bulk(chunk_x - radius,
+                    chunk_x + radius, chunk_y - radius, chunk_y + radius)
+            if len(pos_indices) > 0:
+                order = numpy.argsort(pos_indices, kind="mergesort")
+                yield pos_indices[order] + start, tri_indices[order]
+
+    def get_edges(self):
+        """ return the three edges of all triangles (start and end arrays) """
+        return ((self.p1, self.p2), (self.p2, self.p3), (self.p3, self.p1))
+
+    def get_vertices(self):
+        return (self.p1, self.p2, self.p3)
+
+    def get_upward_normals(self, tri_indices):
+        """ return the normals of the given triangles - flipped upwards """
+        normals = self.normals[tri_indices]
+        return numpy.where(normals[:, 2:3] < 0, -normals, normals)
+
+    def get_plane_heights(self, tri_indices, xs, ys):
+        """ calculate the z value of the triangles' planes at the given
+        positions. The result for vertical triangles is undefined.
+        """
+        normals = self.normals[tri_indices]
+        p1 = self.p1[tri_indices]
+        nz = normals[:, 2]
+        nz = numpy.where(nz == 0, 1, nz)
+        return p1[:, 2] - (normals[:, 0] * (xs - p1[:, 0]) \
+                + normals[:, 1] * (ys - p1[:, 1])) / nz
+
+    def is_point_inside(self, tri_indices, xs, ys):
+        """ check if the given positions are inside of the projection of the
+        triangles onto the xy plane (including the border)
+        """
+        p1 = self.p1[tri_indices]
+        v0x = self.p3[tri_indices, 0] - p1[:, 0]
+        v0y = self.p3[tri_indices, 1] - p1[:, 1]
+        v1x = self.p2[tri_indices, 0] - p1[:, 0]
+        v1y = self.p2[tri_indices, 1] - p1[:, 1]
+        v2x = xs - p1[:, 0]
+        v2y = ys - p1[:, 1]
+        denom = v0x * v1y - v1x * v0y
+        valid = denom != 0
+        denom = numpy.where(valid, denom, 1)
+        u = (v2x * v1y - v1x * v2y) / denom
+        v = (v0x * v2y - v2x * v0y) / denom
+        return valid & (u >= 0) & (v >= 0) & (u + v <= 1)
@@ -22,6 +22,12 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 
 from pycam.Geometry.kdtree import kdtree, Node
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
 overlaptest = True
 
 def SearchKdtree2d(tree, minx, maxx, miny, maxy):
@@ -89,3 +95,198 @@ class TriangleKdtree(kdtree):
     def Search(self, minx, maxx, miny, maxy):
         return SearchKdtree2d(self, minx, maxx, miny, maxy)
 
+
+def _spread_bits(values):
+    """ insert a zero bit between all bits of 16 bit integers """
+    values = values.astype(numpy.uint32)
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    values = (values | (values << 1)) & 0x55555555
+    return values
+
+
+def _get_float_array(values):
+    """ single precision arrays (e.g. the bounds of a MeshModel) are used
+    without a copy - everything else is converted to double precision
+    """
+    values = numpy.asarray(values)
+    if values.dtype != numpy.float32:
+        values = values.astype(numpy.float64, copy=False)
+    return values
+
+
+class FlatTriangleKdtree(object):
+    """ A spatial index for the bounding boxes (in the xy plane) of triangles.
+
+    The triangles are sorted along a z-order curve of their centers. This
+    equals a kd-tree with alternating split dimensions. Consecutive groups
+    of 'bucket_size' triangles form the leaves of an implicit binary tree:
+    the children of node 'i' are '2i+1' and '2i+2'. The bounding boxes of
+    all nodes are stored in flat lists. Thus the tree is built without any
+    recursion or node objects.
+    All searches use an explicit stack. The results are numpy arrays of
+    triangle indices.
+    """
+
+    def __init__(self, minx, maxx, miny, maxy, bucket_size=16, order=None,
+            leaf_bounds=None):
+        """ The parameters 'order' and 'leaf_bounds' are used only for
+        restoring a tree (see 'get_arrays').
+        """
+        self.minx, self.maxx, self.miny, self.maxy = [
+                _get_float_array(values) for values in (minx, maxx, miny, maxy)]
+        self.bucket_size = bucket_size
+        count = len(self.minx)
+        # the number of leaves is a power of two
+        self.leaf_count = 1
+        while self.leaf_count * bucket_size < count:
+            self.leaf_count *= 2
+        # the index of the first leaf node
+        self.first_leaf = self.leaf_count - 1
+        if not order is None:
+            self.order = order
+        elif count > 0:
+            self.order = self._get_curve_order()
+        else:
+            self.order = numpy.zeros(0, dtype=numpy.intp)
+        if leaf_bounds is None:
+            bounds = self._get_leaf_bounds()
+        else:
+            bounds = leaf_bounds
+        # Combine two nodes to get their parent (level by level).
+        levels = [bounds]
+        while len(levels[0][0]) > 1:
+            minx, maxx, miny, maxy = levels[0]
+            levels.insert(0, (numpy.minimum(minx[0::2], minx[1::2]),
+                    numpy.maximum(maxx[0::2], maxx[1::2]),
+                    numpy.minimum(miny[0::2], miny[1::2]),
+                    numpy.maximum(maxy[0::2], maxy[1::2])))
+        self.node_minx, self.node_maxx, self.node_miny, self.node_maxy = [
+                numpy.concatenate([level[dim] for level in levels]).tolist()
+                for dim in range(4)]
+
+    @classmethod
+    def from_triangles(cls, triangles, **kwargs):
+        bounds = [(t.minx, t.maxx, t.miny, t.maxy) for t in triangles]
+        if bounds:
+            return cls(*zip(*bounds), **kwargs)
+        else:
+            return cls([], [], [], [], **kwargs)
+
+    def _get_curve_order(self):
+        """ sort the triangles along the z-order curve of their centers """
+        codes = 0
+        for lows, highs, shift in ((self.minx, self.maxx, 0),
+                (self.miny, self.maxy, 1)):
+            centers = (lows + highs) / 2
+            low = centers.min()
+            size = centers.max() - low
+            if size > 0:
+                scaled = (centers - low) * (0xFFFF / size)
+            else:
+                scaled = numpy.zeros(len(centers))
+            codes = codes | (_spread_bits(scaled) << shift)
+        return numpy.argsort(codes, kind="mergesort")
+
+    def _get_leaf_bounds(self):
+        starts = numpy.arange(self.leaf_count) * self.bucket_size
+        used = starts < len(self.order)
+        result = []
+        for values, reduce_func, empty in (
+                (self.minx, numpy.minimum, numpy.inf),
+                (self.maxx, numpy.maximum, -numpy.inf),
+                (self.miny, numpy.minimum, numpy.inf),
+                (self.maxy, numpy.maximum, -numpy.inf)):
+            # unused leaves never overlap with anything
+            bounds = numpy.empty(self.leaf_count)
+            bounds[:] = empty
+            if used.any():
+                bounds[used] = reduce_func.reduceat(values[self.order],
+                        starts[used])
+            result.append(bounds)
+        return result
+
+    def get_arrays(self):
+        """ Return the arrays required for restoring the tree (apart from the
+        bounding boxes of the triangles): the order of the triangles and the
+        bounds (minx, maxx, miny, maxy) of the leaves.
+        """
+        leaf_bounds = numpy.array([getattr(self, name)[self.first_leaf:]
+                for name in ("node_minx", "node_maxx", "node_miny",
+                    "node_maxy")])
+        return self.order, leaf_bounds
+
+    def __len__(self):
+        return len(self.order)
+
+    def _get_leaf_items(self, node):
+        start = (node - self.first_leaf) * self.bucket_size
+        return self.order[start:start + self.bucket_size]
+
+    def search(self, minx, maxx, miny, maxy):
+        """ return the indices of all triangles with a bounding box
+        overlapping the given rectangle
+        """
+        candidates = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if (self.node_minx[node] > maxx) or (self.node_maxx[node] < minx) \
+                    or (self.node_miny[node] > maxy) \
+                    or (self.node_maxy[node] < miny):
+                continue
+            if node >= self.first_leaf:
+                candidates.append(self._get_leaf_items(node))
+            else:
+                stack.append(2 * node + 1)
+                stack.append(2 * node + 2)
+        if not candidates:
+            return numpy.zeros(0, dtype=numpy.intp)
+        candidates = numpy.concatenate(candidates)
+        mask = (self.minx[candidates] <= maxx) \
+                & (self.maxx[candidates] >= minx) \
+                & (self.miny[candidates] <= maxy) \
+                & (self.maxy[candidates] >= miny)
+        return candidates[mask]
+
+    def search_bulk(self, minx, maxx, miny, maxy):
+        """ Find the overlapping triangles for many rectangles at once.
+        The parameters are arrays with one item per rectangle.
+        The result consists of two arrays: the indices of rectangles and the
+        indices of the overlapping triangles.
+        """
+        minx = numpy.asarray(minx, dtype=numpy.float64)
+        maxx = numpy.asarray(maxx, dtype=numpy.float64)
+        miny = numpy.asarray(miny, dtype=numpy.float64)
+        maxy = numpy.asarray(maxy, dtype=numpy.float64)
+        box_results = []
+        item_results = []
+        stack = [(0, numpy.arange(len(minx)))]
+        while stack:
+            node, boxes = stack.pop()
+            boxes = boxes[(minx[boxes] <= self.node_maxx[node]) \
+                    & (maxx[boxes] >= self.node_minx[node]) \
+                    & (miny[boxes] <= self.node_maxy[node]) \
+                    & (maxy[boxes] >= self.node_miny[node])]
+            if len(boxes) == 0:
+                continue
+            if node < self.first_leaf:
+                stack.append((2 * node + 1, boxes))
+                stack.append((2 * node + 2, boxes))
+                continue
+            # check all combinations of rectangles and triangles of this leaf
+            items = self._get_leaf_items(node)
+            box_indices, item_indices = numpy.nonzero(
+                    (minx[boxes, numpy.newaxis] <= self.maxx[items]) \
+                    & (maxx[boxes, numpy.newaxis] >= self.minx[items]) \
+                    & (miny[boxes, numpy.newaxis] <= self.maxy[items]) \
+                    & (maxy[boxes, numpy.newaxis] >= self.miny[items]))
+            box_results.append(boxes[box_indices])
+            item_results.append(items[item_indices])
+        if box_results:
+            return (numpy.concatenate(box_results),
+                    numpy.concatenate(item_results))
+        else:
+            return (numpy.zeros(0, dtype=numpy.intp),
+                    numpy.zeros(0, dtype=numpy.intp))
@@ -96,6 +96,7 @@ PREFERENCES_DEFAULTS = {
         "gcode_path_mode": 0,
         "gcode_motion_tolerance": 0,
         "gcode_naive_tolerance": 0,
+        "gcode_arc_tolerance": 0,
         "gcode_start_stop_spindle": True,
         "gcode_filename_extension": "",
         "gcode_spindle_delay": 3,
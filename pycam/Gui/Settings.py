@@ -139,6 +139,7 @@ material_allowance: 0.0
 step_down: 3.0
 overlap_percent: 0
 pocketing_type: none
+simplify_tolerance: 0.0
 
 [BoundsDefault]
 name: No Margin
@@ -189,6 +190,7 @@ step_down: 3.0
 material_allowance: 0.0
 overlap_percent: 0
 pocketing_type: none
+simplify_tolerance: 0.0
 
 [Process0]
 name: Remove material
@@ -277,6 +279,7 @@ process: 3
             "step_down": float,
             "engrave_offset": float,
             "pocketing_type": str,
+            "simplify_tolerance": float,
             "tool": object,
             "process": object,
             "bounds": object,
@@ -296,7 +299,7 @@ process: 3
             "process": ("name", "path_strategy", "path_direction",
                     "milling_style", "material_allowance",
                     "overlap_percent", "step_down", "engrave_offset",
-                    "pocketing_type"),
+                    "pocketing_type", "simplify_tolerance"),
             "bounds": ("name", "type", "x_low", "x_high", "y_low",
                     "y_high", "z_low", "z_high"),
             "task": ("name", "tool", "process", "bounds", "enabled"),
@@ -588,6 +591,7 @@ class ToolpathSettings(object):
             "engrave_offset": float,
             "milling_style": str,
             "pocketing_type": str,
+            "simplify_tolerance": float,
         },
     }
 
@@ -662,7 +666,8 @@ class ToolpathSettings(object):
 
     def set_process_settings(self, generator, postprocessor, path_direction,
             material_allowance=0.0, overlap_percent=0, step_down=1.0,
-            engrave_offset=0.0, milling_style="ignore", pocketing_type="none"):
+            engrave_offset=0.0, milling_style="ignore", pocketing_type="none",
+            simplify_tolerance=0.0):
         # TODO: this hack should be somewhere else, I guess
         if generator in ("ContourFollow", "EngraveCutter"):
             material_allowance = 0.0
@@ -676,6 +681,7 @@ class ToolpathSettings(object):
                 "engrave_offset": engrave_offset,
                 "milling_style": milling_style,
                 "pocketing_type": pocketing_type,
+                "simplify_tolerance": simplify_tolerance,
         }
 
     def get_process_settings(self):
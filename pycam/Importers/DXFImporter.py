@@ -21,13 +21,14 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from pycam.Geometry.Triangle import Triangle
-from pycam.Geometry.Point import Point
+from pycam.Geometry.Point import Point, get_hash_key, get_hash_keys_near
 from pycam.Geometry.Line import Line
 import pycam.Geometry.Model
 import pycam.Geometry.Matrix
 import pycam.Geometry
 import pycam.Utils.log
 import pycam.Utils
+import collections
 import math
 import re
 import os
@@ -118,28 +119,52 @@ class DXFParser(object):
 
     def optimize_line_order(self):
         groups = []
-        current_group = []
+        current_group = collections.deque()
         groups.append(current_group)
-        remaining_lines = self.lines[:]
+        # Hash the start and end points of all lines. Thus the connectable
+        # lines are found without scanning all remaining lines.
+        starts = {}
+        ends = {}
+        for index, line in enumerate(self.lines):
+            starts.setdefault(get_hash_key(line.p1), []).append(index)
+            ends.setdefault(get_hash_key(line.p2), []).append(index)
+        def get_connectable_indexes(point, hashed_lines):
+            for key in get_hash_keys_near(point):
+                for index in hashed_lines.get(key, ()):
+                    if index in remaining_lines:
+                        yield index
+        remaining_lines = set(range(len(self.lines)))
+        next_index = 0
         while remaining_lines:
             if self.callback and self.callback():
                 return
             if not current_group:
-                current_group.append(remaining_lines.pop(0))
+                while not next_index in remaining_lines:
+                    next_index += 1
+                current_group.append(self.lines[next_index])
+                remaining_lines.remove(next_index)
             else:
                 first_line = current_group[0]
                 last_line = current_group[-1]
-                for line in remaining_lines:
-                    if last_line.p2 == line.p1:
-                        current_group.append(line)
-                        remaining_lines.remove(line)
-                        break
-                    if first_line.p1 == line.p2:
-                        current_group.insert(0, line)
-                        remaining_lines.remove(line)
-                        break
+                # use the first matching line (in the original order)
+                candidates = []
+                for index in get_connectable_indexes(last_line.p2, starts):
+                    if last_line.p2 == self.lines[index].p1:
+                        candidates.append((index, True))
+                for index in get_connectable_indexes(first_line.p1, ends):
+                    if first_line.p1 == self.lines[index].p2:
+                        candidates.append((index, False))
+                if candidates:
+                    # appending is preferred for the same line
+                    index, append = min(candidates,
+                            key=lambda candidate: (candidate[0], not candidate[1]))
+                    if append:
+                        current_group.append(self.lines[index])
+                    else:
+                        current_group.appendleft(self.lines[index])
+                    remaining_lines.remove(index)
                 else:
-                    current_group = []
+                    current_group = collections.deque()
                     groups.append(current_group)
         def get_distance_between_groups(group1, group2):
             forward = group1[-1].p2.sub(group2[0].p1).norm
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Persistent cache for imported triangle models.
+# The arrays of a MeshModel (including its spatial index) are stored in a
+# directory named after the hash of the content of the model file (and the
+# import parameters). Every array is stored as a separate ".npy" file. Thus
+# the arrays can be memory-mapped when the model is loaded again.
+# The content hash of a model file is stored in a small ".stat" file (named
+# after the path of the model file) along with its size and modification time.
+# The cache is limited in size. The least recently used entries are removed
+# first (including the ".stat" files referring to them).
+
+from pycam.Geometry.Model import MeshModel
+from pycam.Geometry.TriangleArrays import is_numpy_available
+from pycam.Gui.Settings import get_config_dirname
+import pycam.Utils.log
+import pycam.Utils
+
+import hashlib
+import shutil
+import time
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+log = pycam.Utils.log.get_logger()
+
+CACHE_DIR = "model_cache"
+# the cache is cleaned up, if it exceeds this size (in bytes)
+MAX_CACHE_SIZE = 1024 * 1024 * 1024
+# change this value whenever the structure of the stored arrays changes
+CACHE_FORMAT_VERSION = 2
+ARRAY_NAMES = ("vertices", "faces", "normals", "face_bounds",
+        "index_order", "index_leaf_bounds")
+# this file marks a complete cache entry
+MARKER_FILENAME = "complete"
+STAT_SUFFIX = ".stat"
+# remains of interrupted processes are removed after this time (seconds)
+STALE_FILE_AGE = 24 * 3600
+
+_enabled = True
+
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled and is_numpy_available()
+
+def get_cache_dirname():
+    config_dir = get_config_dirname()
+    if config_dir is None:
+        return None
+    cache_dir = os.path.join(config_dir, CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            return None
+    return cache_dir
+
+def _get_file_hash(filename, importer, kwargs):
+    """ calculate a hash of the content of a file and the parameters of the
+    import
+    """
+    file_hash = hashlib.sha1()
+    file_hash.update("%d|%s|%s|" % (CACHE_FORMAT_VERSION,
+            importer.__module__, sorted(kwargs.items())))
+    model_file = open(filename, "rb")
+    try:
+        while True:
+            data = model_file.read(2 ** 20)
+            if not data:
+                break
+            file_hash.update(data)
+    finally:
+        model_file.close()
+    return file_hash.hexdigest()
+
+def _get_cached_hash(cache_dir, filename, importer, kwargs):
+    """ Return the content hash of a file. The hash is stored together with
+    the size and the modification time of the file. Thus the file does not
+    need to be read again, as long as it does not change.
+    """
+    stat = os.stat(filename)
+    path_key = hashlib.sha1("%s|%s|%s" % (os.path.abspath(filename),
+            importer.__module__, sorted(kwargs.items()))).hexdigest()
+    stat_filename = os.path.join(cache_dir, path_key + STAT_SUFFIX)
+    stat_line = "%d %r" % (stat.st_size, stat.st_mtime)
+    try:
+        stat_file = open(stat_filename)
+        try:
+            stored_stat, stored_hash = stat_file.read().rsplit(" ", 1)
+        finally:
+            stat_file.close()
+        if stored_stat == stat_line:
+            return stored_hash
+    except (IOError, ValueError):
+        pass
+    content_hash = _get_file_hash(filename, importer, kwargs)
+    try:
+        stat_file = open(stat_filename, "w")
+        try:
+            stat_file.write("%s %s" % (stat_line, content_hash))
+        finally:
+            stat_file.close()
+    except IOError:
+        pass
+    return content_hash
+
+def _load_entry(entry_dir):
+    arrays = {}
+    for name in ARRAY_NAMES:
+        arrays[name] = numpy.load(os.path.join(entry_dir, "%s.npy" % name),
+                mmap_mode="r")
+    # mark the entry as recently used
+    os.utime(os.path.join(entry_dir, MARKER_FILENAME), None)
+    return MeshModel.from_arrays(arrays)
+
+def _store_entry(cache_dir, entry_dir, model):
+    # write to a temporary directory first - other processes should never
+    # see an incomplete entry
+    temp_dir = "%s.%d.tmp" % (entry_dir, os.getpid())
+    try:
+        if not os.path.isdir(temp_dir):
+            os.makedirs(temp_dir)
+        for name, array in model.get_arrays().iteritems():
+            numpy.save(os.path.join(temp_dir, "%s.npy" % name), array)
+        open(os.path.join(temp_dir, MARKER_FILENAME), "w").close()
+        os.rename(temp_dir, entry_dir)
+    except (IOError, OSError), err_msg:
+        log.info("ModelCache: failed to store the model: %s" % err_msg)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return
+    _remove_old_entries(cache_dir)
+
+def _get_entry_size(entry_dir):
+    return sum([os.path.getsize(os.path.join(entry_dir, filename))
+            for filename in os.listdir(entry_dir)])
+
+def _read_stat_hash(stat_filename):
+    """ return the content hash stored in a ".stat" file (or None) """
+    try:
+        stat_file = open(stat_filename)
+        try:
+            return stat_file.read().rsplit(" ", 1)[1]
+        finally:
+            stat_file.close()
+    except (IOError, IndexError):
+        return None
+
+def _remove_old_entries(cache_dir, max_size=MAX_CACHE_SIZE):
+    """ remove the least recently used entries until the cache size is below
+    the given limit
+    """
+    entries = []
+    stat_files = {}
+    for name in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, name)
+        marker = os.path.join(entry_dir, MARKER_FILENAME)
+        if os.path.isfile(marker):
+            entries.append((os.path.getmtime(marker), entry_dir,
+                    _get_entry_size(entry_dir)))
+        elif name.endswith(STAT_SUFFIX) and os.path.isfile(entry_dir):
+            stat_files.setdefault(_read_stat_hash(entry_dir), []).append(
+                    entry_dir)
+        elif os.path.isdir(entry_dir) and name.endswith(".tmp") and \
+                (os.path.getmtime(entry_dir) < time.time() - STALE_FILE_AGE):
+            # remains of an interrupted process
+            shutil.rmtree(entry_dir, ignore_errors=True)
+    # the ".stat" files belong to the entry with their content hash
+    for index, (mtime, entry_dir, size) in enumerate(entries):
+        for stat_filename in stat_files.get(os.path.basename(entry_dir), []):
+            size += os.path.getsize(stat_filename)
+        entries[index] = (mtime, entry_dir, size)
+    # The ".stat" files of missing entries are removed after some time. The
+    # entry of a new ".stat" file is probably just being imported.
+    entry_hashes = set([os.path.basename(entry_dir)
+            for mtime, entry_dir, size in entries])
+    for content_hash, filenames in stat_files.iteritems():
+        if content_hash in entry_hashes:
+            continue
+        for stat_filename in filenames:
+            if os.path.getmtime(stat_filename) < time.time() - STALE_FILE_AGE:
+                _remove_file(stat_filename)
+    entries.sort()
+    total_size = sum([size for mtime, entry_dir, size in entries])
+    while entries and (total_size > max_size):
+        mtime, entry_dir, size = entries.pop(0)
+        log.debug("ModelCache: removing old entry %s" % entry_dir)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        for stat_filename in stat_files.get(os.path.basename(entry_dir), []):
+            _remove_file(stat_filename)
+        total_size -= size
+
+def _remove_file(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        # maybe another process removed it meanwhile
+        pass
+
+def load_model(uri, importer, **kwargs):
+    """ Load a model via the given importer function - or from the cache.
+    Only local files and models based on triangle arrays (MeshModel) are
+    cached. All additional arguments are passed to the importer.
+    """
+    uri = pycam.Utils.URIHandler(uri)
+    cache_dir = None
+    if is_enabled() and uri.is_local():
+        cache_dir = get_cache_dirname()
+    if cache_dir is None:
+        return importer(uri, **kwargs)
+    filename = uri.get_local_path()
+    try:
+        content_hash = _get_cached_hash(cache_dir, filename, importer, kwargs)
+    except (IOError, OSError), err_msg:
+        log.info("ModelCache: failed to read the model file: %s" % err_msg)
+        return importer(uri, **kwargs)
+    entry_dir = os.path.join(cache_dir, content_hash)
+    if os.path.isfile(os.path.join(entry_dir, MARKER_FILENAME)):
+        try:
+            model = _load_entry(entry_dir)
+        except (IOError, OSError, ValueError), err_msg:
+            log.info("ModelCache: removing invalid entry %s: %s" \
+                    % (entry_dir, err_msg))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        else:
+            log.info("Loaded model from cache: %s" % filename)
+            return model
+    model = importer(uri, **kwargs)
+    if isinstance(model, MeshModel):
+        _store_entry(cache_dir, entry_dir, model)
+    return model
+
@@ -25,17 +25,28 @@ from pycam.Geometry.Point import Point, Vector
 from pycam.Geometry.Triangle import Triangle
 from pycam.Geometry.PointKdtree import PointKdtree
 from pycam.Geometry.utils import epsilon
-from pycam.Geometry.Model import Model
+from pycam.Geometry.Model import Model, MeshModel
+from pycam.Geometry.TriangleArrays import is_numpy_available
 import pycam.Utils.log
 import pycam.Utils
 
 from struct import unpack 
 import StringIO
+import os
 import re
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 log = pycam.Utils.log.get_logger()
 
 
+# number of facets processed at once by the binary fast path
+BINARY_CHUNK_SIZE = 2 ** 16
+
+
 vertices = 0
 edges = 0
 kdtree = None
@@ -52,6 +63,231 @@ def UniqueVertex(x, y, z):
         vertices += 1
         return Point(x, y, z)
 
+def _get_binary_facet_count(filename):
+    """ return the number of facets of a binary STL file or None if the file
+    does not look like a binary STL file
+    """
+    try:
+        stl_file = open(filename, "rb")
+    except IOError:
+        # the error is reported by the regular import
+        return None
+    try:
+        stl_file.seek(0, os.SEEK_END)
+        size = stl_file.tell()
+        if size < 84:
+            return None
+        stl_file.seek(80)
+        numfacets = unpack("<I", stl_file.read(4))[0]
+    finally:
+        stl_file.close()
+    if (numfacets > 0) and (size == 84 + 50 * numfacets):
+        return numfacets
+    else:
+        return None
+
+def _read_binary_chunks(filename, numfacets):
+    """ Read the facets of a binary STL file chunk by chunk.
+    Every chunk is a numpy structured array. Only the current chunk is kept
+    in memory (the pages of a memory-mapped file would remain resident).
+    """
+    facet_type = numpy.dtype([("normal", "<f4", (3, )),
+            ("vertices", "<f4", (3, 3)), ("attributes", "<u2")])
+    stl_file = open(filename, "rb")
+    try:
+        stl_file.seek(84)
+        for start in range(0, numfacets, BINARY_CHUNK_SIZE):
+            count = min(BINARY_CHUNK_SIZE, numfacets - start)
+            yield numpy.frombuffer(stl_file.read(count * facet_type.itemsize),
+                    dtype=facet_type, count=count)
+    finally:
+        stl_file.close()
+
+def _get_quantized_vertices(corners):
+    """ round vertex coordinates to a grid of size 'epsilon' """
+    corners = numpy.asarray(corners, dtype=numpy.float64)
+    return numpy.round(corners / epsilon).astype(numpy.int64)
+
+def _get_vertex_hashes(quantized):
+    """ combine the three quantized coordinates of each vertex into a single
+    64 bit value
+    """
+    quantized = quantized.view(numpy.uint64)
+    return (quantized[:, 0] * numpy.uint64(0x9E3779B97F4A7C15)) \
+            ^ (quantized[:, 1] * numpy.uint64(0xC2B2AE3D27D4EB4F)) \
+            ^ (quantized[:, 2] * numpy.uint64(0x165667B19E3779F9))
+
+def _get_unique_indices(keys):
+    """ Find the unique values of 'keys'.
+    The result is the index of the first occurrence of each unique value and
+    the index of the unique value for each item of 'keys'.
+    This is similar to 'numpy.unique', but it requires less memory: only the
+    sort order is kept in full length, the groups are evaluated in chunks.
+    """
+    # the stable sort puts the first occurrence of each value at the front
+    order = numpy.argsort(keys, kind="mergesort")
+    inverse = numpy.empty(len(keys), dtype=numpy.int32)
+    first = [numpy.zeros(0, dtype=order.dtype)]
+    group_count = 0
+    previous_key = None
+    for start in range(0, len(order), BINARY_CHUNK_SIZE):
+        chunk_order = order[start:start + BINARY_CHUNK_SIZE]
+        sorted_keys = keys[chunk_order]
+        is_new = numpy.empty(len(chunk_order), dtype=numpy.bool_)
+        is_new[0] = (previous_key is None) or (sorted_keys[0] != previous_key)
+        numpy.not_equal(sorted_keys[1:], sorted_keys[:-1], out=is_new[1:])
+        previous_key = sorted_keys[-1]
+        groups = numpy.cumsum(is_new, dtype=numpy.int32)
+        groups += group_count - 1
+        group_count = int(groups[-1]) + 1
+        inverse[chunk_order] = groups
+        first.append(chunk_order[is_new])
+    return numpy.concatenate(first), inverse
+
+def ImportBinaryMesh(filename, callback=None):
+    """ Fast import of binary STL files (local files only).
+    The file is read twice in chunks: the first pass collects the normals and
+    the hashes of the vertices, the second pass collects the coordinates of
+    the merged vertices. Vertices are merged if their coordinates are
+    identical after rounding them to 'epsilon'. No Point or Triangle objects
+    are created.
+    """
+    numfacets = _get_binary_facet_count(filename)
+    if numfacets is None:
+        log.error("STLImporter: '%s' is not a binary STL file" % filename)
+        return None
+    result = _get_binary_hashes(filename, numfacets, callback=callback)
+    if result is None:
+        log.warn("STLImporter: load model operation cancelled")
+        return None
+    hashes, normals, conflicts, invalid = result
+    del result
+    if conflicts > 0:
+        log.warn(("Inconsistent normal/vertices found in %d facet " \
+                + "definitions of '%s'. Please validate the STL file!") \
+                % (conflicts, filename))
+    first_corners, faces = _get_unique_indices(hashes)
+    del hashes
+    result = _get_merged_vertices(filename, numfacets, first_corners, faces,
+            callback=callback)
+    del first_corners
+    if result is None:
+        log.warn("STLImporter: load model operation cancelled")
+        return None
+    vertices, faces = result
+    del result
+    faces = faces.reshape(-1, 3)
+    # Merging the vertices collapses triangles with corners closer than
+    # 'epsilon'.
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) \
+            & (faces[:, 2] != faces[:, 0])
+    collapsed = len(valid) - numpy.count_nonzero(valid)
+    if collapsed > 0:
+        invalid += collapsed
+        faces = faces[valid]
+        normals = normals[valid]
+        # remove the vertices that are not used anymore
+        used, faces = numpy.unique(faces, return_inverse=True)
+        vertices = vertices[used]
+        faces = faces.reshape(-1, 3)
+    if invalid > 0:
+        log.warn(("Skipped %d invalid triangles of '%s' (maybe the " \
+                + "resolution of the model is too high?)") \
+                % (invalid, filename))
+    if len(faces) == 0:
+        return None
+    model = MeshModel(vertices, faces, normals)
+    log.info("Imported STL model: %d vertices, %d edges, %d triangles" \
+            % (len(model.vertices), 0, len(model)))
+    return model
+
+def _get_oriented_corners(chunk):
+    """ Return the (clockwise ordered) corners of the valid facets of a chunk,
+    the mask of the valid facets and the number of facets with a conflicting
+    normal.
+    """
+    corners = chunk["vertices"].astype(numpy.float64)
+    normals = chunk["normal"].astype(numpy.float64)
+    cross = numpy.cross(corners[:, 1] - corners[:, 0],
+            corners[:, 2] - corners[:, 0])
+    # facets without a normal are oriented upwards
+    no_normal = (normals == 0).all(axis=1)
+    dotcross = numpy.where(no_normal, cross[:, 2],
+            (normals * cross).sum(axis=1))
+    # Triangle expects the vertices in clockwise order
+    swap = dotcross > 0
+    corners[swap] = corners[swap][:, (0, 2, 1)]
+    # the three points are in a line - or two points are identical
+    valid = dotcross != 0
+    return corners[valid], valid, numpy.count_nonzero(dotcross < 0)
+
+def _get_binary_hashes(filename, numfacets, callback=None):
+    """ Decode the facets of a binary STL file chunk by chunk.
+    The result contains the vertex hashes of all valid corners, the normals
+    of the valid facets and the number of conflicting and invalid facets - or
+    None if the operation was cancelled.
+    """
+    hashes = numpy.empty(3 * numfacets, dtype=numpy.uint64)
+    normals = numpy.empty((numfacets, 3), dtype=numpy.float32)
+    count = 0
+    conflicts = 0
+    invalid = 0
+    for chunk in _read_binary_chunks(filename, numfacets):
+        if callback and callback():
+            return None
+        corners, valid, chunk_conflicts = _get_oriented_corners(chunk)
+        conflicts += chunk_conflicts
+        invalid += len(valid) - len(corners)
+        end = count + len(corners)
+        normals[count:end] = chunk["normal"][valid]
+        hashes[3 * count:3 * end] = _get_vertex_hashes(
+                _get_quantized_vertices(corners.reshape(-1, 3)))
+        count = end
+    return hashes[:3 * count], normals[:count], conflicts, invalid
+
+def _get_merged_vertices(filename, numfacets, first_corners, faces,
+        callback=None):
+    """ Collect the coordinates of the merged vertices (see
+    '_get_unique_indices') while reading the file a second time.
+    The result are the vertices and the index of the vertex for each corner -
+    or None if the operation was cancelled.
+    """
+    vertices = numpy.empty((len(first_corners), 3), dtype=numpy.float32)
+    is_first = numpy.zeros(len(faces), dtype=numpy.bool_)
+    is_first[first_corners] = True
+    start = 0
+    for chunk in _read_binary_chunks(filename, numfacets):
+        if callback and callback():
+            return None
+        corners = _get_oriented_corners(chunk)[0].reshape(-1, 3)
+        end = start + len(corners)
+        chunk_faces = faces[start:end]
+        chunk_first = is_first[start:end]
+        # the first corner of a vertex precedes all its other corners
+        vertices[chunk_faces[chunk_first]] = corners[chunk_first]
+        # Verify that different vertices were not merged due to a hash
+        # collision. Fall back to comparing the complete quantized
+        # coordinates otherwise.
+        if (_get_quantized_vertices(corners) \
+                != _get_quantized_vertices(vertices[chunk_faces])).any():
+            log.debug("STLImporter: vertex hash collision detected")
+            return _get_unique_vertices(filename, numfacets)
+        start = end
+    return vertices, faces
+
+def _get_unique_vertices(filename, numfacets):
+    """ merge the vertices by comparing their complete quantized coordinates
+    (slow and memory consuming - only used after a hash collision)
+    """
+    corners = numpy.concatenate([
+            _get_oriented_corners(chunk)[0].reshape(-1, 3).astype(
+                numpy.float32)
+            for chunk in _read_binary_chunks(filename, numfacets)])
+    unused, first_corners, faces = numpy.unique(
+            _get_quantized_vertices(corners), axis=0, return_index=True,
+            return_inverse=True)
+    return corners[first_corners], faces
+
 def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
     global vertices, edges, kdtree
     vertices = 0
@@ -60,6 +296,14 @@ def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
 
     normal_conflict_warning_seen = False
 
+    if is_numpy_available() and not hasattr(filename, "read"):
+        uri = pycam.Utils.URIHandler(filename)
+        if uri.is_local():
+            # try the fast path for binary STL files
+            local_path = uri.get_local_path()
+            if not _get_binary_facet_count(local_path) is None:
+                return ImportBinaryMesh(local_path, callback=callback)
+
     if hasattr(filename, "read"):
         # make sure that the input stream can seek and has ".len"
         f = StringIO.StringIO(filename.read())
@@ -109,9 +353,13 @@ def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
         log.error("STLImporter: STL binary/ascii detection failed")
         return None
 
-    if use_kdtree:
-        kdtree = PointKdtree([], 3, 1, epsilon)
-    model = Model(use_kdtree)
+    if is_numpy_available():
+        # the compact model merges identical vertices on its own
+        model = MeshModel()
+    else:
+        if use_kdtree:
+            kdtree = PointKdtree([], 3, 1, epsilon)
+        model = Model(use_kdtree)
 
     t = None
     p1 = None
@@ -282,6 +530,8 @@ def ImportModel(filename, use_kdtree=True, callback=None, **kwargs):
             if m:
                 continue
 
+    if isinstance(model, MeshModel):
+        vertices = len(model.vertices)
     log.info("Imported STL model: %d vertices, %d edges, %d triangles" \
             % (vertices, edges, len(model.triangles())))
     vertices = 0
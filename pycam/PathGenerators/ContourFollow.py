@@ -26,12 +26,11 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 from pycam.Geometry.Point import Point, Vector
 from pycam.Geometry.Line import Line
 from pycam.Geometry.Plane import Plane
-from pycam.PathGenerators import get_free_paths_ode, get_free_paths_triangles
+from pycam.PathGenerators import get_free_paths_triangles
 from pycam.Geometry.utils import epsilon, ceil, sqrt
 from pycam.Utils import ProgressCounter
 from pycam.Utils.threading import run_in_parallel
 import pycam.Utils.log
-import math
 
 _DEBUG_DISABLE_COLLISION_CHECK = False
 _DEBUG_DISABLE_EXTEND_LINES = False
@@ -43,23 +42,29 @@ log = pycam.Utils.log.get_logger()
 
 # We need to use a global function here - otherwise it does not work with
 # the multiprocessing Pool.
-def _process_one_triangle((model, cutter, up_vector, triangle, z)):
+def _process_one_triangle((model, cutter, up_vector, triangle, z, index)):
+    """ calculate the waterlines of a triangle
+
+    @returns: the pairs of waterlines and shifted waterlines, the index of
+        the triangle and a flag indicating that the triangle needs no further
+        evaluation for lower z levels
+    """
     result = []
     # ignore triangles below the z level
     if triangle.maxz < z:
         # Case 1a
-        return result, None
+        return result, index, False
     # ignore triangles pointing upwards or downwards
     if triangle.normal.cross(up_vector).norm == 0:
         # Case 1b
-        return result, None
+        return result, index, True
     edge_collisions = get_collision_waterline_of_triangle(model, cutter,
             up_vector, triangle, z)
     if edge_collisions is None:
         # don't try to use this edge again
-        return result, [id(triangle)]
+        return result, index, True
     elif len(edge_collisions) == 0:
-        return result, None
+        return result, index, False
     else:
         for cutter_location, edge in edge_collisions:
             shifted_edge = get_shifted_waterline(up_vector, edge,
@@ -69,7 +74,65 @@ def _process_one_triangle((model, cutter, up_vector, triangle, z)):
                     result.append((edge, edge))
                 else:
                     result.append((edge, shifted_edge))
-        return result, None
+        return result, index, False
+
+
+class TriangleSweep(object):
+    """ The triangles of a model that are relevant for a sequence of
+    descending z levels.
+
+    A triangle becomes active as soon as the z level drops below its highest
+    point (all triangles below the z level are ignored - see "Case 1a").
+    Thus the triangles are visited in the order of their maximum height.
+    Triangles pointing upwards or downwards never contribute a waterline
+    (Case 1b). Triangles that are completely above the z level and do not
+    cause any collision will not do so for lower z levels. They are removed
+    from the set of active triangles.
+    Thus the effort for each layer is proportional to the number of active
+    triangles instead of the number of all triangles.
+    The active triangles are returned in their original order - the
+    combination of the waterlines depends on it.
+    """
+
+    def __init__(self, triangles, up_vector):
+        self.triangles = [t for t in triangles
+                if t.normal.cross(up_vector).norm != 0]
+        # the number of ignored triangles (pointing up- or downwards)
+        self.num_of_ignored = len(triangles) - len(self.triangles)
+        self._activation_order = range(len(self.triangles))
+        self._activation_order.sort(key=lambda index:
+                self.triangles[index].maxz, reverse=True)
+        self._finished = [False] * len(self.triangles)
+        self._active = []
+        self._next_activation = 0
+        self._last_z = None
+
+    def get_active(self, z):
+        """ return the indices of all active triangles for the given z level
+        """
+        if (not self._last_z is None) and (z > self._last_z):
+            # the z levels are not descending - start again
+            self._finished = [False] * len(self.triangles)
+            self._active = []
+            self._next_activation = 0
+        self._last_z = z
+        activated = False
+        while self._next_activation < len(self._activation_order):
+            index = self._activation_order[self._next_activation]
+            if self.triangles[index].maxz < z:
+                break
+            self._active.append(index)
+            self._next_activation += 1
+            activated = True
+        if activated:
+            self._active.sort()
+        self._active = [index for index in self._active
+                if not self._finished[index]]
+        return self._active
+
+    def set_finished(self, index):
+        """ the triangle needs no evaluation for lower z levels """
+        self._finished[index] = True
 
 
 class CollisionPaths(object):
@@ -199,31 +262,14 @@ class ContourFollow(object):
         self.pa = path_processor
         self._up_vector = Vector(0, 0, 1)
         self.physics = physics
-        self._processed_triangles = []
-        if self.physics:
-            accuracy = 20
-            max_depth = 16
-            # TODO: migrate to new interface
-            maxx = max([m.maxx for m in self.models])
-            minx = max([m.minx for m in self.models])
-            maxy = max([m.maxy for m in self.models])
-            miny = max([m.miny for m in self.models])
-            model_dim = max(abs(maxx - minx), abs(maxy - miny))
-            depth = math.log(accuracy * model_dim / self.cutter.radius) / \
-                    math.log(2)
-            self._physics_maxdepth = min(max_depth, max(ceil(depth), 4))
+        self._triangle_sweep = None
 
     def _get_free_paths(self, cutter, models, p1, p2):
-        if self.physics:
-            return get_free_paths_ode(self.physics, p1, p2,
-                    depth=self._physics_maxdepth)
-        else:
-            return get_free_paths_triangles(models, cutter, p1, p2)
+        # the exact calculation is used for all collision backends
+        return get_free_paths_triangles(models, cutter, p1, p2)
 
     def GenerateToolPath(self, cutter, models, minx, maxx, miny, maxy, minz,
             maxz, dz, draw_callback=None):
-        # reset the list of processed triangles
-        self._processed_triangles = []
         # calculate the number of steps
         # Sometimes there is a floating point accuracy issue: make sure
         # that only one layer is drawn, if maxz and minz are almost the same.
@@ -236,8 +282,11 @@ class ContourFollow(object):
 
         # only the first model is used for the contour-follow algorithm
         # TODO: should we combine all models?
-        num_of_triangles = len(models[0].triangles(minx=minx, miny=miny,
-                maxx=maxx, maxy=maxy))
+        triangles = models[0].triangles(minx=minx, miny=miny, maxx=maxx,
+                maxy=maxy)
+        num_of_triangles = len(triangles)
+        # the triangles are collected once for all layers
+        self._triangle_sweep = TriangleSweep(triangles, self._up_vector)
         progress_counter = ProgressCounter(2 * num_of_layers * num_of_triangles,
                 draw_callback)
 
@@ -259,6 +308,7 @@ class ContourFollow(object):
             self.pa.end_direction()
             self.pa.finish()
             current_layer += 1
+        self._triangle_sweep = None
         return self.pa.paths
 
     def GenerateToolPathSlice(self, cutter, model, minx, maxx, miny, maxy, z,
@@ -273,7 +323,8 @@ class ContourFollow(object):
             if _DEBUG_DISABLE_COLLISION_CHECK:
                 points = (line.p1, line.p2)
             else:
-                points = self._get_free_paths(line.p1, line.p2)
+                points = self._get_free_paths(cutter, [model], line.p1,
+                        line.p2)
             if points:
                 if (not last_position is None) and (last_position != points[0]):
                     self.pa.end_scanline()
@@ -301,15 +352,27 @@ class ContourFollow(object):
         # use only the first model for the contour
         follow_model = model
         waterline_triangles = CollisionPaths()
-        triangles = follow_model.triangles(minx=minx, miny=miny, maxx=maxx,
-                maxy=maxy)
-        args = [(follow_model, cutter, self._up_vector, t, z)
-                for t in triangles if not id(t) in self._processed_triangles]
+        if self._triangle_sweep is None:
+            # a single layer (not called via "GenerateToolPath")
+            triangle_sweep = TriangleSweep(follow_model.triangles(minx=minx,
+                    miny=miny, maxx=maxx, maxy=maxy), self._up_vector)
+        else:
+            triangle_sweep = self._triangle_sweep
+        active = triangle_sweep.get_active(z)
+        args = [(follow_model, cutter, self._up_vector,
+                triangle_sweep.triangles[index], z, index) for index in active]
+        if not progress_counter is None:
+            # the progress counter jumps up by the number of skipped triangles
+            progress_counter.increment(len(triangle_sweep.triangles)
+                    + triangle_sweep.num_of_ignored - len(active))
+            callback = progress_counter.update
+        else:
+            callback = None
         results_iter = run_in_parallel(_process_one_triangle, args,
-                unordered=True, callback=progress_counter.update)
-        for result, ignore_triangle_id_list in results_iter:
-            if ignore_triangle_id_list:
-                self._processed_triangles.extend(ignore_triangle_id_list)
+                unordered=True, callback=callback)
+        for result, index, finished in results_iter:
+            if finished:
+                triangle_sweep.set_finished(index)
             for edge, shifted_edge in result:
                 waterline_triangles.add(edge, shifted_edge)
             if (not progress_counter is None) \
@@ -21,7 +21,8 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from pycam.PathGenerators import get_max_height_dynamic
+from pycam.PathGenerators import get_max_height_dynamic, \
+        get_max_height_adaptive, is_batch_drop_available
 from pycam.Utils import ProgressCounter
 from pycam.Utils.threading import run_in_parallel
 import pycam.Geometry.Model
@@ -32,23 +33,47 @@ log = pycam.Utils.log.get_logger()
 
 # We need to use a global function here - otherwise it does not work with
 # the multiprocessing Pool.
-def _process_one_grid_line((positions, minz, maxz, model, cutter, physics)):
+def _process_one_grid_line((positions, minz, maxz, model, cutter, physics,
+        tolerance, max_points)):
     """ This function assumes, that the positions are next to each other.
     Otherwise the dynamic over-sampling (in get_max_height_dynamic) is
     pointless.
     """
-    return get_max_height_dynamic(model, cutter, positions, minz, maxz, physics)
+    if tolerance:
+        return get_max_height_adaptive(model, cutter, positions, minz, maxz,
+                tolerance, max_points=max_points, physics=physics)
+    else:
+        return get_max_height_dynamic(model, cutter, positions, minz, maxz,
+                physics)
 
 
 class DropCutter(object):
 
-    def __init__(self, path_processor, physics=None):
+    def __init__(self, path_processor, physics=None, tolerance=None,
+            max_points=None):
+        """ The adaptive sampling of the grid lines is used, if a tolerance
+        is given. Otherwise a fixed deviance of the points is allowed.
+
+        @value tolerance: the maximum chordal deviation of the toolpath
+        @type tolerance: float
+        @value max_points: the maximum number of points per grid line (only
+            used for the adaptive sampling)
+        @type max_points: int
+        """
         self.pa = path_processor
         self.physics = physics
+        self.tolerance = tolerance
+        self.max_points = max_points
 
     def GenerateToolPath(self, cutter, models, motion_grid, minz=None, maxz=None, draw_callback=None):
         quit_requested = False
         model = pycam.Geometry.Model.get_combined_model(models)
+        if (not model is None) and (self.physics is None) and \
+                is_batch_drop_available(model):
+            # Prepare the arrays (and their spatial index) for the vectorized
+            # calculation only once - otherwise every worker process would
+            # need to do it again.
+            model.get_triangle_arrays().get_index()
 
         # Transfer the grid (a generator) into a list of lists and count the
         # items.
@@ -69,7 +94,7 @@ class DropCutter(object):
             # simplify the data (useful for remote processing)
             xy_coords = [(pos.x, pos.y) for pos in one_grid_line]
             args.append((xy_coords, minz, maxz, model, cutter,
-                    self.physics))
+                    self.physics, self.tolerance, self.max_points))
         for points in run_in_parallel(_process_one_grid_line, args,
                 callback=progress_counter.update):
             self.pa.new_scanline()
@@ -21,13 +21,12 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from pycam.PathGenerators import get_free_paths_ode, get_free_paths_triangles
+from pycam.PathGenerators import get_free_paths_triangles
 import pycam.PathProcessors
-from pycam.Geometry.utils import ceil
 from pycam.Utils.threading import run_in_parallel
 from pycam.Utils import ProgressCounter
 import pycam.Utils.log
-import math
+import itertools
 
 
 log = pycam.Utils.log.get_logger()
@@ -35,21 +34,17 @@ log = pycam.Utils.log.get_logger()
 
 # We need to use a global function here - otherwise it does not work with
 # the multiprocessing Pool.
-def _process_one_line((p1, p2, depth, models, cutter, physics)):
-    if physics:
-        points = get_free_paths_ode(physics, p1, p2, depth=depth)
-    else:
-        points = get_free_paths_triangles(models, cutter, p1, p2)
-    return points
+def _process_one_line((p1, p2, models, cutter)):
+    return get_free_paths_triangles(models, cutter, p1, p2)
 
 
 class PushCutter(object):
 
     def __init__(self, path_processor, physics=None):
-        if physics is None:
-            log.debug("Starting PushCutter (without ODE)")
-        else:
-            log.debug("Starting PushCutter (with ODE)")
+        # The free paths are calculated exactly based on the triangles of the
+        # model (see "get_collision_intervals"). This is faster and more
+        # accurate than the bisection of ODE collision checks.
+        log.debug("Starting PushCutter")
         self.pa = path_processor
         self.physics = physics
         # check if we use a PolygonExtractor
@@ -72,7 +67,19 @@ class PushCutter(object):
 
         progress_counter = ProgressCounter(num_of_grid_positions, draw_callback)
 
+        # The lines of all layers are submitted as a single job. Thus the
+        # workers are kept busy at the boundaries of layers. The results are
+        # returned in order - the path processor receives the lines of one
+        # layer after the other.
+        # The arguments are generated lazily while the job is processed.
+        args = itertools.chain.from_iterable(
+                self._get_line_args(cutter, models, layer_grid)
+                for layer_grid in grid)
+        results = run_in_parallel(_process_one_line, args,
+                callback=progress_counter.update)
+
         current_layer = 0
+        cancelled = False
         for layer_grid in grid:
             # update the progress bar and check, if we should cancel the process
             if draw_callback and draw_callback(text="PushCutter: processing" \
@@ -81,27 +88,35 @@ class PushCutter(object):
                 break
 
             self.pa.new_direction(0)
-            self.GenerateToolPathSlice(cutter, models, layer_grid, draw_callback,
+            cancelled = self._process_line_results(
+                    itertools.islice(results, len(layer_grid)), draw_callback,
                     progress_counter)
             self.pa.end_direction()
             self.pa.finish()
 
+            if cancelled:
+                break
+
             current_layer += 1
 
+        # discard the remaining tasks of a cancelled job
+        results.close()
+
         if self._use_polygon_extractor and (len(models) > 1):
             other_models = models[1:]
             # TODO: this is complicated and hacky :(
-            # we don't use parallelism or ODE (for the sake of simplicity)
             final_pa = pycam.PathProcessors.SimpleCutter.SimpleCutter(
                     reverse=self.pa.reverse)
-            for path in self.pa.paths:
+            path_lengths = [max(0, len(path.points) - 1)
+                    for path in self.pa.paths]
+            args = ((path.points[index], path.points[index + 1],
+                        other_models, cutter)
+                    for path in self.pa.paths
+                    for index in range(len(path.points) - 1))
+            results = run_in_parallel(_process_one_line, args)
+            for path_length in path_lengths:
                 final_pa.new_scanline()
-                pairs = []
-                for index in range(len(path.points) - 1):
-                    pairs.append((path.points[index], path.points[index + 1]))
-                for p1, p2 in pairs:
-                    free_points = get_free_paths_triangles(other_models,
-                            cutter, p1, p2)
+                for free_points in itertools.islice(results, path_length):
                     for point in free_points:
                         final_pa.append(point)
                 final_pa.end_scanline()
@@ -112,29 +127,37 @@ class PushCutter(object):
 
     def GenerateToolPathSlice(self, cutter, models, layer_grid, draw_callback=None,
             progress_counter=None):
-        # settings for calculation of depth
-        accuracy = 20
-        max_depth = 20
-        min_depth = 4
-
+        if progress_counter:
+            callback = progress_counter.update
+        else:
+            callback = None
+        results = run_in_parallel(_process_one_line,
+                self._get_line_args(cutter, models, layer_grid),
+                callback=callback)
+        self._process_line_results(results, draw_callback, progress_counter)
+        results.close()
+
+    def _get_line_args(self, cutter, models, layer_grid):
+        """ generate the arguments of "_process_one_line" for every line of a
+        layer
+        """
         # the ContourCutter pathprocessor does not work with combined models
         if self._use_polygon_extractor:
             models = models[:1]
         else:
             models = models
 
-        args = []
         for line in layer_grid:
             p1, p2 = line
-            # calculate the required calculation depth (recursion)
-            distance = p2.sub(p1).norm
-            # TODO: accessing cutter.radius here is slightly ugly
-            depth = math.log(accuracy * distance / cutter.radius) / math.log(2)
-            depth = min(max(ceil(depth), 4), max_depth)
-            args.append((p1, p2, depth, models, cutter, self.physics))
-
-        for points in run_in_parallel(_process_one_line, args,
-                callback=progress_counter.update):
+            yield (p1, p2, models, cutter)
+
+    def _process_line_results(self, results, draw_callback=None,
+            progress_counter=None):
+        """ feed the free points of every line into the path processor
+
+        @returns: True if the process should be cancelled
+        """
+        for points in results:
             if points:
                 self.pa.new_scanline()
                 for point in points:
@@ -145,5 +168,6 @@ class PushCutter(object):
             # update the progress counter
             if progress_counter and progress_counter.increment():
                 # quit requested
-                break
+                return True
+        return False
 
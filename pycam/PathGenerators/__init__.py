@@ -25,22 +25,10 @@ __all__ = ["DropCutter", "PushCutter", "EngraveCutter", "ContourFollow"]
 
 from pycam.Geometry.utils import INFINITE, epsilon, sqrt
 from pycam.Geometry.Point import Point
+from pycam.Geometry.TriangleArrays import is_numpy_available
 import pycam.Utils.threading
 
 
-class Hit(object):
-    def __init__(self, cl, cp, t, d, direction):
-        self.cl = cl
-        self.cp = cp
-        self.t = t
-        self.d = d
-        self.dir = direction
-        self.z = -INFINITE
-
-    def __repr__(self):
-        return "%s - %s - %s - %s" % (self.d, self.cl, self.dir, self.cp)
-
-
 def get_free_paths_triangles(models, cutter, p1, p2, return_triangles=False):
     if (len(models) == 0) or ((len(models) == 1) and (models[0] is None)):
         return (p1, p2)
@@ -64,9 +52,65 @@ def get_free_paths_triangles(models, cutter, p1, p2, return_triangles=False):
             all_results.extend(one_result)
         return all_results
 
+    xyz_dist = p2.sub(p1).norm
+    points = []
+    outside_at_start = True
+    for start, end, start_info, end_info in get_collision_intervals(model,
+            cutter, p1, p2):
+        if end < -epsilon:
+            # the interval ends before the start of the line
+            continue
+        if start > xyz_dist + epsilon:
+            # all remaining intervals start after the end of the line
+            break
+        if start >= -epsilon:
+            if len(points) == 0:
+                points.append((p1, None, None))
+            points.append(start_info)
+        elif end > xyz_dist + epsilon:
+            # the line is completely inside of the model
+            outside_at_start = False
+            break
+        if end <= xyz_dist + epsilon:
+            points.append(end_info)
+
+    if len(points) % 2 == 1:
+        points.append((p2, None, None))
+
+    if (len(points) == 0) and outside_at_start:
+        # the path is completely free
+        points.append((p1, None, None))
+        points.append((p2, None, None))
+
+    if return_triangles:
+        return points
+    else:
+        # return only the cutter locations (without triangles)
+        return [cut_info[0] for cut_info in points]
+
+def get_collision_intervals(model, cutter, p1, p2):
+    """ Calculate the collisions of a cutter moving along a line.
+
+    The cutter and a triangle are convex. Thus the cutter collides with a
+    triangle along a single interval of the (infinite) line. Its limits are
+    given by the first contact while moving forward and the first contact
+    while moving backward. The intervals of all triangles are merged with a
+    single sweep along the line.
+    This is an exact calculation for every cutter shape - in contrast to the
+    recursive bisection of "get_free_paths_ode".
+
+    @param model: the model to be checked
+    @type model: pycam.Geometry.Model.Model
+    @param cutter: the cutter moving from p1 to p2
+    @type cutter: pycam.Cutters.BaseCutter.BaseCutter
+    @returns: the merged intervals sorted along the line - each interval is
+        given by its start and end (distances from p1) followed by the
+        cutter location, the triangle and the contact point at the start and
+        at the end
+    @rtype: list(tuple(float, float, tuple, tuple))
+    """
     backward = p1.sub(p2).normalized()
     forward = p2.sub(p1).normalized()
-    xyz_dist = p2.sub(p1).norm
 
     minx = min(p1.x, p2.x)
     maxx = max(p1.x, p2.x)
@@ -74,64 +118,37 @@ def get_free_paths_triangles(models, cutter, p1, p2, return_triangles=False):
     maxy = max(p1.y, p2.y)
     minz = min(p1.z, p2.z)
 
-    # find all hits along scan line
-    hits = []
-
     triangles = model.triangles(minx - cutter.distance_radius,
             miny - cutter.distance_radius, minz, maxx + cutter.distance_radius,
             maxy + cutter.distance_radius, INFINITE)
 
+    intervals = []
     for t in triangles:
-        (cl1, d1, cp1) = cutter.intersect(backward, t, start=p1)
-        if cl1:
-            hits.append(Hit(cl1, cp1, t, -d1, backward))
-        (cl2, d2, cp2) = cutter.intersect(forward, t, start=p1)
-        if cl2:
-            hits.append(Hit(cl2, cp2, t, d2, forward))
-
-    # sort along the scan direction
-    hits.sort(key=lambda h: h.d)
+        if t.maxz < minz - epsilon:
+            # the triangle is below the tip of the cutter
+            continue
+        (cl1, d1, cp1) = cutter.intersect(forward, t, start=p1)
+        if not cl1:
+            continue
+        (cl2, d2, cp2) = cutter.intersect(backward, t, start=p1)
+        if not cl2:
+            continue
+        if -d2 - d1 < epsilon:
+            # the cutter just touches the triangle
+            continue
+        intervals.append((d1, -d2, (cl1, t, cp1), (cl2, t, cp2)))
 
-    count = 0
-    points = []
-    for h in hits:
-        if h.dir == forward:
-            if count == 0:
-                if -epsilon <= h.d <= xyz_dist + epsilon:
-                    if len(points) == 0:
-                        points.append((p1, None, None))
-                    points.append((h.cl, h.t, h.cp))
-            count += 1
+    # merge overlapping intervals
+    intervals.sort(key=lambda interval: interval[0])
+    merged = []
+    for interval in intervals:
+        if merged and (interval[0] <= merged[-1][1]):
+            if interval[1] > merged[-1][1]:
+                merged[-1] = (merged[-1][0], interval[1], merged[-1][2],
+                        interval[3])
         else:
-            if count == 1:
-                if -epsilon <= h.d <= xyz_dist + epsilon:
-                    points.append((h.cl, h.t, h.cp))
-            count -= 1
-
-    if len(points) % 2 == 1:
-        points.append((p2, None, None))
-
-    if len(points) == 0:
-        # check if the path is completely free or if we are inside of the model
-        inside_counter = 0
-        for h in hits:
-            if -epsilon <= h.d:
-                # we reached the outer limit of the model
-                break
-            if h.dir == forward:
-                inside_counter += 1
-            else:
-                inside_counter -= 1
-        if inside_counter <= 0:
-            # we are not inside of the model
-            points.append((p1, None, None))
-            points.append((p2, None, None))
-
-    if return_triangles:
-        return points
-    else:
-        # return only the cutter locations (without triangles)
-        return [cut_info[0] for cut_info in points]
+            merged.append(interval)
+    return merged
 
 def get_free_paths_ode(physics, p1, p2, depth=8):
     """ Recursive function for splitting a line (usually along x or y) into
@@ -250,6 +267,55 @@ def get_max_height_triangles(model, cutter, x, y, minz, maxz):
     else:
         return Point(x, y, height_max)
 
+def get_max_height_batch(triangles, cutter, positions, minz, maxz):
+    """ Vectorized version of 'get_max_height_triangles' for a list of
+    positions. All heights are calculated at once via numpy.
+
+    @param triangles: the triangles to be checked - usually a subset of the
+        model's triangles (see 'get_batch_triangles')
+    @type triangles: pycam.Geometry.TriangleArrays.TriangleArrays
+    @param positions: (x, y) tuples of the cutter locations
+    @type positions: list(tuple(float))
+    @returns: one Point for each position (or None, if the cutter would need
+        to go higher than 'maxz')
+    @rtype: list(pycam.Geometry.Point.Point)
+    """
+    if triangles is None:
+        return [Point(x, y, minz) for x, y in positions]
+    xs = [pos[0] for pos in positions]
+    ys = [pos[1] for pos in positions]
+    heights = cutter.drop_batch(triangles, xs, ys)
+    result = []
+    for x, y, height in zip(xs, ys, heights):
+        height = float(height)
+        # see 'get_max_height_triangles' for the handling of the limits
+        if height < minz + epsilon:
+            height = minz
+        if height > maxz + epsilon:
+            result.append(None)
+        else:
+            result.append(Point(x, y, height))
+    return result
+
+def get_batch_triangles(model, cutter, positions):
+    """ Return the triangles of the model, that are relevant for the given
+    positions (as TriangleArrays). The result is suitable for
+    'get_max_height_batch'.
+    """
+    if model is None:
+        return None
+    xs = [pos[0] for pos in positions]
+    ys = [pos[1] for pos in positions]
+    radius = cutter.distance_radius + epsilon
+    triangles = model.get_triangle_arrays()
+    return triangles.select(triangles.get_index().search(min(xs) - radius,
+            max(xs) + radius, min(ys) - radius, max(ys) + radius))
+
+def is_batch_drop_available(model):
+    """ check if the vectorized DropCutter calculation can be used """
+    return is_numpy_available() and \
+            ((model is None) or hasattr(model, "get_triangle_arrays"))
+
 def _check_deviance_of_adjacent_points(p1, p2, p3, min_distance):
     straight = p3.sub(p1)
     added = p2.sub(p1).norm + p3.sub(p2).norm
@@ -265,17 +331,21 @@ def get_max_height_dynamic(model, cutter, positions, minz, maxz, physics=None):
     max_depth = 8
     # the points don't need to get closer than 1/1000 of the cutter radius
     min_distance = cutter.distance_radius / 1000
-    result = []
     if physics:
         get_max_height = lambda x, y: get_max_height_ode(physics, x, y, minz,
                 maxz)
+        result = [get_max_height(x, y) for x, y in positions]
+    elif positions and is_batch_drop_available(model):
+        # All points of this line are calculated at once. Additional points
+        # (see below) use the same subset of triangles.
+        triangles = get_batch_triangles(model, cutter, positions)
+        get_max_height = lambda x, y: get_max_height_batch(triangles, cutter,
+                [(x, y)], minz, maxz)[0]
+        result = get_max_height_batch(triangles, cutter, positions, minz, maxz)
     else:
         get_max_height = lambda x, y: get_max_height_triangles(model, cutter,
                 x, y, minz, maxz)
-    # add one point between all existing points
-    for index in range(len(positions)):
-        p = positions[index]
-        result.append(get_max_height(p[0], p[1]))
+        result = [get_max_height(x, y) for x, y in positions]
     # Check if three consecutive points are "flat".
     # Add additional points if necessary.
     index = 0
@@ -303,3 +373,88 @@ def get_max_height_dynamic(model, cutter, positions, minz, maxz, physics=None):
             depth_count = 0
     return result
 
+
+def get_max_height_adaptive(model, cutter, positions, minz, maxz, tolerance,
+        max_points=None, physics=None):
+    """ Calculate the heights for a line of positions and add points wherever
+    the surface deviates from the straight connection of two adjacent points.
+
+    The line is refined in rounds: the midpoints of all candidate intervals
+    of the line are calculated at once (using the same subset of triangles
+    for the vectorized calculation). A midpoint is kept, if its vertical
+    distance from the chord of its interval exceeds the tolerance. Its two
+    halves are candidates for the next round.
+    The vertical distance (instead of the perpendicular one) is used, since
+    it is the amount of material, that would be cut away by a straight move
+    along the chord. Otherwise steep walls would not be refined at all.
+
+    @param positions: (x, y) tuples of the cutter locations (neighbours)
+    @type positions: list(tuple(float))
+    @param tolerance: the maximum vertical deviation between the resulting
+        straight moves and the surface (as seen by the cutter)
+    @type tolerance: float
+    @param max_points: the maximum number of resulting points for this line
+        (None for no limit). The points with the largest deviations are
+        preferred, if the limit is reached.
+    @type max_points: int
+    @returns: one Point for each resulting position (or None, if the cutter
+        would need to go higher than 'maxz')
+    @rtype: list(pycam.Geometry.Point.Point)
+    """
+    # the points don't need to get closer than 1/1000 of the cutter radius
+    min_distance = cutter.distance_radius / 1000
+    if physics:
+        get_max_heights = lambda coords: [get_max_height_ode(physics, x, y,
+                minz, maxz) for x, y in coords]
+    elif positions and is_batch_drop_available(model):
+        triangles = get_batch_triangles(model, cutter, positions)
+        get_max_heights = lambda coords: get_max_height_batch(triangles,
+                cutter, coords, minz, maxz)
+    else:
+        get_max_heights = lambda coords: [get_max_height_triangles(model,
+                cutter, x, y, minz, maxz) for x, y in coords]
+    # Every point is stored together with its position along the line
+    # (fractions of the original indices). Sorting these keys at the end
+    # is cheaper than inserting new points into the list.
+    samples = list(enumerate(get_max_heights(positions)))
+    if max_points is None:
+        budget = None
+    else:
+        budget = max_points - len(samples)
+    intervals = zip(samples[:-1], samples[1:])
+    while intervals and ((budget is None) or (budget > 0)):
+        candidates = []
+        for (key1, p1), (key2, p2) in intervals:
+            if (p1 is None) or (p2 is None):
+                continue
+            if (p2.x - p1.x) ** 2 + (p2.y - p1.y) ** 2 \
+                    < (2 * min_distance) ** 2:
+                # the points are too close together
+                continue
+            candidates.append(((key1, p1), (key2, p2)))
+        if not candidates:
+            break
+        middles = get_max_heights([((p1.x + p2.x) / 2, (p1.y + p2.y) / 2)
+                for (key1, p1), (key2, p2) in candidates])
+        refined = []
+        for ((key1, p1), (key2, p2)), middle in zip(candidates, middles):
+            if middle is None:
+                # the cutter needs to lift - this is always worth a point
+                deviation = INFINITE
+            else:
+                deviation = abs(middle.z - 0.5 * (p1.z + p2.z))
+            if deviation > tolerance:
+                refined.append((deviation, (key1, p1), (key2, p2), middle))
+        if (not budget is None) and (len(refined) > budget):
+            refined.sort(key=lambda item: item[0], reverse=True)
+            refined = refined[:budget]
+        intervals = []
+        for deviation, first, last, middle in refined:
+            new_sample = (0.5 * (first[0] + last[0]), middle)
+            samples.append(new_sample)
+            intervals.append((first, new_sample))
+            intervals.append((new_sample, last))
+        if not budget is None:
+            budget -= len(refined)
+    samples.sort(key=lambda sample: sample[0])
+    return [point for key, point in samples]
@@ -26,8 +26,8 @@ from pycam.Geometry.Point import Point
 from pycam.Toolpath import simplify_toolpath
 
 class ContourCutter(pycam.PathProcessors.BasePathProcessor):
-    def __init__(self, reverse=False):
-        super(ContourCutter, self).__init__()
+    def __init__(self, reverse=False, tolerance=None):
+        super(ContourCutter, self).__init__(tolerance=tolerance)
         self.curr_path = None
         self.scanline = None
         self.polygon_extractor = None
@@ -72,7 +72,7 @@ class ContourCutter(pycam.PathProcessors.BasePathProcessor):
         if paths:
             for path in paths:
                 path.append(path.points[0])
-                simplify_toolpath(path)
+                simplify_toolpath(path, tolerance=self.tolerance)
         if paths:
             if self.reverse:
                 paths.reverse()
@@ -27,8 +27,8 @@ from pycam.Geometry.Path import Path
 
 
 class PathAccumulator(pycam.PathProcessors.BasePathProcessor):
-    def __init__(self, zigzag=False, reverse=False):
-        super(PathAccumulator, self).__init__()
+    def __init__(self, zigzag=False, reverse=False, tolerance=None):
+        super(PathAccumulator, self).__init__(tolerance=tolerance)
         self.curr_path = None
         self.zigzag = zigzag
         self.scanline = None
@@ -55,7 +55,7 @@ class PathAccumulator(pycam.PathProcessors.BasePathProcessor):
         if self.curr_path:
             if self.zigzag and (self.scanline % 2 == 0):
                 self.curr_path.reverse()
-            simplify_toolpath(self.curr_path)
+            simplify_toolpath(self.curr_path, tolerance=self.tolerance)
             if self.reverse:
                 self.paths.insert(0, self.curr_path)
             else:
@@ -28,8 +28,8 @@ from pycam.Toolpath import simplify_toolpath
 
 
 class PolygonCutter(pycam.PathProcessors.BasePathProcessor):
-    def __init__(self, reverse=False):
-        super(PolygonCutter, self).__init__()
+    def __init__(self, reverse=False, tolerance=None):
+        super(PolygonCutter, self).__init__(tolerance=tolerance)
         self.curr_path = None
         self.scanline = None
         self.polygon_extractor = PolygonExtractor(PolygonExtractor.MONOTONE)
@@ -71,7 +71,7 @@ class PolygonCutter(pycam.PathProcessors.BasePathProcessor):
                 paths.append(new_path)
         if paths:
             for path in paths:
-                simplify_toolpath(path)
+                simplify_toolpath(path, tolerance=self.tolerance)
                 if self.reverse:
                     path.reverse()
             self.paths.extend(paths)
@@ -25,8 +25,8 @@ from pycam.Geometry.Path import Path
 from pycam.Toolpath import simplify_toolpath
 
 class SimpleCutter(pycam.PathProcessors.BasePathProcessor):
-    def __init__(self, reverse=False):
-        super(SimpleCutter, self).__init__()
+    def __init__(self, reverse=False, tolerance=None):
+        super(SimpleCutter, self).__init__(tolerance=tolerance)
         self.curr_path = None
         self.reverse = reverse
 
@@ -40,7 +40,7 @@ class SimpleCutter(pycam.PathProcessors.BasePathProcessor):
             self.curr_path = None
         curr_path.append(point)
         if self.curr_path == None:
-            simplify_toolpath(curr_path)
+            simplify_toolpath(curr_path, tolerance=self.tolerance)
             if self.reverse:
                 curr_path.reverse()
                 self.paths.insert(0, curr_path)
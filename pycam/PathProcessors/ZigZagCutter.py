@@ -25,8 +25,8 @@ from pycam.Geometry.Path import Path
 from pycam.Toolpath import simplify_toolpath
 
 class ZigZagCutter(pycam.PathProcessors.BasePathProcessor):
-    def __init__(self, reverse=False):
-        super(ZigZagCutter, self).__init__()
+    def __init__(self, reverse=False, tolerance=None):
+        super(ZigZagCutter, self).__init__(tolerance=tolerance)
         self.curr_path = None
         self.scanline = None
         self.curr_scanline = None
@@ -59,7 +59,7 @@ class ZigZagCutter(pycam.PathProcessors.BasePathProcessor):
 
     def end_scanline(self):
         for path in self.curr_scanline:
-            simplify_toolpath(path)
+            simplify_toolpath(path, tolerance=self.tolerance)
             if self.reverse:
                 path.reverse()
             self.paths.append(path)
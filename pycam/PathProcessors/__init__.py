@@ -26,8 +26,12 @@ __all__ = ["PathAccumulator", "SimpleCutter", "ZigZagCutter", "PolygonCutter",
 
 class BasePathProcessor(object):
 
-    def __init__(self):
+    def __init__(self, tolerance=None):
+        """ "tolerance" is the maximum deviation of the simplified paths
+        (see pycam.Toolpath.simplify_toolpath)
+        """
         self.paths = []
+        self.tolerance = tolerance
 
     def new_direction(self, direction):
         pass
@@ -39,22 +43,8 @@ class BasePathProcessor(object):
         pass
 
     def sort_layered(self, upper_first=True):
-        if upper_first:
-            compare_height = lambda path1, path2: \
-                    path1.points[0].z < path2.points[0].z
-        else:
-            compare_height = lambda path1, path2: \
-                    path1.points[0].z > path2.points[0].z
-        finished = False
-        while not finished:
-            index = 0
-            finished = True
-            while index < len(self.paths) - 1:
-                current_path = self.paths[index]
-                next_path = self.paths[index + 1]
-                if compare_height(current_path, next_path):
-                    del self.paths[index]
-                    self.paths.insert(index + 1, current_path)
-                    finished = False
-                index += 1
-
+        """ sort the paths by the height of their first point (the order of
+        paths with the same height is kept)
+        """
+        self.paths.sort(key=lambda path: path.points[0].z,
+                reverse=upper_first)
@@ -86,30 +86,58 @@ class OpenGLViewToolpath(pycam.Plugins.PluginBase):
         color_cut = self.core.get("color_toolpath_cut")
         GL.glMatrixMode(GL.GL_MODELVIEW)
         GL.glLoadIdentity()
-        last_position = None
-        last_rapid = None
-        GL.glBegin(GL.GL_LINE_STRIP)
-        for position, rapid in moves:
-            if last_rapid != rapid:
-                GL.glEnd()
-                if rapid:
-                    GL.glColor4f(color_rapid["red"], color_rapid["green"],
-                            color_rapid["blue"], color_rapid["alpha"])
-                else:
-                    GL.glColor4f(color_cut["red"], color_cut["green"],
-                            color_cut["blue"], color_cut["alpha"])
-                # we need to wait until the color change is active
-                GL.glFinish()
-                GL.glBegin(GL.GL_LINE_STRIP)
-                if not last_position is None:
-                    GL.glVertex3f(last_position.x, last_position.y, last_position.z)
-                last_rapid = rapid
-            GL.glVertex3f(position.x, position.y, position.z)
-            last_position = position
-        GL.glEnd()
+        if hasattr(moves, "positions"):
+            # columnar moves (see pycam.Toolpath.PathArrays.MoveArrays)
+            self._draw_move_arrays(moves, color_rapid, color_cut)
+        else:
+            last_position = None
+            last_rapid = None
+            GL.glBegin(GL.GL_LINE_STRIP)
+            for position, rapid in moves:
+                if last_rapid != rapid:
+                    GL.glEnd()
+                    if rapid:
+                        GL.glColor4f(color_rapid["red"], color_rapid["green"],
+                                color_rapid["blue"], color_rapid["alpha"])
+                    else:
+                        GL.glColor4f(color_cut["red"], color_cut["green"],
+                                color_cut["blue"], color_cut["alpha"])
+                    # we need to wait until the color change is active
+                    GL.glFinish()
+                    GL.glBegin(GL.GL_LINE_STRIP)
+                    if not last_position is None:
+                        GL.glVertex3f(last_position.x, last_position.y,
+                                last_position.z)
+                    last_rapid = rapid
+                GL.glVertex3f(position.x, position.y, position.z)
+                last_position = position
+            GL.glEnd()
         if show_directions:
             for index in range(len(moves) - 1):
                 p1 = moves[index][0]
                 p2 = moves[index + 1][0]
                 pycam.Gui.OpenGLTools.draw_direction_cone(p1, p2)
 
+    def _draw_move_arrays(self, moves, color_rapid, color_cut):
+        GL = self._GL
+        if len(moves) == 0:
+            return
+        # split the moves into line strips of rapid or cutting moves
+        changes = ((moves.rapid[1:] != moves.rapid[:-1]).nonzero()[0] \
+                + 1).tolist()
+        starts = [0] + changes
+        ends = changes + [len(moves)]
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glVertexPointerd(moves.positions)
+        for start, end in zip(starts, ends):
+            if moves.rapid[start]:
+                color = color_rapid
+            else:
+                color = color_cut
+            GL.glColor4f(color["red"], color["green"], color["blue"],
+                    color["alpha"])
+            # every strip begins at the last position of the previous strip
+            first = max(0, start - 1)
+            GL.glDrawArrays(GL.GL_LINE_STRIP, first, end - first)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+
@@ -91,6 +91,72 @@ class PathParamMaterialAllowance(pycam.Plugins.PluginBase):
         self.core.get("unregister_parameter")("process", "material_allowance")
 
 
+class PathParamSamplingTolerance(pycam.Plugins.PluginBase):
+
+    DEPENDS = ["Processes"]
+    CATEGORIES = ["Process", "Parameter"]
+
+    def setup(self):
+        # zero disables the adaptive sampling
+        self.control = pycam.Gui.ControlsGTK.InputNumber(start=0, lower=0,
+                upper=10, digits=3, increment=0.01,
+                change_handler=lambda widget=None: \
+                    self.core.emit_event("process-changed"))
+        self.core.get("register_parameter")("process", "sampling_tolerance",
+                self.control)
+        self.core.register_ui("process_path_parameters", "Sampling tolerance",
+                self.control.get_widget(), weight=32)
+        return True
+
+    def teardown(self):
+        self.core.unregister_ui("process_path_parameters", self.control.get_widget())
+        self.core.get("unregister_parameter")("process", "sampling_tolerance")
+
+
+class PathParamSamplingPoints(pycam.Plugins.PluginBase):
+
+    DEPENDS = ["Processes"]
+    CATEGORIES = ["Process", "Parameter"]
+
+    def setup(self):
+        # zero disables the limit
+        self.control = pycam.Gui.ControlsGTK.InputNumber(start=0, lower=0,
+                upper=100000, digits=0, increment=100,
+                change_handler=lambda widget=None: \
+                    self.core.emit_event("process-changed"))
+        self.core.get("register_parameter")("process", "sampling_points",
+                self.control)
+        self.core.register_ui("process_path_parameters",
+                "Max. points per line", self.control.get_widget(), weight=34)
+        return True
+
+    def teardown(self):
+        self.core.unregister_ui("process_path_parameters", self.control.get_widget())
+        self.core.get("unregister_parameter")("process", "sampling_points")
+
+
+class PathParamSimplifyTolerance(pycam.Plugins.PluginBase):
+
+    DEPENDS = ["Processes"]
+    CATEGORIES = ["Process", "Parameter"]
+
+    def setup(self):
+        # zero removes only the points on a straight line
+        self.control = pycam.Gui.ControlsGTK.InputNumber(start=0, lower=0,
+                upper=10, digits=3, increment=0.01,
+                change_handler=lambda widget=None: \
+                    self.core.emit_event("process-changed"))
+        self.core.get("register_parameter")("process", "simplify_tolerance",
+                self.control)
+        self.core.register_ui("process_path_parameters",
+                "Simplify tolerance", self.control.get_widget(), weight=36)
+        return True
+
+    def teardown(self):
+        self.core.unregister_ui("process_path_parameters", self.control.get_widget())
+        self.core.get("unregister_parameter")("process", "simplify_tolerance")
+
+
 class PathParamMillingStyle(pycam.Plugins.PluginBase):
 
     DEPENDS = ["Processes", "PathParamPattern"]
@@ -32,7 +32,7 @@ class ProcessStrategySlicing(pycam.Plugins.PluginBase):
 
     DEPENDS = ["ParameterGroupManager", "PathParamOverlap",
             "PathParamStepDown", "PathParamMaterialAllowance",
-            "PathParamPattern"]
+            "PathParamPattern", "PathParamSimplifyTolerance"]
     CATEGORIES = ["Process"]
 
     def setup(self):
@@ -40,6 +40,7 @@ class ProcessStrategySlicing(pycam.Plugins.PluginBase):
                 "step_down": 1.0,
                 "material_allowance": 0,
                 "path_pattern": None,
+                "simplify_tolerance": 0,
         }
         self.core.get("register_parameter_set")("process", "slicing",
                 "Slice removal", self.run_process, parameters=parameters,
@@ -57,7 +58,9 @@ class ProcessStrategySlicing(pycam.Plugins.PluginBase):
         line_distance = 2 * tool_params["radius"] * \
                 (1.0 - process["parameters"]["overlap"])
         path_generator = pycam.PathGenerators.PushCutter.PushCutter(
-                pycam.PathProcessors.SimpleCutter.SimpleCutter())
+                pycam.PathProcessors.SimpleCutter.SimpleCutter(
+                    tolerance=process["parameters"]["simplify_tolerance"] \
+                        or None))
         path_pattern = process["parameters"]["path_pattern"]
         path_get_func = self.core.get("get_parameter_sets")(
                 "path_pattern")[path_pattern["name"]]["func"]
@@ -71,7 +74,8 @@ class ProcessStrategySlicing(pycam.Plugins.PluginBase):
 class ProcessStrategyContour(pycam.Plugins.PluginBase):
 
     DEPENDS = ["Processes", "PathParamStepDown",
-            "PathParamMaterialAllowance", "PathParamMillingStyle"]
+            "PathParamMaterialAllowance", "PathParamMillingStyle",
+            "PathParamSimplifyTolerance"]
     CATEGORIES = ["Process"]
 
     def setup(self):
@@ -79,6 +83,7 @@ class ProcessStrategyContour(pycam.Plugins.PluginBase):
                 "material_allowance": 0,
                 "overlap": 0.8,
                 "milling_style": pycam.Toolpath.MotionGrid.MILLING_STYLE_IGNORE,
+                "simplify_tolerance": 0,
         }
         self.core.get("register_parameter_set")("process", "contour",
                 "Waterline", self.run_process, parameters=parameters,
@@ -96,7 +101,9 @@ class ProcessStrategyContour(pycam.Plugins.PluginBase):
         line_distance = 2 * tool_params["radius"] * \
                 (1.0 - process["parameters"]["overlap"])
         path_generator = pycam.PathGenerators.PushCutter.PushCutter(
-                pycam.PathProcessors.ContourCutter.ContourCutter())
+                pycam.PathProcessors.ContourCutter.ContourCutter(
+                    tolerance=process["parameters"]["simplify_tolerance"] \
+                        or None))
         # TODO: milling_style currently refers to the grid lines - not to the waterlines
         motion_grid = pycam.Toolpath.MotionGrid.get_fixed_grid(
                 (low, high), process["parameters"]["step_down"],
@@ -109,13 +116,18 @@ class ProcessStrategyContour(pycam.Plugins.PluginBase):
 class ProcessStrategySurfacing(pycam.Plugins.PluginBase):
 
     DEPENDS = ["ParameterGroupManager", "PathParamOverlap",
-            "PathParamMaterialAllowance", "PathParamPattern"]
+            "PathParamMaterialAllowance", "PathParamPattern",
+            "PathParamSamplingTolerance", "PathParamSamplingPoints",
+            "PathParamSimplifyTolerance"]
     CATEGORIES = ["Process"]
 
     def setup(self):
         parameters = {"overlap": 0.6,
                 "material_allowance": 0,
                 "path_pattern": None,
+                "sampling_tolerance": 0,
+                "sampling_points": 0,
+                "simplify_tolerance": 0,
         }
         self.core.get("register_parameter_set")("process", "surfacing",
                 "Surfacing", self.run_process, parameters=parameters,
@@ -133,7 +145,11 @@ class ProcessStrategySurfacing(pycam.Plugins.PluginBase):
         line_distance = 2 * tool_params["radius"] * \
                 (1.0 - process["parameters"]["overlap"])
         path_generator = pycam.PathGenerators.DropCutter.DropCutter(
-                pycam.PathProcessors.PathAccumulator.PathAccumulator())
+                pycam.PathProcessors.PathAccumulator.PathAccumulator(
+                    tolerance=process["parameters"]["simplify_tolerance"] \
+                        or None),
+                tolerance=process["parameters"]["sampling_tolerance"] or None,
+                max_points=int(process["parameters"]["sampling_points"]) or None)
         path_pattern = process["parameters"]["path_pattern"]
         path_get_func = self.core.get("get_parameter_sets")(
                 "path_pattern")[path_pattern["name"]]["func"]
@@ -148,7 +164,8 @@ class ProcessStrategyEngraving(pycam.Plugins.PluginBase):
 
     DEPENDS = ["ParameterGroupManager", "PathParamStepDown",
             "PathParamMillingStyle", "PathParamRadiusCompensation",
-            "PathParamTraceModel", "PathParamPocketingType"]
+            "PathParamTraceModel", "PathParamPocketingType",
+            "PathParamSimplifyTolerance"]
     CATEGORIES = ["Process"]
 
     def setup(self):
@@ -157,6 +174,7 @@ class ProcessStrategyEngraving(pycam.Plugins.PluginBase):
                 "radius_compensation": False,
                 "trace_models": [],
                 "pocketing_type": pycam.Toolpath.MotionGrid.POCKETING_TYPE_NONE,
+                "simplify_tolerance": 0,
         }
         self.core.get("register_parameter_set")("process", "engraving",
                 "Engraving", self.run_process, parameters=parameters,
@@ -172,7 +190,9 @@ class ProcessStrategyEngraving(pycam.Plugins.PluginBase):
         low, high = environment["bounds"].get_absolute_limits(
                 tool=tool, models=environment["collision_models"])
         path_generator = pycam.PathGenerators.EngraveCutter.EngraveCutter(
-                pycam.PathProcessors.SimpleCutter.SimpleCutter())
+                pycam.PathProcessors.SimpleCutter.SimpleCutter(
+                    tolerance=process["parameters"]["simplify_tolerance"] \
+                        or None))
         models = [m.model for m in process["parameters"]["trace_models"]]
         if not models:
             self.log.error("No trace models given: you need to assign a " + \
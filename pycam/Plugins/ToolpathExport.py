@@ -199,19 +199,23 @@ class ToolpathExport(pycam.Plugins.PluginBase):
                     touch_off_height=self.core.get("touch_off_height"),
                     touch_off_pause_execution=self.core.get("touch_off_pause_execution"))
             path_mode = self.core.get("gcode_path_mode")
+            arc_tolerance = self.core.get("gcode_arc_tolerance")
             if path_mode == 0:
-                generator.set_path_mode(PATH_MODES["exact_path"])
+                generator.set_path_mode(PATH_MODES["exact_path"],
+                        arc_tolerance=arc_tolerance)
             elif path_mode == 1:
-                generator.set_path_mode(PATH_MODES["exact_stop"])
+                generator.set_path_mode(PATH_MODES["exact_stop"],
+                        arc_tolerance=arc_tolerance)
             elif path_mode == 2:
-                generator.set_path_mode(PATH_MODES["continuous"])
+                generator.set_path_mode(PATH_MODES["continuous"],
+                        arc_tolerance=arc_tolerance)
             else:
                 naive_tolerance = self.core.get("gcode_naive_tolerance")
                 if naive_tolerance == 0:
                     naive_tolerance = None
                 generator.set_path_mode(PATH_MODES["continuous"],
                         self.core.get("gcode_motion_tolerance"),
-                        naive_tolerance)
+                        naive_tolerance, arc_tolerance=arc_tolerance)
             for toolpath in toolpaths:
                 params = toolpath.get_params()
                 tool_id = params.get("tool_id", 1)
@@ -219,7 +223,7 @@ class ToolpathExport(pycam.Plugins.PluginBase):
                 spindle_speed = params.get("spindle_speed", 1000)
                 generator.set_speed(feedrate, spindle_speed)
                 # TODO: implement toolpath.get_meta_data()
-                generator.add_moves(toolpath.get_moves(safety_height),
+                generator.add_moves(toolpath.iter_moves(safety_height),
                         tool_id=tool_id, comment="")
             generator.finish()
             destination.close()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Headless material removal simulation.
+# A toolpath is replayed against a block of stock material. The remaining
+# material is represented by a height map (see ZBuffer). The height map is
+# split into tiles, which are simulated in parallel.
+
+from pycam.Simulation.ZBuffer import ZBuffer
+from pycam.Utils.threading import run_in_parallel
+from pycam.Utils import ProgressCounter
+
+import math
+import uuid
+
+import numpy
+
+
+# number of grid points (in x and y direction) of a tile
+TILE_SIZE = 256
+
+
+class MoveSegments(object):
+    """ the straight lines of a toolpath (start and end arrays)
+
+    The "uuid" attribute allows parallel processes to cache this object.
+    """
+
+    def __init__(self, moves):
+        if hasattr(moves, "positions"):
+            # columnar moves (see pycam.Toolpath.PathArrays.MoveArrays)
+            locations = numpy.asarray(moves.positions, dtype=numpy.float64)
+        else:
+            locations = numpy.array([(p.x, p.y, p.z) for p, rapid in moves],
+                    dtype=numpy.float64)
+        locations = locations.reshape(-1, 3)
+        if len(locations) == 1:
+            self.starts = locations
+            self.ends = locations
+        else:
+            self.starts = locations[:-1]
+            self.ends = locations[1:]
+        self.uuid = str(uuid.uuid4())
+
+    def __len__(self):
+        return len(self.starts)
+
+    def get_segments_within(self, minx, maxx, miny, maxy, distance):
+        """ return the segments with a bounding box intersecting the given
+        rectangle (enlarged by 'distance')
+        """
+        starts, ends = self.starts, self.ends
+        mask = (numpy.minimum(starts[:, 0], ends[:, 0]) <= maxx + distance) \
+                & (numpy.maximum(starts[:, 0], ends[:, 0]) >= minx - distance) \
+                & (numpy.minimum(starts[:, 1], ends[:, 1]) <= maxy + distance) \
+                & (numpy.maximum(starts[:, 1], ends[:, 1]) >= miny - distance)
+        return starts[mask], ends[mask]
+
+
+def _simulate_tile(args):
+    """ simulate the material removal of a single tile
+
+    @returns: the heights of the material and the heights of the model (or
+        None) as 2D arrays
+    """
+    grid, stock_height, segments, cutter, model = args
+    zbuffer = ZBuffer(*grid)
+    zbuffer.reset(stock_height)
+    starts, ends = segments.get_segments_within(zbuffer.x[0], zbuffer.x[-1],
+            zbuffer.y[0], zbuffer.y[-1], cutter.radius)
+    zbuffer.add_segments(cutter, starts, ends)
+    if model is None:
+        model_heights = None
+    else:
+        model_buffer = ZBuffer(*grid)
+        model_buffer.add_triangles(model.get_triangle_arrays())
+        model_heights = model_buffer.z
+    return zbuffer.z, model_heights
+
+
+class HeightMap(object):
+    """ The material of a block of stock after processing a toolpath.
+
+    The heights are sampled at the centers of a regular grid of square cells
+    ("resolution" is the size of a cell). The stock material is lowered by
+    the cutter along all moves of the toolpath. The (optional) model is used
+    for statistics about the remaining material.
+    """
+
+    def __init__(self, bounds_low, bounds_high, resolution):
+        self.minx, self.miny, self.minz = [float(value)
+                for value in bounds_low]
+        self.maxx, self.maxy, self.maxz = [float(value)
+                for value in bounds_high]
+        self.xres = max(1,
+                int(math.ceil((self.maxx - self.minx) / resolution)))
+        self.yres = max(1,
+                int(math.ceil((self.maxy - self.miny) / resolution)))
+        self.dx = (self.maxx - self.minx) / self.xres
+        self.dy = (self.maxy - self.miny) / self.yres
+        self.z = numpy.empty((self.yres, self.xres))
+        self.z.fill(self.maxz)
+        self.model_z = None
+
+    def _get_tiles(self):
+        """ return the index ranges and the grid definitions (see ZBuffer) of
+        all tiles
+        """
+        tiles = []
+        for row0 in range(0, self.yres, TILE_SIZE):
+            row1 = min(row0 + TILE_SIZE, self.yres)
+            for col0 in range(0, self.xres, TILE_SIZE):
+                col1 = min(col0 + TILE_SIZE, self.xres)
+                # the grid points are located at the centers of the cells
+                grid = (self.minx + (col0 + 0.5) * self.dx,
+                        self.minx + (col1 + 0.5) * self.dx, col1 - col0,
+                        self.miny + (row0 + 0.5) * self.dy,
+                        self.miny + (row1 + 0.5) * self.dy, row1 - row0,
+                        self.minz, self.maxz)
+                tiles.append(((row0, row1, col0, col1), grid))
+        return tiles
+
+    def simulate(self, moves, cutter, model=None, callback=None):
+        """ remove the material swept by the cutter along the given moves
+
+        @param moves: (location, rapid) tuples as returned by
+            Toolpath.iter_moves
+        @type moves: iterable((Point, bool))
+        @param cutter: the tool
+        @type cutter: BaseCutter
+        @param model: the target model (used for "get_statistics")
+        @type model: Model
+        @param callback: a function for progress updates - returning True
+            cancels the simulation
+        @returns: False if the simulation was cancelled
+        @rtype: bool
+        """
+        segments = MoveSegments(moves)
+        tiles = self._get_tiles()
+        args = [(grid, self.maxz, segments, cutter, model)
+                for limits, grid in tiles]
+        progress_counter = ProgressCounter(len(tiles), callback)
+        if model is None:
+            self.model_z = None
+        else:
+            self.model_z = numpy.empty(self.z.shape)
+        finished = 0
+        for heights, model_heights in run_in_parallel(_simulate_tile, args,
+                callback=progress_counter.update):
+            # the results are delivered in the order of the tiles
+            row0, row1, col0, col1 = tiles[finished][0]
+            self.z[row0:row1, col0:col1] = heights
+            if not model_heights is None:
+                self.model_z[row0:row1, col0:col1] = model_heights
+            finished += 1
+            if progress_counter.increment():
+                break
+        return finished == len(tiles)
+
+    def get_statistics(self):
+        """ calculate some statistics about the removed and the remaining
+        material (volumes are given in cubic units of the model)
+
+        @rtype: dict
+        """
+        cell_area = self.dx * self.dy
+        stats = {
+            "resolution": max(self.dx, self.dy),
+            "stock_volume": (self.maxz - self.minz) * cell_area * self.z.size,
+            "removed_volume": (self.maxz - self.z).sum() * cell_area,
+            "min_height": self.z.min(),
+        }
+        if not self.model_z is None:
+            # positive: material left above the model
+            # negative: the model was damaged
+            remaining = self.z - self.model_z
+            excess = numpy.maximum(remaining, 0)
+            gouges = numpy.maximum(-remaining, 0)
+            stats["remaining_volume"] = excess.sum() * cell_area
+            stats["max_remaining"] = excess.max()
+            stats["mean_remaining"] = excess.mean()
+            stats["gouge_volume"] = gouges.sum() * cell_area
+            stats["max_gouge"] = gouges.max()
+        return stats
+
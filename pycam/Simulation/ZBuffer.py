@@ -3,6 +3,7 @@
 $Id$
 
 Copyright 2009-2010 Lode Leroy
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
 
 This file is part of PyCAM.
 
@@ -20,11 +21,10 @@ You should have received a copy of the GNU General Public License
 along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from pycam.Geometry.utils import sqrt
-from pycam.Geometry.Point import Point
-import ctypes
+from pycam.Geometry.TriangleArrays import TriangleArrays
 import math
 
+import numpy
 
 try:
     import OpenGL.GL as GL
@@ -35,26 +35,31 @@ except ImportError:
 
 EPSILON = 1e-8
 
+# number of quads (in x and y direction) combined in one display list
 NUM_PER_CELL_X = 10
 NUM_PER_CELL_Y = 10
-NUM_CELL_X = 0
-NUM_CELL_Y = 0
 
+# maximum number of grid point combinations (with triangles or moves) to be
+# calculated at once (limits the memory usage)
+PAIR_CHUNK_SIZE = 2 ** 20
 
-class ZBufferItem(object):
-    def __init__(self, z=0.0):
-        self.z = float(z)
-        self.changed = True
-        self.list = -1
 
 class ZCellItem(object):
     def __init__(self):
         self.list = -1
-        self.array = None
+        self.quad_lists = None
+
 
 class ZBuffer(object):
+    """ A heightfield representation of the material.
+
+    The height of every grid point is stored in the numpy array "z" (one row
+    per y value). The grid is split into cells of NUM_PER_CELL_X *
+    NUM_PER_CELL_Y quads. Every cell is rendered via its own display list.
+    Only the display lists of changed cells are rebuilt.
+    """
+
     def __init__(self, minx, maxx, xres, miny, maxy, yres, minz, maxz):
-        global NUM_CELL_X, NUM_CELL_Y
         self.minx = float(minx)
         self.maxx = float(maxx)
         self.miny = float(miny)
@@ -63,144 +68,247 @@ class ZBuffer(object):
         self.maxz = float(maxz)
         self.xres = int(xres)
         self.yres = int(yres)
+        self.dx = (self.maxx - self.minx) / self.xres
+        self.dy = (self.maxy - self.miny) / self.yres
+        self.x = self.minx + numpy.arange(self.xres) * self.dx
+        self.y = self.miny + numpy.arange(self.yres) * self.dy
+        self.z = numpy.empty((self.yres, self.xres))
+        self.z.fill(self.minz)
+        self.num_cell_x = max(1, (self.xres - 2) // NUM_PER_CELL_X + 1)
+        self.num_cell_y = max(1, (self.yres - 2) // NUM_PER_CELL_Y + 1)
+        self.changed_cells = numpy.ones((self.num_cell_y, self.num_cell_x),
+                dtype=numpy.bool_)
+        self.changed = True
+        self.cell = [[ZCellItem() for x in range(self.num_cell_x)]
+                for y in range(self.num_cell_y)]
+
+    def _mark_changed(self, rows, cols):
+        """ mark the cells containing the given grid points as changed """
+        if len(rows) == 0:
+            return
+        # a grid point on the border of a cell belongs to both cells
+        for row_offset in (0, 1):
+            cell_rows = numpy.clip((rows - row_offset) // NUM_PER_CELL_Y, 0,
+                    self.num_cell_y - 1)
+            for col_offset in (0, 1):
+                cell_cols = numpy.clip((cols - col_offset) // NUM_PER_CELL_X,
+                        0, self.num_cell_x - 1)
+                self.changed_cells[cell_rows, cell_cols] = True
         self.changed = True
 
-        NUM_CELL_X = self.xres / NUM_PER_CELL_X
-        NUM_CELL_Y = self.yres / NUM_PER_CELL_Y
-
-        self.x = [0.0] * self.xres
-        for i in range(0, self.xres):
-            self.x[i] = self.minx+(i * (self.maxx-self.minx)/self.xres)
-        self.y = [0.0] * self.yres
-        for i in range(0, self.yres):
-            self.y[i] = self.miny+(i * (self.maxy-self.miny)/self.yres)
-        self.buf = [ [] ] * self.yres
-        for y in range(0, self.yres):
-            self.buf[y] = [ None ] * self.xres
-            for x in range(0, self.xres):
-                self.buf[y][x] = ZBufferItem(self.minz)
-
-        self.list = [ [] ] * self.yres
-        for y in range(0, self.yres):
-            self.list[y] = [ None ] * self.xres
-            for x in range(0, self.xres):
-                self.list[y][x] = -1
-
-        self.cell = [ None ] * NUM_CELL_Y
-        for y in range(0, NUM_CELL_Y):
-            self.cell[y] = [ None ] * NUM_CELL_X
-            for x in range(0, NUM_CELL_X):
-                self.cell[y][x] = ZCellItem()
+    def _mark_changed_area(self, row0, row1, col0, col1):
+        """ mark the cells containing the grid points [row0:row1, col0:col1]
+        as changed
+        """
+        self.changed_cells[max(row0 - 1, 0) // NUM_PER_CELL_Y:
+                    (row1 - 1) // NUM_PER_CELL_Y + 1,
+                max(col0 - 1, 0) // NUM_PER_CELL_X:
+                    (col1 - 1) // NUM_PER_CELL_X + 1] = True
+        self.changed = True
+
+    def _get_index_range(self, low, high, start, step, count):
+        """ return the range of grid indices (first, last + 1) between
+        'low' and 'high' (arrays) - clipped to the size of the grid
+        """
+        first = numpy.ceil((low - start) / step - EPSILON)
+        last = numpy.floor((high - start) / step + EPSILON) + 1
+        return (numpy.clip(first, 0, count).astype(numpy.int_),
+                numpy.clip(last, 0, count).astype(numpy.int_))
+
+    def _update_heights(self, indices, heights, func):
+        """ combine the heights of the grid points (flat indices) with the
+        given values via 'func' (numpy.maximum or numpy.minimum)
+        Multiple occurrences of the same grid point are allowed.
+        """
+        if len(indices) == 0:
+            return
+        order = numpy.argsort(indices)
+        indices = indices[order]
+        starts = numpy.concatenate(([0],
+                numpy.nonzero(numpy.diff(indices))[0] + 1))
+        values = func.reduceat(heights[order], starts)
+        targets = indices[starts]
+        z = self.z.ravel()
+        old_values = z[targets]
+        new_values = func(old_values, values)
+        changed = new_values != old_values
+        targets = targets[changed]
+        z[targets] = new_values[changed]
+        self._mark_changed(targets // self.xres, targets % self.xres)
+
+    def reset(self, height=None):
+        """ set all grid points to the given height (default: minz) """
+        if height is None:
+            height = self.minz
+        self.z.fill(height)
+        self.changed_cells.fill(True)
+        self.changed = True
 
     def add_wave(self, freq=8, damp=3.0):
+        rmax = math.sqrt(self.y[0] * self.y[0] + self.x[0] * self.x[0])
+        r = numpy.sqrt(self.y[:, numpy.newaxis] ** 2 + self.x ** 2) / rmax
+        self.z[:] = 1 + numpy.cos(r * r * math.pi * freq) / (1 + damp * r)
+        self.changed_cells.fill(True)
         self.changed = True
-        rmax = sqrt(self.y[0]*self.y[0]+self.x[0]*self.x[0])
-        for y in range(0, self.yres):
-            for x in range(0, self.xres):
-                r = sqrt(self.y[y]*self.y[y]+self.x[x]*self.x[x])
-                self.buf[y][x].z = 1 + math.cos(r / rmax * r / rmax * math.pi \
-                        * freq) / (1 + damp * (r / rmax))
-                self.buf[y][x].changed = True
 
     def add_triangles(self, triangles):
-        for t in triangles:
-            self.add_triangle(t)
+        """ raise the heightfield up to the given triangles
+
+        @param triangles: a list of triangles or (faster) an already existing
+            array representation (see Model.get_triangle_arrays)
+        @type triangles: list(Triangle) | TriangleArrays
+        """
+        if not isinstance(triangles, TriangleArrays):
+            triangles = TriangleArrays.from_triangles(triangles)
+        if len(triangles) == 0:
+            return
+        col0, col1 = self._get_index_range(triangles.minx, triangles.maxx,
+                self.minx, self.dx, self.xres)
+        row0, row1 = self._get_index_range(triangles.miny, triangles.maxy,
+                self.miny, self.dy, self.yres)
+        widths = numpy.maximum(col1 - col0, 0)
+        counts = widths * numpy.maximum(row1 - row0, 0)
+        # every triangle is combined with all grid points within its bounding
+        # box - all combinations are processed in chunks
+        ends = numpy.cumsum(counts)
+        starts = ends - counts
+        for chunk_start in range(0, ends[-1], PAIR_CHUNK_SIZE):
+            pairs = numpy.arange(chunk_start,
+                    min(ends[-1], chunk_start + PAIR_CHUNK_SIZE))
+            tri_indices = numpy.searchsorted(ends, pairs, side="right")
+            offsets = pairs - starts[tri_indices]
+            cols = col0[tri_indices] + offsets % widths[tri_indices]
+            rows = row0[tri_indices] + offsets // widths[tri_indices]
+            xs = self.x[cols]
+            ys = self.y[rows]
+            inside = triangles.is_point_inside(tri_indices, xs, ys)
+            heights = triangles.get_plane_heights(tri_indices[inside],
+                    xs[inside], ys[inside])
+            self._update_heights(rows[inside] * self.xres + cols[inside],
+                    heights, numpy.maximum)
 
     def add_triangle(self, t):
-        minx = int((t.minx - self.minx) / (self.maxx - self.minx) \
-                * self.xres) - 1
-        maxx = int((t.maxx - self.minx) / (self.maxx - self.minx) \
-                * self.xres) + 1
-        miny = int((t.miny - self.miny) / (self.maxy - self.miny) \
-                * self.yres) - 1
-        maxy = int((t.maxy - self.miny) / (self.maxy - self.miny) \
-                * self.yres) + 2
-        if minx < 0: 
-            minx = 0
-        if maxx > self.xres - 1: 
-            maxx = self.xres - 1
-        if miny < 0: 
-            miny = 0
-        if maxy > self.yres - 1:
-            maxy = self.yres - 1
-
-        for y in range(miny, maxy):
-            py = self.y[y]
-            for x in range(minx, maxx):
-                px = self.x[x]
-                v0x = t.p3.x - t.p1.x
-                v0y = t.p3.y - t.p1.y
-                v1x = t.p2.x - t.p1.x
-                v1y = t.p2.y - t.p1.y
-                v2x = px - t.p1.x
-                v2y = py - t.p1.y
-                dot00 = v0x*v0x + v0y*v0y
-                dot01 = v0x*v1x + v0y*v1y
-                dot02 = v0x*v2x + v0y*v2y
-                dot11 = v1x*v1x + v1y*v1y
-                dot12 = v1x*v2x + v1y*v2y
-                invDenom = 1 / (dot00 * dot11 - dot01 * dot01)
-                u = (dot11 * dot02 - dot01 * dot12) * invDenom
-                v = (dot00 * dot12 - dot01 * dot02) * invDenom
-                if (u >= -EPSILON) and (v >= -EPSILON) and (u + v <= 1-EPSILON):
-                    v0z = t.p3.z - t.p1.z
-                    v1z = t.p2.z - t.p1.z
-                    pz = t.p1.z + v0z * u + v1z * v
-                    if pz > self.buf[y][x].z:
-                        self.buf[y][x].z = pz
-                        self.buf[y+0][x+0].changed = True
-                        self.buf[y+0][x+1].changed = True
-                        self.buf[y+1][x+0].changed = True
-                        self.buf[y+1][x+1].changed = True
-                        self.changed = True
+        self.add_triangles([t])
 
     def add_cutter(self, c):
-        cx = c.location.x
-        cy = c.location.y
-        rsq = c.radiussq
-        minx = int((c.minx - self.minx) / (self.maxx - self.minx) * self.xres) \
-                - 1
-        maxx = int((c.maxx - self.minx) / (self.maxx - self.minx) * self.xres) \
-                + 1
-        miny = int((c.miny - self.miny) / (self.maxy - self.miny) * self.yres) \
-                - 1
-        maxy = int((c.maxy - self.miny) / (self.maxy - self.miny) * self.yres) \
-                + 1
-        if minx < 0: 
-            minx = 0
-        if maxx < 0: 
-            maxx = 0
-        if minx > self.xres - 1: 
-            minx = self.xres - 1
-        if maxx > self.xres - 1: 
-            maxx = self.xres - 1
-        if miny < 0: 
-            miny = 0
-        if maxy < 0: 
-            maxy = 0
-        if maxy > self.yres - 1: 
-            maxy = self.yres - 1
-        if miny > self.yres - 1: 
-            miny = self.yres - 1
-        p = Point(0, 0, 0)
-        zaxis = Point(0, 0, -1)
-
-        for y in range(miny, maxy):
-            p.y = py = self.y[y]
-            for x in range(minx, maxx):
-                p.x = px = self.x[x]
-                if (px - cx) * (px - cx) + (py - cy) * (py - cy) \
-                        <= rsq + EPSILON:
-                    (cl, ccp, cp, l) = c.intersect_point(zaxis, p)
-                    if ccp:
-                        pz = l
-                        if pz < self.buf[y][x].z:
-                            self.buf[y][x].z = pz
-                            self.buf[y+0][x+0].changed = True
-                            self.buf[y+0][x+1].changed = True
-                            self.buf[y+1][x+0].changed = True
-                            self.buf[y+1][x+1].changed = True
-                            self.changed = True
+        """ remove the material occupied by the cutter at its current location
+        """
+        self.add_moves(c, [(c.location, False)])
+
+    def add_moves(self, cutter, moves):
+        """ Remove the material swept by the cutter along the given moves.
+        The cutter moves along straight lines between consecutive locations.
+
+        @param cutter: the tool (its location is ignored)
+        @type cutter: BaseCutter
+        @param moves: a list of (location, rapid) tuples as returned by
+            Toolpath.get_moves
+        @type moves: list((Point, bool))
+        """
+        if not moves:
+            return
+        locations = numpy.array([(p.x, p.y, p.z) for p, rapid in moves],
+                dtype=numpy.float64)
+        if len(locations) == 1:
+            self.add_segments(cutter, locations, locations)
+        else:
+            self.add_segments(cutter, locations[:-1], locations[1:])
+
+    def add_segments(self, cutter, starts, ends):
+        """ Remove the material swept by the cutter along straight lines.
+        This is the array based equivalent of "add_moves".
+
+        @param starts: the start locations of all lines
+        @type starts: numpy.ndarray with shape (n, 3)
+        @param ends: the end locations of all lines
+        @type ends: numpy.ndarray with shape (n, 3)
+        """
+        if len(starts) == 0:
+            return
+        radius = cutter.radius
+        deltas = ends - starts
+        lengths = numpy.sqrt(deltas[:, 0] ** 2 + deltas[:, 1] ** 2)
+        # Vertical moves are reduced to their lowest location. Long moves are
+        # split (limits the size of the affected area). Steep moves are split,
+        # too: the height of the cutter along each piece is calculated at the
+        # point of the move closest to each grid point.
+        vertical = lengths < EPSILON
+        lowest = numpy.where((deltas[:, 2] < 0)[:, numpy.newaxis], ends,
+                starts)
+        starts = numpy.where(vertical[:, numpy.newaxis], lowest, starts)
+        deltas[vertical] = 0
+        step = min(self.dx, self.dy)
+        pieces = numpy.maximum(numpy.ceil(lengths / radius),
+                numpy.ceil(numpy.abs(deltas[:, 2]) / step))
+        pieces = numpy.maximum(pieces, 1).astype(numpy.int_)
+        move_indices = numpy.repeat(numpy.arange(len(starts)), pieces)
+        piece_indices = numpy.arange(len(move_indices)) \
+                - numpy.repeat(numpy.cumsum(pieces) - pieces, pieces)
+        deltas = deltas[move_indices] / pieces[move_indices][:, numpy.newaxis]
+        starts = starts[move_indices] + piece_indices[:, numpy.newaxis] \
+                * deltas
+        col0, col1 = self._get_index_range(
+                numpy.minimum(starts[:, 0], starts[:, 0] + deltas[:, 0]) \
+                    - radius,
+                numpy.maximum(starts[:, 0], starts[:, 0] + deltas[:, 0]) \
+                    + radius, self.minx, self.dx, self.xres)
+        row0, row1 = self._get_index_range(
+                numpy.minimum(starts[:, 1], starts[:, 1] + deltas[:, 1]) \
+                    - radius,
+                numpy.maximum(starts[:, 1], starts[:, 1] + deltas[:, 1]) \
+                    + radius, self.miny, self.dy, self.yres)
+        widths = col1 - col0
+        heights = row1 - row0
+        valid = (widths > 0) & (heights > 0)
+        # Pieces with similar sizes of their affected area are processed
+        # together. The order of the pieces does not matter.
+        order = numpy.nonzero(valid)[0]
+        order = order[numpy.lexsort((widths[order], heights[order]))]
+        index = 0
+        while index < len(order):
+            first = order[index]
+            count = max(1, PAIR_CHUNK_SIZE // (heights[first] * widths[first]))
+            chunk = order[index:index + count]
+            while (len(chunk) > 1) and (len(chunk) * heights[chunk].max() \
+                    * widths[chunk].max() > 2 * PAIR_CHUNK_SIZE):
+                chunk = chunk[:len(chunk) // 2]
+            self._add_move_pieces(cutter, starts[chunk], deltas[chunk],
+                    col0[chunk], row0[chunk], widths[chunk], heights[chunk])
+            index += len(chunk)
+
+    def _add_move_pieces(self, cutter, starts, deltas, col0, row0, widths,
+            heights):
+        """ calculate the lowest position of the cutter's surface along the
+        given (short) moves for every grid point within their bounding boxes
+        """
+        newaxis = numpy.newaxis
+        cols = col0[:, newaxis, newaxis] \
+                + numpy.arange(widths.max())[newaxis, newaxis, :]
+        rows = row0[:, newaxis, newaxis] \
+                + numpy.arange(heights.max())[newaxis, :, newaxis]
+        xs = self.minx + cols * self.dx
+        ys = self.miny + rows * self.dy
+        start_x, start_y, start_z = [starts[:, dim][:, newaxis, newaxis]
+                for dim in range(3)]
+        delta_x, delta_y, delta_z = [deltas[:, dim][:, newaxis, newaxis]
+                for dim in range(3)]
+        length_sq = delta_x * delta_x + delta_y * delta_y
+        length_sq = numpy.where(length_sq > 0, length_sq, 1)
+        # the position along the move closest to each grid point
+        factors = numpy.clip(((xs - start_x) * delta_x \
+                + (ys - start_y) * delta_y) / length_sq, 0, 1)
+        dist = numpy.sqrt((xs - start_x - factors * delta_x) ** 2 \
+                + (ys - start_y - factors * delta_y) ** 2)
+        surface = start_z + factors * delta_z \
+                + cutter.get_profile_heights(dist)
+        # overlapping areas of the pieces are combined one after another
+        for index, (col, row, width, height) in enumerate(zip(col0.tolist(),
+                row0.tolist(), widths.tolist(), heights.tolist())):
+            view = self.z[row:row + height, col:col + width]
+            block = surface[index, :height, :width]
+            if (block < view).any():
+                numpy.minimum(view, block, out=view)
+                self._mark_changed_area(row, row + height, col, col + width)
 
     def to_OpenGL(self):
         if GL_enabled:
@@ -213,394 +321,165 @@ class ZBuffer(object):
         nz = 1.0 / (self.maxz - self.minz)
         return (-ny * (z1 - z0) * nz / nx, -nx * (z2 - z1) * nz / ny,
                 nx * ny / nz * 100)
-        
-    # the naive way (quads)
-    def to_OpenGL_1(self):
-        GL.glBegin(GL.GL_QUADS)
-        for y in range(self.yres - 1):
-            for x in range(self.xres - 1):
-                n = self.normal(self.buf[y+0][x+0].z, self.buf[y+0][x+1].z,
-                        self.buf[y+1][x+0].z)
-                GL.glNormal3f(n[0], n[1], n[2])
-                GL.glVertex3f(self.x[x+0], self.y[y+0], self.buf[y+0][x+0].z)
-                GL.glVertex3f(self.x[x+1], self.y[y+0], self.buf[y+0][x+1].z)
-                GL.glVertex3f(self.x[x+1], self.y[y+1], self.buf[y+1][x+1].z)
-                GL.glVertex3f(self.x[x+0], self.y[y+1], self.buf[y+1][x+0].z)
 
+    def _get_normals(self, x0, x1, y0, y1):
+        """ calculate the normals of the grid points [y0:y1, x0:x1] (see
+        "normal") as an array of shape (y1 - y0, x1 - x0, 3)
+        """
+        rows = numpy.arange(y0, y1)[:, numpy.newaxis]
+        cols = numpy.arange(x0, x1)[numpy.newaxis, :]
+        # the points of the last row and column use their previous neighbours
+        border = (rows >= self.yres - 1) | (cols >= self.xres - 1)
+        rows = numpy.where(border, rows - 1, rows)
+        cols = numpy.where(border, cols - 1, cols)
+        n = self.normal(self.z[rows, cols], self.z[rows, cols + 1],
+                self.z[rows + 1, cols])
+        normals = numpy.empty((y1 - y0, x1 - x0, 3))
+        normals[:, :, 0] = n[0]
+        normals[:, :, 1] = n[1]
+        normals[:, :, 2] = n[2]
+        return normals
+
+    def _get_vertices(self, x0, x1, y0, y1):
+        vertices = numpy.empty((y1 - y0, x1 - x0, 3))
+        vertices[:, :, 0] = self.x[numpy.newaxis, x0:x1]
+        vertices[:, :, 1] = self.y[y0:y1, numpy.newaxis]
+        vertices[:, :, 2] = self.z[y0:y1, x0:x1]
+        return vertices
+
+    def _get_cell_bounds(self, cell_x, cell_y):
+        """ return the range of grid points of a cell (including the border
+        points shared with the neighbouring cells)
+        """
+        x0 = cell_x * NUM_PER_CELL_X
+        y0 = cell_y * NUM_PER_CELL_Y
+        return (x0, min(x0 + NUM_PER_CELL_X + 1, self.xres),
+                y0, min(y0 + NUM_PER_CELL_Y + 1, self.yres))
+
+    def _render_cells(self, build_cell):
+        """ call the display list of every cell - rebuild changed cells via
+        'build_cell(cell, x0, x1, y0, y1)' before
+        """
+        for cell_y in range(self.num_cell_y):
+            for cell_x in range(self.num_cell_x):
+                cell = self.cell[cell_y][cell_x]
+                if (cell.list == -1) or self.changed_cells[cell_y, cell_x]:
+                    if cell.list == -1:
+                        cell.list = GL.glGenLists(1)
+                    x0, x1, y0, y1 = self._get_cell_bounds(cell_x, cell_y)
+                    GL.glNewList(cell.list, GL.GL_COMPILE)
+                    build_cell(cell, x0, x1, y0, y1)
+                    GL.glEndList()
+                GL.glCallList(cell.list)
+        self.changed_cells.fill(False)
+
+    def _draw_quads(self, x0, x1, y0, y1):
+        vertices = self._get_vertices(x0, x1, y0, y1)
+        normals = self._get_normals(x0, x1, y0, y1)
+        GL.glBegin(GL.GL_QUADS)
+        for yi in range(y1 - y0 - 1):
+            for xi in range(x1 - x0 - 1):
+                GL.glNormal3f(*normals[yi, xi])
+                GL.glVertex3f(*vertices[yi, xi])
+                GL.glVertex3f(*vertices[yi + 1, xi])
+                GL.glVertex3f(*vertices[yi + 1, xi + 1])
+                GL.glVertex3f(*vertices[yi, xi + 1])
         GL.glEnd()
 
+    # the naive way (quads)
+    def to_OpenGL_1(self):
+        self._draw_quads(0, self.xres, 0, self.yres)
+        self.changed_cells.fill(False)
+
     # use display lists (per quad)
-    def to_OpenGL_2(self):        
-        for y in range(self.yres - 1):
-            for x in range(self.xres - 1):
-#                print "z[%f][%f]=%f" % (self.y[y],self.x[x],self.buf[y][x])
-                if self.buf[y+0][x+0].changed or self.buf[y+0][x+1].changed \
-                        or self.buf[y+1][x+0].changed \
-                        or self.buf[y+1][x+1].changed:
-                    if self.buf[y][x].list == -1:
-                        self.buf[y][x].list = GL.glGenLists(1)
-
-                    GL.glNewList(self.buf[y][x].list, GL.GL_COMPILE)
-                    GL.glBegin(GL.GL_QUADS)
-                    n = self.normal(self.buf[y+0][x+0].z, self.buf[y+0][x+1].z,
-                            self.buf[y+1][x+0].z)
-                    GL.glNormal3f(n[0], n[1], n[2])
-                    GL.glVertex3f(self.x[x+0], self.y[y+0],
-                            self.buf[y+0][x+0].z)
-                    GL.glVertex3f(self.x[x+1], self.y[y+0],
-                            self.buf[y+0][x+1].z)
-                    GL.glVertex3f(self.x[x+1], self.y[y+1],
-                            self.buf[y+1][x+1].z)
-                    GL.glVertex3f(self.x[x+0], self.y[y+1],
-                            self.buf[y+1][x+0].z)
-                    GL.glEnd()
-                    GL.glEndList()
-                
-        for y in range(0, self.yres-1):
-            for x in range(0, self.xres-1):
-                self.buf[y][x].changed = False
-                GL.glCallList(self.buf[y][x].list)
+    def to_OpenGL_2(self):
+        for cell_y in range(self.num_cell_y):
+            for cell_x in range(self.num_cell_x):
+                cell = self.cell[cell_y][cell_x]
+                x0, x1, y0, y1 = self._get_cell_bounds(cell_x, cell_y)
+                if cell.quad_lists is None:
+                    cell.quad_lists = [GL.glGenLists(1)
+                            for index in range((y1 - y0 - 1) * (x1 - x0 - 1))]
+                    self.changed_cells[cell_y, cell_x] = True
+                if self.changed_cells[cell_y, cell_x]:
+                    index = 0
+                    for yi in range(y0, y1 - 1):
+                        for xi in range(x0, x1 - 1):
+                            GL.glNewList(cell.quad_lists[index],
+                                    GL.GL_COMPILE)
+                            self._draw_quads(xi, xi + 2, yi, yi + 2)
+                            GL.glEndList()
+                            index += 1
+                for quad_list in cell.quad_lists:
+                    GL.glCallList(quad_list)
+        self.changed_cells.fill(False)
 
     # use display list per cell (cell = group of quads)
     def to_OpenGL_3(self):
-        dy = self.yres/NUM_CELL_Y
-        dx = self.xres/NUM_CELL_X
-
-        for y in range(NUM_CELL_Y):
-            y0 = y * dy
-            y1 = y0 + dy + 1
-            if y1 > self.yres:
-                y1 = self.yres
-            for x in range(NUM_CELL_X):
-                x0 = x * dx
-                x1 = x0 + dx + 1
-                if x1 > self.xres:
-                    x1 = self.xres
-
-                changed = False
-
-                if self.changed:
-                    for yi in range(y0, y1):
-                        for xi in range(x0, x1):
-                            if self.buf[yi][xi].changed:
-                                changed = True
-                                break
-
-                if changed:
-                    if self.list[y][x] == -1:
-                        self.list[y][x] = GL.glGenLists(1)
-
-                    if False:
-                        GL.glNewList(self.list[y][x], GL.GL_COMPILE)
-                        for yi in range(y0, y1-1):
-                            GL.glBegin(GL.GL_TRIANGLES)
-                            for xi in range(x0, x1-1):
-                                n = self.normal(self.buf[yi+0][xi+0].z,
-                                        self.buf[yi+0][xi+1].z,
-                                        self.buf[yi+1][xi+0].z)
-                                GL.glNormal3f(n[0], n[1], n[2])
-                                GL.glVertex3f(self.x[xi+0], self.y[yi+0],
-                                        self.buf[yi+0][xi+0].z)
-                                GL.glVertex3f(self.x[xi+0], self.y[yi+1],
-                                        self.buf[yi+1][xi+0].z)
-                                GL.glVertex3f(self.x[xi+1], self.y[yi+1],
-                                        self.buf[yi+1][xi+1].z)
-                                n = self.normal(self.buf[y+1][x+1].z,
-                                        self.buf[y+0][x+1].z,
-                                        self.buf[y+1][x+0].z)
-                                GL.glNormal3f(n[0], n[1], n[2])
-                                GL.glVertex3f(self.x[xi+0], self.y[yi+0],
-                                        self.buf[yi+0][xi+0].z)
-                                GL.glVertex3f(self.x[xi+1], self.y[yi+1],
-                                        self.buf[yi+1][xi+1].z)
-                                GL.glVertex3f(self.x[xi+1], self.y[yi+0],
-                                        self.buf[yi+0][xi+1].z)
-                                self.buf[yi][xi].changed = False
-                            GL.glEnd()
-                        GL.glEndList()
-                    else:
-                        GL.glNewList(self.list[y][x], GL.GL_COMPILE)
-                        for yi in range(y0, y1-1):
-                            GL.glBegin(GL.GL_QUADS)
-                            for xi in range(x0, x1-1):
-                                n = self.normal(self.buf[yi+0][xi+0].z,
-                                        self.buf[yi+0][xi+1].z,
-                                        self.buf[yi+1][xi+0].z)
-                                GL.glNormal3f(n[0], n[1], n[2])
-                                GL.glVertex3f(self.x[xi+0], self.y[yi+0],
-                                        self.buf[yi+0][xi+0].z)
-                                GL.glVertex3f(self.x[xi+0], self.y[yi+1],
-                                        self.buf[yi+1][xi+0].z)
-                                GL.glVertex3f(self.x[xi+1], self.y[yi+1],
-                                        self.buf[yi+1][xi+1].z)
-                                GL.glVertex3f(self.x[xi+1], self.y[yi+0],
-                                        self.buf[yi+0][xi+1].z)
-                                self.buf[yi][xi].changed = False
-                            GL.glEnd()
-                        GL.glEndList()
-
-
-                GL.glCallList(self.list[y][x])
-
-    # use display list with vertex buffers per cell (cell = group of quads) 
-    def to_OpenGL_4(self):
-        num_cell_x = NUM_CELL_X
-        num_cell_y = NUM_CELL_Y
-
-        dy = self.yres / num_cell_y
-        if dy < 2:
-            num_cell_y = 1
-            dy = self.yres
-        dx = self.xres/num_cell_x
-        if dx < 2:
-            num_cell_x = 1
-            dx = self.xres
-
-        for y in range(0, num_cell_y):
-            y0 = y * dy
-            y1 = y0 + dy + 1
-            if y1 > self.yres:
-                y1 = self.yres
-            for x in range(0, num_cell_x):
-                x0 = x * dx
-                x1 = x0 + dx + 1
-                if x1 > self.xres:
-                    x1 = self.xres
-
-                changed = False
-
-                if self.changed:
-                    for yi in range(y0, y1):
-                        for xi in range(x0, x1):
-                            if self.buf[yi][xi].changed:
-                                changed = True
-                                break
-
-                if changed:
-#                    print "cell[",y,"][",x,"]=",self.cell[y][x].list
-                    if self.cell[y][x].list == -1:
-                        self.cell[y][x].list = GL.glGenLists(1)
-                        self.cell[y][x].array = (ctypes.c_float * 3 \
-                                * ((y1 - y0) * (x1 - x0) * 2))()
-
-                    GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
-                    GL.glVertexPointerf(self.cell[y][x].array)
-                    GL.glNewList(self.cell[y][x].list, GL.GL_COMPILE)
-                    idx = 0
-                    for yi in range(y0, y1-1):
-                        lineidx = idx
-                        for xi in range(x0, x1):
-                            self.buf[yi][xi].changed = False
-                            self.buf[yi+1][xi].changed = False
-                            self.cell[y][x].array[idx+0][0] = self.x[xi+0]
-                            self.cell[y][x].array[idx+0][1] = self.y[yi+0]
-                            self.cell[y][x].array[idx+0][2] = \
-                                    self.buf[yi+0][xi+0].z
-                            self.cell[y][x].array[idx+1][0] = self.x[xi+0]
-                            self.cell[y][x].array[idx+1][1] = self.y[yi+1]
-                            self.cell[y][x].array[idx+1][2] = \
-                                    self.buf[yi+1][xi+0].z
-                            idx += 2
-                        GL.glDrawArrays(GL.GL_QUAD_STRIP, lineidx,
-                                idx - lineidx + 1)
-                    GL.glEndList()
+        def build_cell(cell, x0, x1, y0, y1):
+            self._draw_quads(x0, x1, y0, y1)
+        self._render_cells(build_cell)
 
-                GL.glCallList(self.cell[y][x].list)
+    # use display list with vertex buffers per cell (cell = group of quads)
+    def to_OpenGL_4(self):
+        def build_cell(cell, x0, x1, y0, y1):
+            vertices = self._get_vertices(x0, x1, y0, y1)
+            for yi in range(y1 - y0 - 1):
+                # alternating vertices of two neighbouring rows
+                strip = numpy.empty((x1 - x0, 2, 3), dtype=numpy.float32)
+                strip[:, 0] = vertices[yi]
+                strip[:, 1] = vertices[yi + 1]
+                GL.glVertexPointerf(strip.reshape(-1, 3))
+                GL.glDrawArrays(GL.GL_QUAD_STRIP, 0, 2 * (x1 - x0))
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        self._render_cells(build_cell)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
 
     # use display list with vertex and normal buffers per cell
-    # (cell = group of quads) 
+    # (cell = group of quads)
     def to_OpenGL_5(self):
-        num_cell_x = NUM_CELL_X
-        num_cell_y = NUM_CELL_Y
-
-        dy = self.yres / num_cell_y
-        if dy < 2:
-            num_cell_y = 1
-            dy = self.yres
-        dx = self.xres / num_cell_x
-        if dx < 2:
-            num_cell_x = 1
-            dx = self.xres
-
+        def build_cell(cell, x0, x1, y0, y1):
+            vertices = self._get_vertices(x0, x1, y0, y1)
+            normals = self._get_normals(x0, x1, y0, y1)
+            # four separate vertices per quad (sharing the normal of the
+            # first one)
+            quads = numpy.empty((y1 - y0 - 1, x1 - x0 - 1, 4, 3),
+                    dtype=numpy.float32)
+            quads[:, :, 0] = vertices[:-1, :-1]
+            quads[:, :, 1] = vertices[1:, :-1]
+            quads[:, :, 2] = vertices[1:, 1:]
+            quads[:, :, 3] = vertices[:-1, 1:]
+            quad_normals = numpy.empty(quads.shape, dtype=numpy.float32)
+            quad_normals[:] = normals[:-1, :-1, numpy.newaxis]
+            GL.glVertexPointerf(quads.reshape(-1, 3))
+            GL.glNormalPointerf(quad_normals.reshape(-1, 3))
+            GL.glDrawArrays(GL.GL_QUADS, 0, 4 * quads.shape[0] \
+                    * quads.shape[1])
         GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
         GL.glEnableClientState(GL.GL_NORMAL_ARRAY)
-
-        for y in range(num_cell_y):
-            y0 = y * dy
-            y1 = y0 + dy + 1
-            if y1 > self.yres:
-                y1 = self.yres
-            for x in range(num_cell_x):
-                x0 = x * dx
-                x1 = x0 + dx + 1
-                if x1 > self.xres:
-                    x1 = self.xres
-
-                changed = False
-
-                if self.changed:
-                    for yi in range(y0, y1):
-                        for xi in range(x0, x1):
-                            if self.buf[yi][xi].changed:
-                                changed = True
-                                break
-
-                if changed:
-#                    print "cell[",y,"][",x,"]=",self.cell[y][x].list
-                    if self.cell[y][x].list == -1:
-                        self.cell[y][x].list = GL.glGenLists(1)
-                        self.cell[y][x].vertex = (ctypes.c_float * 3 \
-                                * ((y1 - y0) * (x1 - x0) * 4))()
-                        self.cell[y][x].normal = (ctypes.c_float * 3 \
-                                * ((y1 - y0) * (x1 - x0) * 4))()
-
-                    GL.glVertexPointerf(self.cell[y][x].vertex)
-                    GL.glNormalPointerf(self.cell[y][x].normal)
-                    GL.glNewList(self.cell[y][x].list, GL.GL_COMPILE)
-                    idx = 0
-                    for yi in range(y0, y1-1):
-                        lineidx = idx
-                        for xi in range(x0, x1-1):
-                            self.buf[yi][xi].changed = False
-                            self.buf[yi+1][xi].changed = False
-                            self.cell[y][x].vertex[idx+0][0] = self.x[xi+0]
-                            self.cell[y][x].vertex[idx+0][1] = self.y[yi+0]
-                            self.cell[y][x].vertex[idx+0][2] = \
-                                    self.buf[yi+0][xi+0].z
-                            self.cell[y][x].vertex[idx+1][0] = self.x[xi+0]
-                            self.cell[y][x].vertex[idx+1][1] = self.y[yi+1]
-                            self.cell[y][x].vertex[idx+1][2] = \
-                                    self.buf[yi+1][xi+0].z
-                            self.cell[y][x].vertex[idx+2][0] = self.x[xi+1]
-                            self.cell[y][x].vertex[idx+2][1] = self.y[yi+1]
-                            self.cell[y][x].vertex[idx+2][2] = \
-                                    self.buf[yi+1][xi+1].z
-                            self.cell[y][x].vertex[idx+3][0] = self.x[xi+1]
-                            self.cell[y][x].vertex[idx+3][1] = self.y[yi+0]
-                            self.cell[y][x].vertex[idx+3][2] = \
-                                    self.buf[yi+0][xi+1].z
-
-                            n = self.normal(self.buf[yi+0][xi+0].z,
-                                    self.buf[yi+0][xi+1].z,
-                                    self.buf[yi+1][xi+0].z)
-                            self.cell[y][x].normal[idx+0][0] = n[0]
-                            self.cell[y][x].normal[idx+0][1] = n[1]
-                            self.cell[y][x].normal[idx+0][2] = n[2]
-                            self.cell[y][x].normal[idx+1][0] = n[0]
-                            self.cell[y][x].normal[idx+1][1] = n[1]
-                            self.cell[y][x].normal[idx+1][2] = n[2]
-                            self.cell[y][x].normal[idx+2][0] = n[0]
-                            self.cell[y][x].normal[idx+2][1] = n[1]
-                            self.cell[y][x].normal[idx+2][2] = n[2]
-                            self.cell[y][x].normal[idx+3][0] = n[0]
-                            self.cell[y][x].normal[idx+3][1] = n[1]
-                            self.cell[y][x].normal[idx+3][2] = n[2]
-
-                            idx += 4
-                        GL.glDrawArrays(GL.GL_QUADS, lineidx, idx-lineidx+1)
-                    GL.glEndList()
-
-                GL.glCallList(self.cell[y][x].list)
-
+        self._render_cells(build_cell)
         GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
         GL.glDisableClientState(GL.GL_NORMAL_ARRAY)
 
     # use display list with vertex and normal and index buffers per cell
-    # (cell = group of quads) 
+    # (cell = group of quads)
     def to_OpenGL_6(self):
-        num_cell_x = NUM_CELL_X
-        num_cell_y = NUM_CELL_Y
-
-        dy = self.yres/num_cell_y
-        if dy < 2:
-            num_cell_y = 1
-            dy = self.yres
-        dx = self.xres/num_cell_x
-        if dx < 2:
-            num_cell_x = 1
-            dx = self.xres
-
-        GL.glEnableClientState(GL.GL_INDEX_ARRAY)
+        def build_cell(cell, x0, x1, y0, y1):
+            width = x1 - x0
+            vertices = self._get_vertices(x0, x1, y0, y1)
+            normals = self._get_normals(x0, x1, y0, y1)
+            # the vertex indices of the corners of all quads
+            corners = numpy.arange((y1 - y0 - 1) * width).reshape(-1, width)
+            corners = corners[:, :-1].reshape(-1, 1)
+            indices = numpy.hstack((corners, corners + width,
+                    corners + width + 1, corners + 1)).astype(numpy.uint16)
+            GL.glVertexPointerf(vertices.reshape(-1, 3).astype(numpy.float32))
+            GL.glNormalPointerf(normals.reshape(-1, 3).astype(numpy.float32))
+            GL.glDrawElements(GL.GL_QUADS, indices.size,
+                    GL.GL_UNSIGNED_SHORT, indices.ravel())
         GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
         GL.glEnableClientState(GL.GL_NORMAL_ARRAY)
-
-        for y in range(num_cell_y):
-            y0 = y * dy
-            y1 = y0 + dy + 1
-            if y1 > self.yres:
-                y1 = self.yres
-            for x in range(num_cell_x):
-                x0 = x * dx
-                x1 = x0 + dx + 1
-                if x1 > self.xres:
-                    x1 = self.xres
-
-                changed = False
-
-                if self.changed:
-                    for yi in range(y0, y1 - 1):
-                        for xi in range(x0, x1 - 1):
-                            if self.buf[yi][xi].changed:
-                                changed = True
-                                break
-
-                if changed:
-                    #print "cell[",y,"][",x,"]=",self.cell[y][x].list
-                    if self.cell[y][x].list == -1:
-                        self.cell[y][x].list = GL.glGenLists(1)
-                        self.cell[y][x].vertex = (ctypes.c_float * 3 \
-                                * ((y1-y0) * (x1 - x0)))()
-                        self.cell[y][x].normal = (ctypes.c_float * 3 \
-                                * ((y1-y0) * (x1 - x0)))()
-                        self.cell[y][x].index  = (ctypes.c_ushort \
-                                * (4 * (y1 - y0 - 1) * (x1 - x0 - 1)))()
-                    GL.glIndexPointers(self.cell[y][x].index)
-                    GL.glVertexPointerf(self.cell[y][x].vertex)
-                    GL.glNormalPointerf(self.cell[y][x].normal)
-
-                    GL.glNewList(self.cell[y][x].list, GL.GL_COMPILE)
-                    idx = 0
-                    for yi in range(y0, y1):
-                        for xi in range(x0, x1):
-                            self.buf[yi][xi].changed = False
-                            self.cell[y][x].vertex[idx][0] = self.x[xi]
-                            self.cell[y][x].vertex[idx][1] = self.y[yi]
-                            self.cell[y][x].vertex[idx][2] = self.buf[yi][xi].z
-
-                            if (xi==self.xres - 1) or (yi == self.yres - 1):
-                                n = self.normal(self.buf[yi-1][xi-1].z,
-                                        self.buf[yi-1][xi].z,
-                                        self.buf[yi][xi-1].z)
-                            else:
-                                n = self.normal(self.buf[yi][xi].z,
-                                        self.buf[yi][xi+1].z,
-                                        self.buf[yi+1][xi].z)
-
-                            self.cell[y][x].normal[idx][0] = n[0]
-                            self.cell[y][x].normal[idx][1] = n[1]
-                            self.cell[y][x].normal[idx][2] = n[2]
-
-                            idx += 1
-
-                    idx = 0
-                    for yi in range(y0, y1 - 1):
-                        for xi in range(x0, x1 - 1):
-                            self.cell[y][x].index[idx+0] = (yi - y0 + 0) \
-                                    * (x1 - x0) + (xi - x0 + 0)
-                            self.cell[y][x].index[idx+1] = (yi - y0 + 1) \
-                                    * (x1 - x0) + (xi - x0 + 0)
-                            self.cell[y][x].index[idx+2] = (yi - y0 + 1) \
-                                    * (x1 - x0) + (xi - x0 + 1)
-                            self.cell[y][x].index[idx+3] = (yi - y0 + 0) \
-                                    * (x1 - x0) + (xi - x0 + 1)
-                            idx += 4
-
-                    GL.glDrawElements(GL.GL_QUADS, idx, GL.GL_UNSIGNED_SHORT,
-                            self.cell[y][x].index)
-                    GL.glEndList()
-                GL.glCallList(self.cell[y][x].list)
-
+        self._render_cells(build_cell)
         GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
         GL.glDisableClientState(GL.GL_NORMAL_ARRAY)
-        GL.glDisableClientState(GL.GL_INDEX_ARRAY)
 
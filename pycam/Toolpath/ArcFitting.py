@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Replace sequences of short lines with circular arcs (xy plane).
+# A sequence of points is replaced with an arc, if all points are close to
+# the arc and if the arc does not bulge out too far between two points. Both
+# conditions use half of the tolerance - thus the arc does not deviate from
+# the original lines by more than the tolerance.
+# The longest acceptable arc starting at a point is found by doubling the
+# number of lines followed by a binary search.
+
+import math
+
+
+# minimum number of lines to be replaced by an arc
+MIN_ARC_LINES = 3
+# the maximum angle of an arc (a full circle is ambiguous)
+MAX_ARC_ANGLE = 1.9 * math.pi
+# the maximum ratio of the radius and the distance between start and end
+MAX_RADIUS_RATIO = 1000
+
+
+def get_circle_center(p1, p2, p3):
+    """ calculate the center of the circle defined by three points (xy)
+
+    @returns: the center or None (for points on a straight line)
+    """
+    ax, ay = p2[0] - p1[0], p2[1] - p1[1]
+    bx, by = p3[0] - p1[0], p3[1] - p1[1]
+    denominator = 2.0 * (ax * by - ay * bx)
+    if denominator == 0:
+        return None
+    a_sq = ax * ax + ay * ay
+    b_sq = bx * bx + by * by
+    center_x = p1[0] + (by * a_sq - ay * b_sq) / denominator
+    center_y = p1[1] + (ax * b_sq - bx * a_sq) / denominator
+    return (center_x, center_y)
+
+
+def _get_arc(points, first, last, tolerance):
+    """ check if the points between "first" and "last" can be replaced by an
+    arc
+
+    @returns: the center of the arc and the "clockwise" flag or None
+    """
+    center = get_circle_center(points[first], points[(first + last) // 2],
+            points[last])
+    if center is None:
+        return None
+    cx, cy = center
+    radius = math.hypot(points[first][0] - cx, points[first][1] - cy)
+    max_deviation = 0.5 * tolerance
+    # nearly collinear points are not worth an arc with a huge radius
+    chord = math.hypot(points[last][0] - points[first][0],
+            points[last][1] - points[first][1])
+    if radius > MAX_RADIUS_RATIO * chord:
+        return None
+    total_angle = 0
+    direction = None
+    last_angle = math.atan2(points[first][1] - cy, points[first][0] - cx)
+    for index in range(first + 1, last + 1):
+        x, y = points[index][0], points[index][1]
+        if abs(math.hypot(x - cx, y - cy) - radius) > max_deviation:
+            return None
+        angle = math.atan2(y - cy, x - cx)
+        step = angle - last_angle
+        if step > math.pi:
+            step -= 2 * math.pi
+        elif step < -math.pi:
+            step += 2 * math.pi
+        if step == 0:
+            return None
+        if direction is None:
+            direction = step > 0
+        elif direction != (step > 0):
+            return None
+        # the arc bulges out between the two points
+        half_chord = radius * abs(math.sin(step / 2))
+        if radius - math.sqrt(max(0, radius ** 2 - half_chord ** 2)) \
+                > max_deviation:
+            return None
+        total_angle += abs(step)
+        last_angle = angle
+    if total_angle > MAX_ARC_ANGLE:
+        return None
+    # counter-clockwise for increasing angles
+    return center, not direction
+
+
+def get_arc_segments(points, tolerance):
+    """ split a sequence of points (xy) into lines and arcs
+
+    @value points: the points of a path (only x and y are used)
+    @type points: list(tuple(float))
+    @value tolerance: the maximum deviation between the arcs and the
+        original lines
+    @type tolerance: float
+    @returns: the index of the end point of every line or arc as well as the
+        center and the "clockwise" flag of every arc (None for lines) -
+        starting at the first point
+    @rtype: list(tuple(int, tuple(float), bool))
+    """
+    segments = []
+    count = len(points)
+    first = 0
+    while first < count - 1:
+        arc = None
+        length = MIN_ARC_LINES
+        if first + length < count:
+            arc = _get_arc(points, first, first + length, tolerance)
+        if arc is None:
+            segments.append((first + 1, None, None))
+            first += 1
+            continue
+        # double the length of the arc until it fails
+        good_length, good_arc = length, arc
+        bad_length = None
+        while bad_length is None:
+            length = min(2 * good_length, count - 1 - first)
+            if length == good_length:
+                break
+            arc = _get_arc(points, first, first + length, tolerance)
+            if arc is None:
+                bad_length = length
+            else:
+                good_length, good_arc = length, arc
+        # binary search between the longest good and the shortest bad arc
+        while (not bad_length is None) and (bad_length - good_length > 1):
+            length = (good_length + bad_length) // 2
+            arc = _get_arc(points, first, first + length, tolerance)
+            if arc is None:
+                bad_length = length
+            else:
+                good_length, good_arc = length, arc
+        center, clockwise = good_arc
+        segments.append((first + good_length, center, clockwise))
+        first += good_length
+    return segments
+
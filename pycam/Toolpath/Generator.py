@@ -55,14 +55,16 @@ def generate_toolpath_from_settings(model, tp_settings, callback=None):
             process["material_allowance"], process["overlap_percent"],
             process["step_down"], process["engrave_offset"],
             process["milling_style"], process["pocketing_type"],
-            support_model, backend, callback)
+            support_model, backend, callback,
+            simplify_tolerance=process.get("simplify_tolerance", 0))
 
 def generate_toolpath(model, tool_settings=None,
         bounds=None, direction="x",
         path_generator="DropCutter", path_postprocessor="ZigZagCutter",
         material_allowance=0, overlap_percent=0, step_down=0, engrave_offset=0,
         milling_style="ignore", pocketing_type="none",
-        support_model=None, calculation_backend=None, callback=None):
+        support_model=None, calculation_backend=None, callback=None,
+        simplify_tolerance=0):
     """ abstract interface for generating a toolpath
 
     @type model: pycam.Geometry.Model.Model
@@ -96,6 +98,9 @@ def generate_toolpath(model, tool_settings=None,
     @type calculation_backend: str | None
     @value calculation_backend: any member of the CALCULATION_BACKENDS set
         The default is the triangular collision detection.
+    @type simplify_tolerance: float
+    @value simplify_tolerance: the maximum deviation of the simplified paths
+        (zero removes only points on a straight line)
     @rtype: pycam.Toolpath.Toolpath | str
     @return: the resulting toolpath object or an error string in case of invalid
         arguments
@@ -234,7 +239,7 @@ def generate_toolpath(model, tool_settings=None,
         return physics
     generator = _get_pathgenerator_instance(trimesh_models, contour_model,
             cutter, path_generator, path_postprocessor, physics,
-            milling_style)
+            milling_style, simplify_tolerance)
     if isinstance(generator, basestring):
         return generator
     overlap = overlap_percent / 100.0
@@ -291,15 +296,19 @@ def generate_toolpath(model, tool_settings=None,
     return toolpath
     
 def _get_pathgenerator_instance(trimesh_models, contour_model, cutter,
-        pathgenerator, pathprocessor, physics, milling_style):
+        pathgenerator, pathprocessor, physics, milling_style,
+        simplify_tolerance=0):
     if pathgenerator != "EngraveCutter" and contour_model:
         return ("The only available toolpath strategy for 2D contour models " \
                 + "is 'Engraving'.")
+    # zero falls back to the default tolerance of the path processors
+    tolerance = simplify_tolerance or None
     if pathgenerator == "DropCutter":
         if pathprocessor == "ZigZagCutter":
-            processor = PathAccumulator.PathAccumulator(zigzag=True)
+            processor = PathAccumulator.PathAccumulator(zigzag=True,
+                    tolerance=tolerance)
         elif pathprocessor == "PathAccumulator":
-            processor = PathAccumulator.PathAccumulator()
+            processor = PathAccumulator.PathAccumulator(tolerance=tolerance)
         else:
             return ("Invalid postprocessor (%s) for 'DropCutter': only " \
                     + "'ZigZagCutter' or 'PathAccumulator' are allowed") \
@@ -308,15 +317,15 @@ def _get_pathgenerator_instance(trimesh_models, contour_model, cutter,
                 physics=physics)
     elif pathgenerator == "PushCutter":
         if pathprocessor == "PathAccumulator":
-            processor = PathAccumulator.PathAccumulator()
+            processor = PathAccumulator.PathAccumulator(tolerance=tolerance)
         elif pathprocessor == "SimpleCutter":
-            processor = SimpleCutter.SimpleCutter()
+            processor = SimpleCutter.SimpleCutter(tolerance=tolerance)
         elif pathprocessor == "ZigZagCutter":
-            processor = ZigZagCutter.ZigZagCutter()
+            processor = ZigZagCutter.ZigZagCutter(tolerance=tolerance)
         elif pathprocessor == "PolygonCutter":
-            processor = PolygonCutter.PolygonCutter()
+            processor = PolygonCutter.PolygonCutter(tolerance=tolerance)
         elif pathprocessor == "ContourCutter":
-            processor = ContourCutter.ContourCutter()
+            processor = ContourCutter.ContourCutter(tolerance=tolerance)
         else:
             return ("Invalid postprocessor (%s) for 'PushCutter' - it " + \
                     "should be one of these: %s") % \
@@ -326,7 +335,7 @@ def _get_pathgenerator_instance(trimesh_models, contour_model, cutter,
     elif pathgenerator == "EngraveCutter":
         clockwise = (milling_style == "climb")
         if pathprocessor == "SimpleCutter":
-            processor = SimpleCutter.SimpleCutter()
+            processor = SimpleCutter.SimpleCutter(tolerance=tolerance)
         else:
             return ("Invalid postprocessor (%s) for 'EngraveCutter' - it " \
                     + "should be: SimpleCutter") % str(pathprocessor)
@@ -338,7 +347,8 @@ def _get_pathgenerator_instance(trimesh_models, contour_model, cutter,
     elif pathgenerator == "ContourFollow":
         reverse = (milling_style == "conventional")
         if pathprocessor == "SimpleCutter":
-            processor = SimpleCutter.SimpleCutter(reverse=reverse)
+            processor = SimpleCutter.SimpleCutter(reverse=reverse,
+                    tolerance=tolerance)
         else:
             return ("Invalid postprocessor (%s) for 'ContourFollow' - it " \
                     + "should be: SimpleCutter") % str(pathprocessor)
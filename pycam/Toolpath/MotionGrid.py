@@ -23,7 +23,7 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 from pycam.Geometry.Point import Point, Vector
 from pycam.Geometry.Line import Line
 from pycam.Geometry.utils import epsilon
-from pycam.Geometry.Polygon import PolygonSorter
+from pycam.Geometry.Polygon import PolygonSorter, get_offset_polygons
 import pycam.Utils.log
 import pycam.Geometry
 
@@ -406,21 +406,26 @@ def get_lines_grid(models, (low, high), layer_distance, line_distance=None,
     if polygons:
         low_limit_lines = min([polygon.minz for polygon in polygons])
         low[2] = max(low[2], low_limit_lines)
+    lines = []
     # calculate pockets
     if pocketing_type != POCKETING_TYPE_NONE:
         if not callback is None:
             callback(text="Generating pocketing polygons ...")
-        polygons = get_pocketing_polygons(polygons, line_distance,
+        spirals = get_pocketing_spirals(polygons, line_distance,
                 pocketing_type, callback=callback)
+        if not spirals is None:
+            # the rings of a spiral are connected - this avoids rapid moves
+            for spiral in spirals:
+                lines.extend(_get_spiral_lines(spiral, reverse=(
+                        milling_style == MILLING_STYLE_CONVENTIONAL)))
+            polygons = []
     # extract lines in correct order from all polygons
-    lines = []
     for polygon in polygons:
         if callback:
             callback()
         if polygon.is_closed and \
                 (milling_style == MILLING_STYLE_CONVENTIONAL):
-            polygon = polygon.copy()
-            polygon.reverse()
+            polygon = polygon.get_reversed()
         for line in polygon.get_lines():
             lines.append(line)
     if isiterable(layer_distance):
@@ -448,55 +453,179 @@ def get_lines_grid(models, (low, high), layer_distance, line_distance=None,
         yield get_lines_layer(lines, layers[-1], last_z=last_z,
                 step_width=step_width, milling_style=milling_style)
 
-def get_pocketing_polygons(polygons, offset, pocketing_type, callback=None):
-    pocketing_limit = 1000
-    base_polygons = []
-    other_polygons = []
+def _get_pocketing_region(polygons, pocketing_type):
+    """ collect the closed polygons describing the area to be pocketed
+
+    @returns: the contours (outer polygons are counter-clockwise) and a flag
+        indicating that the rings need to be reversed afterwards
+    @rtype: tuple(list(Polygon), bool)
+    """
+    closed_polygons = [poly for poly in polygons if poly.is_closed]
     if pocketing_type == POCKETING_TYPE_HOLES:
-        # go inwards
-        offset *= -1
-        for poly in polygons:
-            if poly.is_closed and poly.is_outer():
-                base_polygons.append(poly)
-            else:
-                other_polygons.append(poly)
-    elif pocketing_type == POCKETING_TYPE_MATERIAL:
-        for poly in polygons:
-            if poly.is_closed and not poly.is_outer():
-                base_polygons.append(poly)
-            else:
-                other_polygons.append(poly)
-    else:
-        _log.warning("Invalid pocketing type given: %d" % str(pocketing_type))
-        return polygons
-    # For now we use only the polygons that do not surround any other
-    # polygons. Sorry - the pocketing is currently very simple ...
-    base_filtered_polygons = []
-    for candidate in base_polygons:
-        if callback and callback():
-            # we were interrupted
-            return polygons
-        for other in other_polygons:
-            if candidate.is_polygon_inside(other):
+        # the area within the outer polygons (excluding the islands)
+        return closed_polygons, False
+    # The area within the holes (excluding the islands). Nested holes are
+    # handled by the top-level hole surrounding them.
+    holes = [poly for poly in closed_polygons if not poly.is_outer()]
+    contours = []
+    for hole in holes:
+        for other in holes:
+            if (not other is hole) and other.is_polygon_inside(hole):
                 break
         else:
-            base_filtered_polygons.append(candidate)
-    # start the pocketing for all remaining polygons
-    pocket_polygons = []
-    for base_polygon in base_filtered_polygons:
-        pocket_polygons.append(base_polygon)
-        current_queue = [base_polygon]
-        next_queue = []
-        pocket_depth = 0
-        while current_queue and (pocket_depth < pocketing_limit):
+            contours.append(hole.get_reversed())
+            for other in closed_polygons:
+                if (not other is hole) and hole.is_polygon_inside(other):
+                    contours.append(other.get_reversed())
+    return contours, True
+
+def _get_pocketing_steps(polygons, offset, pocketing_type, callback=None):
+    """ shrink the area to be pocketed step by step until it vanishes
+
+    All polygons of the area (including its islands) are shifted together.
+    Thus colliding rings are merged and split rings are handled properly.
+    @returns: the rings of every step (starting with the border of the area)
+        or None if the operation was interrupted
+    @rtype: list(list(Polygon))
+    """
+    contours, reverse = _get_pocketing_region(polygons, pocketing_type)
+    steps = []
+    current = get_offset_polygons(contours, 0)
+    while current:
+        if callback and callback():
+            return None
+        steps.append(current)
+        current = get_offset_polygons(current, -abs(offset),
+                callback=callback)
+        if current is None:
+            return None
+    if reverse:
+        steps = [[ring.get_reversed() for ring in rings] for rings in steps]
+    return steps
+
+def get_pocketing_polygons(polygons, offset, pocketing_type, callback=None):
+    """ calculate the rings of a concentric pocket
+
+    @value polygons: the outer polygons and holes of the model
+    @type polygons: list(Polygon)
+    @value offset: the distance between two neighbouring rings
+    @type offset: float
+    @value pocketing_type: POCKETING_TYPE_HOLES (the area within the outer
+        polygons) or POCKETING_TYPE_MATERIAL (the area within the holes)
+    @type pocketing_type: int
+    @returns: the rings of all steps - starting with the outermost rings
+        (the original polygons if the operation was interrupted)
+    @rtype: list(Polygon)
+    """
+    spirals = get_pocketing_spirals(polygons, offset, pocketing_type,
+            callback=callback)
+    if spirals is None:
+        return polygons
+    rings = []
+    for spiral in spirals:
+        rings.extend([ring for ring, start in spiral])
+    return rings
+
+def _get_nearest_ring_point(ring, point):
+    """ find the point of a closed polygon that is closest to a given point
+
+    @returns: the distance, the point and the index of the line containing
+        the point
+    @rtype: tuple(float, Point, int)
+    """
+    points = ring.get_points()
+    best = None
+    for index in range(len(points)):
+        p1 = points[index]
+        p2 = points[(index + 1) % len(points)]
+        dx, dy = p2.x - p1.x, p2.y - p1.y
+        length_sq = dx * dx + dy * dy
+        factor = ((point.x - p1.x) * dx + (point.y - p1.y) * dy) / length_sq
+        factor = min(1, max(0, factor))
+        x, y = p1.x + factor * dx, p1.y + factor * dy
+        distance = math.hypot(point.x - x, point.y - y)
+        if (best is None) or (distance < best[0]):
+            best = (distance, Point(x, y, p1.z), index)
+    return best
+
+def _get_ring_start(ring):
+    """ the middle of the longest line is a good start for an unlinked ring
+    """
+    lengths = ring.get_lengths()
+    index = lengths.index(max(lengths))
+    return ring.get_middle_of_line(index), index
+
+def get_pocketing_spirals(polygons, offset, pocketing_type, callback=None):
+    """ calculate the rings of a concentric pocket and link them to spirals
+
+    A ring is linked to a ring of the next step, if the distance between the
+    end of the first ring and the second ring does not exceed the offset.
+    Such a link never leaves the area of the first ring.
+    See 'get_pocketing_polygons' for the parameters.
+    @returns: the spirals (outermost rings first) - each spiral is a list of
+        rings and the points where they start and end (or None if the
+        operation was interrupted)
+    @rtype: list(list(tuple(Polygon, tuple(Point, int))))
+    """
+    steps = _get_pocketing_steps(polygons, offset, pocketing_type,
+            callback=callback)
+    if steps is None:
+        return None
+    max_distance = abs(offset) + 2 * epsilon
+    spirals = []
+    ends = []
+    for rings in steps:
+        next_ends = []
+        linked = [None] * len(rings)
+        for spiral in ends:
             if callback and callback():
-                return polygons
-            for poly in current_queue:
-                result = poly.get_offset_polygons(offset)
-                pocket_polygons.extend(result)
-                next_queue.extend(result)
-                pocket_depth += 1
-            current_queue = next_queue
-            next_queue = []
-    return pocket_polygons
+                return None
+            point = spiral[-1][1][0]
+            best = None
+            for index, ring in enumerate(rings):
+                if (not linked[index] is None) \
+                        or (abs(ring.minz - point.z) > epsilon) \
+                        or (ring.minx - max_distance > point.x) \
+                        or (ring.maxx + max_distance < point.x) \
+                        or (ring.miny - max_distance > point.y) \
+                        or (ring.maxy + max_distance < point.y):
+                    continue
+                distance, start, line_index = _get_nearest_ring_point(ring,
+                        point)
+                if (distance <= max_distance) \
+                        and ((best is None) or (distance < best[0])):
+                    best = (distance, index, (start, line_index))
+            if not best is None:
+                distance, index, start = best
+                linked[index] = spiral
+                spiral.append((rings[index], start))
+        for index, ring in enumerate(rings):
+            spiral = linked[index]
+            if spiral is None:
+                spiral = [(ring, _get_ring_start(ring))]
+                spirals.append(spiral)
+            next_ends.append(spiral)
+        ends = next_ends
+    return spirals
+
+def _get_spiral_lines(spiral, reverse=False):
+    """ turn a spiral into a continuous sequence of lines
+
+    @value reverse: reverse the direction of each ring
+    @type reverse: bool
+    """
+    lines = []
+    for ring, (start, index) in spiral:
+        points = ring.get_points()
+        # rotate the ring: start at the line containing the start point
+        points = points[index + 1:] + points[:index + 1]
+        if reverse:
+            points.reverse()
+        ring_points = [start] + points + [start]
+        if lines:
+            ring_points.insert(0, lines[-1].p2)
+        for p1, p2 in zip(ring_points[:-1], ring_points[1:]):
+            if p1.sub(p2).norm >= epsilon:
+                lines.append(Line(p1, p2))
+    return lines
 
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from pycam.Geometry.Point import Point
+from pycam.Geometry.Path import Path
+from pycam.Geometry.utils import epsilon
+from pycam.Toolpath.Simplify import get_simplified_mask
+
+import numpy
+
+
+# number of moves to be converted into Point objects at once
+MOVES_CHUNK_SIZE = 2 ** 12
+
+
+class PathArrays(object):
+    """ A "struct of arrays" representation of the paths of a toolpath.
+
+    The coordinates of all points of all paths are stored in three contiguous
+    arrays ("x", "y" and "z"). The start of each path is given by "offsets"
+    (the points of path i are located at offsets[i]:offsets[i+1]).
+    The flag "rapid" of a point is set if the point is approached with a
+    rapid move.
+    The limits of all points are calculated once (minx, maxx, ...). They are
+    None for a toolpath without points.
+    """
+
+    def __init__(self, x, y, z, offsets, rapid=None):
+        self.x = numpy.ascontiguousarray(x, dtype=numpy.float64).ravel()
+        self.y = numpy.ascontiguousarray(y, dtype=numpy.float64).ravel()
+        self.z = numpy.ascontiguousarray(z, dtype=numpy.float64).ravel()
+        self.offsets = numpy.asarray(offsets, dtype=numpy.int64).ravel()
+        if rapid is None:
+            self.rapid = numpy.zeros(len(self.x), dtype=numpy.bool_)
+        else:
+            self.rapid = numpy.asarray(rapid, dtype=numpy.bool_).ravel()
+        if len(self.x) > 0:
+            self.minx, self.maxx = float(self.x.min()), float(self.x.max())
+            self.miny, self.maxy = float(self.y.min()), float(self.y.max())
+            self.minz, self.maxz = float(self.z.min()), float(self.z.max())
+        else:
+            self.minx = self.maxx = self.miny = self.maxy = None
+            self.minz = self.maxz = None
+
+    @classmethod
+    def from_paths(cls, paths):
+        coords = []
+        offsets = [0]
+        for path in paths:
+            coords.extend([(p.x, p.y, p.z) for p in path.points])
+            offsets.append(len(coords))
+        coords = numpy.array(coords, dtype=numpy.float64).reshape(-1, 3)
+        return cls(coords[:, 0], coords[:, 1], coords[:, 2], offsets)
+
+    def __len__(self):
+        """ return the number of points """
+        return len(self.x)
+
+    def get_number_of_paths(self):
+        return len(self.offsets) - 1
+
+    def copy(self):
+        return self.__class__(self.x.copy(), self.y.copy(), self.z.copy(),
+                self.offsets.copy(), self.rapid.copy())
+
+    def get_paths(self):
+        """ create a list of Path objects (e.g. for code that modifies the
+        points)
+        """
+        paths = []
+        x, y, z = self.x.tolist(), self.y.tolist(), self.z.tolist()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            path = Path()
+            for index in range(start, end):
+                path.append(Point(x[index], y[index], z[index]))
+            paths.append(path)
+        return paths
+
+    def get_simplified(self, tolerance=None):
+        """ return a copy without redundant points (see
+        pycam.Toolpath.Simplify)
+        """
+        points = numpy.column_stack((self.x, self.y, self.z))
+        keep = get_simplified_mask(points, self.offsets, tolerance)
+        # the number of remaining points in front of each path
+        remaining = numpy.zeros(len(keep) + 1, dtype=numpy.int64)
+        remaining[1:] = numpy.cumsum(keep)
+        return self.__class__(self.x[keep], self.y[keep], self.z[keep],
+                remaining[self.offsets], self.rapid[keep])
+
+    def get_path_endpoints(self):
+        """ return the first and the last point as well as the minimum and
+        maximum height of all non-empty paths
+
+        @returns: the indices of the non-empty paths, the start points, the
+            end points, the minimum heights and the maximum heights
+        @rtype: tuple(numpy.array)
+        """
+        non_empty = self.offsets[1:] > self.offsets[:-1]
+        path_indices = numpy.nonzero(non_empty)[0]
+        first = self.offsets[:-1][non_empty]
+        last = self.offsets[1:][non_empty] - 1
+        points = numpy.column_stack((self.x, self.y, self.z))
+        if len(first) > 0:
+            # empty paths do not contain any points
+            lower_heights = numpy.minimum.reduceat(self.z, first)
+            upper_heights = numpy.maximum.reduceat(self.z, first)
+        else:
+            lower_heights = upper_heights = numpy.zeros(0)
+        return path_indices, points[first], points[last], lower_heights, \
+                upper_heights
+
+    def get_reordered(self, order, reverse=None):
+        """ return a copy containing the given paths in the given order
+
+        @value order: the indices of the paths
+        @type order: list(int)
+        @value reverse: the paths to be processed in reverse direction
+        @type reverse: list(bool)
+        """
+        if reverse is None:
+            reverse = [False] * len(order)
+        offsets = self.offsets.tolist()
+        indices = []
+        for path_index, flip in zip(order, reverse):
+            start, end = offsets[path_index], offsets[path_index + 1]
+            if flip:
+                indices.append(numpy.arange(end - 1, start - 1, -1))
+            else:
+                indices.append(numpy.arange(start, end))
+        new_offsets = numpy.zeros(len(order) + 1, dtype=numpy.int64)
+        new_offsets[1:] = numpy.cumsum([len(item) for item in indices])
+        if indices:
+            indices = numpy.concatenate(indices)
+        else:
+            indices = numpy.zeros(0, dtype=numpy.int64)
+        return self.__class__(self.x[indices], self.y[indices],
+                self.z[indices], new_offsets, self.rapid[indices])
+
+    def get_moves(self, safety_height, max_safe_distance):
+        """ calculate all moves of the toolpath including the moves to and
+        from the safety height (see Toolpath.get_moves for the rules)
+
+        @rtype: MoveArrays
+        """
+        lengths = numpy.diff(self.offsets)
+        non_empty = lengths > 0
+        starts = self.offsets[:-1][non_empty]
+        ends = self.offsets[1:][non_empty] - 1
+        if len(starts) == 0:
+            return MoveArrays(numpy.zeros((0, 3)),
+                    numpy.zeros(0, dtype=numpy.bool_))
+        points = numpy.column_stack((self.x, self.y, self.z))
+        # the connection between the last and the next path
+        last = points[ends[:-1]]
+        following = points[starts[1:]]
+        diff = following - last
+        distances = numpy.sqrt((diff ** 2).sum(axis=1))
+        connect_via_safety = ((numpy.abs(diff[:, 0]) > epsilon) \
+                    | (numpy.abs(diff[:, 1]) > epsilon)) \
+                & ((numpy.abs(diff[:, 2]) > epsilon) \
+                    | (distances > max_safe_distance + epsilon))
+        # number of additional safety moves in front of every path
+        extra_moves = numpy.empty(len(starts), dtype=numpy.int64)
+        extra_moves[0] = 1
+        extra_moves[1:] = numpy.where(connect_via_safety, 2, 0)
+        extra_before = numpy.cumsum(extra_moves)
+        count = len(self) + extra_before[-1] + 1
+        positions = numpy.empty((count, 3))
+        rapids = numpy.ones(count, dtype=numpy.bool_)
+        # copy the points of all paths
+        targets = numpy.arange(len(self)) \
+                + numpy.repeat(extra_before, lengths[non_empty])
+        positions[targets] = points
+        rapids[targets] = self.rapid
+        # safety moves: first move, connections and the final move
+        positions[0, 0:2] = points[starts[0], 0:2]
+        positions[-1, 0:2] = points[ends[-1], 0:2]
+        connections = numpy.nonzero(connect_via_safety)[0]
+        path_targets = targets[starts[1:][connections]]
+        positions[path_targets - 2, 0:2] = last[connections, 0:2]
+        positions[path_targets - 1, 0:2] = following[connections, 0:2]
+        safety_moves = numpy.ones(count, dtype=numpy.bool_)
+        safety_moves[targets] = False
+        positions[safety_moves, 2] = safety_height
+        return MoveArrays(positions, rapids)
+
+
+class MoveArrays(object):
+    """ A sequence of moves (compatible with the list of (location, rapid)
+    tuples) based on an array of positions and an array of rapid flags.
+    The Point objects are created on demand.
+    """
+
+    def __init__(self, positions, rapid):
+        self.positions = positions
+        self.rapid = rapid
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.__class__(self.positions[index], self.rapid[index])
+        x, y, z = self.positions[index].tolist()
+        return Point(x, y, z), bool(self.rapid[index])
+
+    def __iter__(self):
+        for start in range(0, len(self), MOVES_CHUNK_SIZE):
+            end = start + MOVES_CHUNK_SIZE
+            for (x, y, z), rapid in zip(self.positions[start:end].tolist(),
+                    self.rapid[start:end].tolist()):
+                yield Point(x, y, z), rapid
+
+    def get_distances(self):
+        """ return the length of every move (the first move has zero length)
+        """
+        distances = numpy.zeros(len(self))
+        if len(self) > 1:
+            diff = self.positions[1:] - self.positions[:-1]
+            distances[1:] = numpy.sqrt((diff ** 2).sum(axis=1))
+        return distances
+
+    def get_truncated(self, max_movement):
+        """ return the moves up to the given distance (the last move is
+        shortened accordingly)
+        """
+        moved = numpy.cumsum(self.get_distances())
+        # the first move (with unknown start position) is always included
+        exceeding = numpy.nonzero(moved[1:] > max_movement)[0]
+        if len(exceeding) == 0:
+            return self
+        index = exceeding[0] + 1
+        last_pos = self.positions[index - 1]
+        partial = (max_movement - moved[index - 1]) \
+                / (moved[index] - moved[index - 1])
+        positions = numpy.vstack((self.positions[:index], last_pos \
+                + (self.positions[index] - last_pos) * partial))
+        return self.__class__(positions, self.rapid[:index + 1].copy())
+
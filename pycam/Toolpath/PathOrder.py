@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Reduce the length of the rapid moves between the paths of a toolpath.
+# The paths are ordered by a nearest neighbour search (based on a grid of
+# path endpoints). Afterwards the order is improved (2-opt and moving single
+# paths) until the given time budget is used up.
+# The cost of a connection is the straight distance between the end of a path
+# and the start of the next path.
+
+from pycam.Geometry.utils import epsilon
+
+import math
+import time
+
+import numpy
+
+
+# the minimum gain of an improvement step (avoids endless loops due to
+# rounding errors)
+MIN_GAIN = 1e-9
+# the minimum size of a grid cell
+MIN_CELL_SIZE = 1e-6
+
+
+def _get_distances(points1, points2):
+    return numpy.sqrt(((points1 - points2) ** 2).sum(axis=-1))
+
+
+class EndpointGrid(object):
+    """ A spatial index for nearest neighbour searches. The locations are
+    sorted into the cells of a regular grid (xy plane). Entries can be
+    removed.
+    """
+
+    def __init__(self, locations):
+        self.locations = numpy.asarray(locations, dtype=numpy.float64)
+        low = self.locations[:, :2].min(axis=0)
+        high = self.locations[:, :2].max(axis=0)
+        width, height = (high - low).tolist()
+        # About one location per cell. Locations along a line (e.g. a zero
+        # height) would produce a huge number of tiny cells otherwise.
+        count = len(self.locations)
+        self.cell_size = max(math.sqrt(width * height / count),
+                max(width, height) / count, MIN_CELL_SIZE)
+        self.low = low
+        self.count_x = int(width / self.cell_size) + 1
+        self.count_y = int(height / self.cell_size) + 1
+        self.cells = {}
+        cell_indices = numpy.floor((self.locations[:, :2] - low) \
+                / self.cell_size).astype(numpy.int64).tolist()
+        for index, cell in enumerate(cell_indices):
+            self.cells.setdefault(tuple(cell), []).append(index)
+        self.cell_of_entry = [tuple(cell) for cell in cell_indices]
+        self.count = len(self.locations)
+
+    def remove(self, index):
+        self.cells[self.cell_of_entry[index]].remove(index)
+        self.count -= 1
+
+    def _get_ring(self, center_x, center_y, radius):
+        """ return the cells with the given distance from the center cell
+        (within the limits of the grid)
+        """
+        if radius == 0:
+            return [(center_x, center_y)]
+        cells = []
+        for x in range(max(0, center_x - radius),
+                min(self.count_x, center_x + radius + 1)):
+            cells.append((x, center_y - radius))
+            cells.append((x, center_y + radius))
+        for y in range(max(0, center_y - radius + 1),
+                min(self.count_y, center_y + radius)):
+            cells.append((center_x - radius, y))
+            cells.append((center_x + radius, y))
+        return cells
+
+    def get_nearest(self, location):
+        """ return the index of the nearest remaining location (or None) """
+        if self.count == 0:
+            return None
+        x, y, z = location
+        center_x = int(math.floor((x - self.low[0]) / self.cell_size))
+        center_y = int(math.floor((y - self.low[1]) / self.cell_size))
+        # the ring distance required for covering the complete grid
+        max_radius = max(abs(center_x), abs(center_x - self.count_x),
+                abs(center_y), abs(center_y - self.count_y))
+        best = None
+        best_distance = None
+        # Skip the rings outside of the grid - they contain no locations.
+        # This is important for locations far away from the grid.
+        radius = max(0, -center_x, center_x - (self.count_x - 1),
+                -center_y, center_y - (self.count_y - 1))
+        while radius <= max_radius:
+            for cell in self._get_ring(center_x, center_y, radius):
+                for index in self.cells.get(cell, ()):
+                    other = self.locations[index]
+                    distance = math.sqrt((other[0] - x) ** 2 \
+                            + (other[1] - y) ** 2 + (other[2] - z) ** 2)
+                    if (best is None) or (distance < best_distance):
+                        best = index
+                        best_distance = distance
+            # all locations outside of the ring are farther away
+            if (not best is None) and \
+                    (best_distance <= radius * self.cell_size):
+                break
+            radius += 1
+        return best
+
+
+class PathSequence(object):
+    """ The order and direction of a sequence of paths starting at a given
+    origin. Index 0 of the arrays represents the origin.
+    """
+
+    def __init__(self, origin, starts, ends, order, flipped):
+        count = len(order) + 1
+        self.starts = numpy.empty((count, 3))
+        self.ends = numpy.empty((count, 3))
+        self.starts[0] = origin
+        self.ends[0] = origin
+        self.order = numpy.array(order, dtype=numpy.int64)
+        self.flipped = numpy.array(flipped, dtype=numpy.bool_)
+        self.starts[1:] = numpy.where(self.flipped[:, numpy.newaxis],
+                ends[self.order], starts[self.order])
+        self.ends[1:] = numpy.where(self.flipped[:, numpy.newaxis],
+                starts[self.order], ends[self.order])
+
+    def get_length(self):
+        return _get_distances(self.ends[:-1], self.starts[1:]).sum()
+
+    def _get_connections(self):
+        """ return the lengths of all connections (the last one is zero) """
+        connections = numpy.zeros(len(self.starts))
+        connections[:-1] = _get_distances(self.ends[:-1], self.starts[1:])
+        return connections
+
+    def improve_by_reversal(self, first):
+        """ reverse a sub-sequence of paths starting after position "first"
+        (2-opt) if this reduces the length of the connections
+
+        @returns: True if the sequence was changed
+        """
+        count = len(self.starts)
+        if first >= count - 1:
+            return False
+        connections = self._get_connections()
+        current_end = self.ends[first]
+        # the sub-sequence ranges from "first + 1" to "last"
+        lasts = numpy.arange(first + 1, count)
+        following_starts = numpy.empty((len(lasts), 3))
+        following_starts[:-1] = self.starts[first + 2:]
+        # the last path has no following path (see below)
+        following_starts[-1] = self.ends[-1]
+        gains = connections[first] + connections[lasts] \
+                - _get_distances(current_end, self.ends[lasts]) \
+                - _get_distances(self.starts[first + 1], following_starts)
+        # there is no connection after the last path of the sequence
+        gains[-1] = connections[first] \
+                - _get_distances(current_end, self.ends[-1])
+        best = gains.argmax()
+        if gains[best] <= MIN_GAIN:
+            return False
+        last = lasts[best]
+        segment = slice(first + 1, last + 1)
+        reversed_segment = slice(last, first, -1)
+        self.starts[segment], self.ends[segment] = \
+                self.ends[reversed_segment].copy(), \
+                self.starts[reversed_segment].copy()
+        # "order" and "flipped" do not contain the origin
+        self.order[first:last] = self.order[first:last][::-1].copy()
+        self.flipped[first:last] = numpy.logical_not(
+                self.flipped[first:last][::-1])
+        return True
+
+    def improve_by_moving(self, position):
+        """ move the path at the given position to a better place (without
+        changing its direction)
+
+        @returns: True if the sequence was changed
+        """
+        count = len(self.starts)
+        if (position < 1) or (position >= count):
+            return False
+        connections = self._get_connections()
+        start, end = self.starts[position], self.ends[position]
+        if position < count - 1:
+            removal_gain = connections[position - 1] + connections[position] \
+                    - _get_distances(self.ends[position - 1],
+                            self.starts[position + 1])
+        else:
+            removal_gain = connections[position - 1]
+        # insert the path after one of the other paths (the connection to the
+        # following path is replaced)
+        following_starts = numpy.empty((count, 3))
+        following_starts[:-1] = self.starts[1:]
+        # the last path has no following path (see below)
+        following_starts[-1] = self.ends[-1]
+        costs = _get_distances(self.ends, start) \
+                + _get_distances(end, following_starts) - connections
+        costs[-1] = _get_distances(self.ends[-1], start)
+        # the current location of the path is no option
+        costs[position - 1] = numpy.inf
+        costs[position] = numpy.inf
+        target = costs.argmin()
+        if removal_gain - costs[target] <= MIN_GAIN:
+            return False
+        indices = numpy.arange(count)
+        if target < position:
+            indices = numpy.concatenate((indices[:target + 1], [position],
+                    indices[target + 1:position], indices[position + 1:]))
+        else:
+            indices = numpy.concatenate((indices[:position],
+                    indices[position + 1:target + 1], [position],
+                    indices[target + 1:]))
+        self.starts = self.starts[indices]
+        self.ends = self.ends[indices]
+        self.order = self.order[indices[1:] - 1]
+        self.flipped = self.flipped[indices[1:] - 1]
+        return True
+
+
+def _get_trivial_path_order(starts, ends, origin, allow_reverse):
+    """ nearest neighbour ordering of a few paths (without a spatial index)
+    """
+    remaining = range(len(starts))
+    order = []
+    flipped = []
+    current = numpy.asarray(origin, dtype=numpy.float64)
+    while remaining:
+        candidates = [(_get_distances(current, starts[index]), index, False)
+                for index in remaining]
+        if allow_reverse:
+            candidates.extend([(_get_distances(current, ends[index]), index,
+                    True) for index in remaining])
+        distance, index, flip = min(candidates)
+        remaining.remove(index)
+        order.append(index)
+        flipped.append(flip)
+        if flip:
+            current = starts[index]
+        else:
+            current = ends[index]
+    return order, flipped
+
+
+def get_path_order(starts, ends, origin, allow_reverse=False,
+        time_budget=None, callback=None):
+    """ calculate an order of the paths with short connections
+
+    @value starts: the first point of every path
+    @type starts: numpy.array with shape (n, 3)
+    @value ends: the last point of every path
+    @type ends: numpy.array with shape (n, 3)
+    @value origin: the location of the tool before the first path
+    @type origin: tuple(float)
+    @value allow_reverse: the paths may be processed in reverse direction
+        (this changes the milling style)
+    @type allow_reverse: bool
+    @value time_budget: the maximum duration of the improvement steps (in
+        seconds) following the nearest neighbour ordering (None: no limit)
+    @type time_budget: float
+    @value callback: a function for progress updates - returning True
+        cancels the improvement steps
+    @returns: the indices of the paths and a list of "reverse" flags
+    @rtype: tuple(list(int), list(bool))
+    """
+    start_time = time.time()
+    starts = numpy.asarray(starts, dtype=numpy.float64).reshape(-1, 3)
+    ends = numpy.asarray(ends, dtype=numpy.float64).reshape(-1, 3)
+    count = len(starts)
+    if count == 0:
+        return [], []
+    if count < 3:
+        # no spatial index and no improvement is necessary
+        return _get_trivial_path_order(starts, ends, origin, allow_reverse)
+    if allow_reverse:
+        grid = EndpointGrid(numpy.vstack((starts, ends)))
+    else:
+        grid = EndpointGrid(starts)
+    order = []
+    flipped = []
+    current = tuple(origin)
+    while len(order) < count:
+        index = grid.get_nearest(current)
+        path_index = index % count
+        flip = index >= count
+        grid.remove(path_index)
+        if allow_reverse:
+            grid.remove(path_index + count)
+        order.append(path_index)
+        flipped.append(flip)
+        if flip:
+            current = tuple(starts[path_index])
+        else:
+            current = tuple(ends[path_index])
+    sequence = PathSequence(origin, starts, ends, order, flipped)
+    changed = True
+    while changed:
+        changed = False
+        for position in range(len(sequence.starts)):
+            if (not time_budget is None) and \
+                    (time.time() - start_time > time_budget):
+                changed = False
+                break
+            if callback and callback():
+                changed = False
+                break
+            if allow_reverse and sequence.improve_by_reversal(position):
+                changed = True
+            if sequence.improve_by_moving(position):
+                changed = True
+    return sequence.order.tolist(), sequence.flipped.tolist()
+
+
+def get_layers(lower_heights, upper_heights):
+    """ split a sequence of paths into layers
+
+    Subsequent paths with the same constant height form a layer. Subsequent
+    paths with varying heights (e.g. the lines of a surface) are combined
+    into one layer, too.
+
+    @value lower_heights: the minimum height of every path
+    @type lower_heights: list(float)
+    @value upper_heights: the maximum height of every path
+    @type upper_heights: list(float)
+    @returns: the indices of the paths of every layer
+    @rtype: list(list(int))
+    """
+    layers = []
+    last_key = None
+    for index, (low, high) in enumerate(zip(lower_heights, upper_heights)):
+        if high - low > epsilon:
+            key = None
+        else:
+            key = low
+        if layers and (((key is None) and (last_key is None)) \
+                or ((not key is None) and (not last_key is None) \
+                    and (abs(key - last_key) <= epsilon))):
+            layers[-1].append(index)
+        else:
+            layers.append([index])
+        last_key = key
+    return layers
+
+
+def get_layered_path_order(starts, ends, lower_heights, upper_heights,
+        allow_reverse=False, time_budget=None, callback=None):
+    """ calculate an order of the paths with short connections - the paths
+    are reordered only within their layer (see "get_layers")
+
+    The first path of the sequence defines the starting point. The time
+    budget is distributed among the layers according to their number of
+    paths.
+    See "get_path_order" for the parameters.
+    """
+    start_time = time.time()
+    starts = numpy.asarray(starts, dtype=numpy.float64).reshape(-1, 3)
+    ends = numpy.asarray(ends, dtype=numpy.float64).reshape(-1, 3)
+    order = []
+    flipped = []
+    if len(starts) == 0:
+        return order, flipped
+    origin = tuple(starts[0])
+    remaining = len(starts)
+    for layer in get_layers(lower_heights, upper_heights):
+        if time_budget is None:
+            layer_budget = None
+        else:
+            layer_budget = max(0, time_budget - (time.time() - start_time)) \
+                    * len(layer) / remaining
+        layer_order, layer_flipped = get_path_order(starts[layer],
+                ends[layer], origin, allow_reverse=allow_reverse,
+                time_budget=layer_budget, callback=callback)
+        order.extend([layer[index] for index in layer_order])
+        flipped.extend(layer_flipped)
+        if flipped[-1]:
+            origin = tuple(starts[order[-1]])
+        else:
+            origin = tuple(ends[order[-1]])
+        remaining -= len(layer)
+    return order, flipped
+
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+$Id$
+
+Copyright 2012 Lars Kruse <devel@sumpfralle.de>
+
+This file is part of PyCAM.
+
+PyCAM is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+PyCAM is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Simplification of toolpaths
+# A point of a path is removed, if the straight line between the remaining
+# neighbouring points does not deviate from it by more than the given
+# tolerance. The default tolerance (epsilon) removes only points located on a
+# straight line.
+# Starting at a kept point, the following kept point is found by testing
+# chords of exponentially growing length and narrowing down the first failing
+# one by bisection. A chord spanning m points is checked in O(m). Thus the
+# complete path is simplified in O(n log n), regardless of its shape.
+
+from pycam.Geometry.utils import epsilon
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# chords spanning fewer points are checked without numpy (less overhead)
+NUMPY_MIN_POINTS = 32
+
+
+def _is_within_tolerance(coords, points, first, last, tolerance):
+    """ check if all points between "first" and "last" are close to the
+    straight line connecting both
+
+    "points" is a numpy array of "coords" or None.
+    """
+    if (points is None) or (last - first < NUMPY_MIN_POINTS):
+        sx, sy, sz = coords[first]
+        vx, vy, vz = [value - origin
+                for value, origin in zip(coords[last], (sx, sy, sz))]
+        length_sq = float(vx * vx + vy * vy + vz * vz)
+        tolerance_sq = tolerance * tolerance
+        for index in range(first + 1, last):
+            x, y, z = coords[index]
+            wx, wy, wz = x - sx, y - sy, z - sz
+            if length_sq > 0:
+                factor = min(1, max(0,
+                        (wx * vx + wy * vy + wz * vz) / length_sq))
+                wx, wy, wz = wx - factor * vx, wy - factor * vy, \
+                        wz - factor * vz
+            if wx * wx + wy * wy + wz * wz > tolerance_sq:
+                return False
+        return True
+    start = points[first]
+    vector = points[last] - start
+    offsets = points[first + 1:last] - start
+    length_sq = vector.dot(vector)
+    if length_sq > 0:
+        factors = numpy.clip(offsets.dot(vector) / length_sq, 0, 1)
+        offsets = offsets - factors[:, numpy.newaxis] * vector
+    return ((offsets ** 2).sum(axis=1) <= tolerance * tolerance).all()
+
+
+def _get_kept_indices(coords, points, first, last, tolerance):
+    """ return the indices of the points between "first" and "last"
+    (including both), that need to be kept
+    """
+    result = [first]
+    anchor = first
+    while anchor < last:
+        # "good": the end of the longest valid chord found so far
+        # "bad": the end of a chord deviating too much
+        good = anchor + 1
+        bad = None
+        span = 2
+        while good < last:
+            end = min(anchor + span, last)
+            if _is_within_tolerance(coords, points, anchor, end, tolerance):
+                good = end
+                span *= 2
+            else:
+                bad = end
+                break
+        if not bad is None:
+            while bad - good > 1:
+                middle = (good + bad) // 2
+                if _is_within_tolerance(coords, points, anchor, middle,
+                        tolerance):
+                    good = middle
+                else:
+                    bad = middle
+        result.append(good)
+        anchor = good
+    return result
+
+
+def get_simplified_indices(coords, tolerance=None):
+    """ return the indices of the points of a path, that need to be kept
+
+    @value coords: the points of a path
+    @type coords: list(tuple(float))
+    @value tolerance: the maximum deviation of the simplified path
+    @type tolerance: float
+    @rtype: list(int)
+    """
+    if tolerance is None:
+        tolerance = epsilon
+    if len(coords) < 3:
+        return range(len(coords))
+    if (numpy is None) or (len(coords) < NUMPY_MIN_POINTS):
+        points = None
+    else:
+        points = numpy.array(coords, dtype=numpy.float64).reshape(-1, 3)
+    return _get_kept_indices(coords, points, 0, len(coords) - 1, tolerance)
+
+
+def get_simplified_mask(points, offsets, tolerance=None):
+    """ simplification of multiple paths (requires numpy)
+
+    @value points: the points of all paths
+    @type points: numpy.array with shape (n, 3)
+    @value offsets: the index of the first point of each path followed by the
+        number of points (see pycam.Toolpath.PathArrays)
+    @type offsets: list(int) | numpy.array
+    @value tolerance: the maximum deviation of the simplified paths
+    @type tolerance: float
+    @returns: a boolean mask of the points to be kept
+    @rtype: numpy.array
+    """
+    if tolerance is None:
+        tolerance = epsilon
+    points = numpy.asarray(points, dtype=numpy.float64)
+    coords = points.tolist()
+    offsets = [int(offset) for offset in offsets]
+    keep = numpy.zeros(len(points), dtype=numpy.bool_)
+    for first, end in zip(offsets[:-1], offsets[1:]):
+        if end - first < 3:
+            keep[first:end] = True
+        else:
+            keep[_get_kept_indices(coords, points, first, end - 1,
+                    tolerance)] = True
+    return keep
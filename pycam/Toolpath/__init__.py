@@ -22,45 +22,58 @@ along with PyCAM.  If not, see <http://www.gnu.org/licenses/>.
 
 __all__ = ["simplify_toolpath", "ToolpathList", "Toolpath", "Generator"]
 
-from pycam.Geometry.Point import Point
+from pycam.Geometry.Point import Point, get_hash_key, get_hash_keys_near
 from pycam.Geometry.Path import Path
 from pycam.Geometry.Line import Line
 from pycam.Geometry.utils import number, epsilon
+from pycam.Geometry.TriangleArrays import is_numpy_available
+from pycam.Toolpath.Simplify import get_simplified_indices
 import pycam.Utils.log
 import random
 import os
 
-log = pycam.Utils.log.get_logger()
+if is_numpy_available():
+    from pycam.Toolpath.PathArrays import PathArrays
+    from pycam.Toolpath.PathOrder import get_layered_path_order
+else:
+    PathArrays = None
+    get_layered_path_order = None
 
+# the default duration of the path order optimization (in seconds)
+PATH_ORDER_TIME_BUDGET = 5
 
-def _check_colinearity(p1, p2, p3):
-    v1 = p2.sub(p1).normalized()
-    v2 = p3.sub(p2).normalized()
-    # compare if the normalized distances between p1-p2 and p2-p3 are equal
-    return v1 == v2
+log = pycam.Utils.log.get_logger()
 
 
-def simplify_toolpath(path):
-    """ remove multiple points in a line from a toolpath
+def simplify_toolpath(path, tolerance=None):
+    """ remove redundant points from a toolpath
 
     If A, B, C and D are on a straight line, then B and C will be removed.
+    Points deviating less than "tolerance" from the simplified path are
+    removed, as well.
     This reduces memory consumption and avoids a severe slow-down of the machine
     when moving along very small steps.
     The toolpath is simplified _in_place_.
     @value path: a single separate segment of a toolpath
     @type path: pycam.Geometry.Path.Path
+    @value tolerance: the maximum deviation of the simplified path (default:
+        remove only points on a straight line)
+    @type tolerance: float
     """
-    index = 1
     points = path.points
-    while index < len(points) - 1:
-        if _check_colinearity(points[index-1], points[index], points[index+1]):
-            points.pop(index)
-            # don't increase the counter - otherwise we skip one point
-        else:
-            index += 1
+    if len(points) < 3:
+        return
+    keep = get_simplified_indices([(p.x, p.y, p.z) for p in points],
+            tolerance=tolerance)
+    if len(keep) < len(points):
+        points[:] = [points[index] for index in keep]
 
 
 class Toolpath(object):
+    """ The paths of a toolpath are stored in columnar arrays (see
+    pycam.Toolpath.PathArrays) if numpy is available. Otherwise a list of
+    Path objects is used.
+    """
 
     def __init__(self, paths, parameters=None):
         self.paths = paths
@@ -70,10 +83,47 @@ class Toolpath(object):
         self._max_safe_distance = 2 * parameters.get("tool_radius", 0)
         self._feedrate = parameters.get("tool_feedrate", 300)
 
+    def _get_paths(self):
+        if self.is_columnar():
+            # the Path objects are created on demand
+            return self._paths.get_paths()
+        else:
+            return self._paths
+
+    def _set_paths(self, paths):
+        if (not PathArrays is None) and not isinstance(paths, PathArrays):
+            paths = PathArrays.from_paths(paths)
+        self._paths = paths
+        self.reset_cache()
+
+    paths = property(_get_paths, _set_paths)
+
+    def reset_cache(self):
+        """ discard the cached bounds and move statistics
+
+        This is necessary after modifying the paths in place.
+        """
+        self._bounds = None
+        self._move_statistics = {}
+
+    def is_columnar(self):
+        return (not PathArrays is None) and isinstance(self._paths, PathArrays)
+
+    def get_path_arrays(self):
+        """ return the columnar representation of the paths (or None if
+        numpy is not available)
+        """
+        if self.is_columnar():
+            return self._paths
+        else:
+            return None
+
     def get_params(self):
         return dict(self.parameters)
 
     def copy(self):
+        if self.is_columnar():
+            return Toolpath(self._paths.copy(), parameters=self.get_params())
         new_paths = []
         for path in self.paths:
             new_path = Path()
@@ -82,36 +132,82 @@ class Toolpath(object):
             new_paths.append(new_path)
         return Toolpath(new_paths, parameters=self.get_params())
 
-    def _get_limit_generic(self, attr, func):
-        path_min = []
-        for path in self.paths:
-            if path.points:
-                path_min.append(func([getattr(p, attr) for p in path.points]))
-        return func(path_min)
+    def _get_bounds(self):
+        """ calculate the limits of all points of all paths in a single pass
+
+        @returns: (minx, miny, minz), (maxx, maxy, maxz) or None for an empty
+            toolpath
+        """
+        if self.is_columnar():
+            # the limits are known since the arrays were built
+            arrays = self._paths
+            if len(arrays) == 0:
+                return None
+            return ((arrays.minx, arrays.miny, arrays.minz),
+                    (arrays.maxx, arrays.maxy, arrays.maxz))
+        if self._bounds is None:
+            minx = miny = minz = maxx = maxy = maxz = None
+            for path in self.paths:
+                for p in path.points:
+                    if minx is None:
+                        minx = maxx = p.x
+                        miny = maxy = p.y
+                        minz = maxz = p.z
+                        continue
+                    if p.x < minx:
+                        minx = p.x
+                    elif p.x > maxx:
+                        maxx = p.x
+                    if p.y < miny:
+                        miny = p.y
+                    elif p.y > maxy:
+                        maxy = p.y
+                    if p.z < minz:
+                        minz = p.z
+                    elif p.z > maxz:
+                        maxz = p.z
+            if minx is None:
+                # use an empty tuple for non-existing limits
+                self._bounds = ()
+            else:
+                self._bounds = ((minx, miny, minz), (maxx, maxy, maxz))
+        if self._bounds:
+            return self._bounds
+        else:
+            return None
+
+    def _get_limit_generic(self, index, is_max):
+        bounds = self._get_bounds()
+        if bounds is None:
+            return None
+        elif is_max:
+            return bounds[1][index]
+        else:
+            return bounds[0][index]
 
     @property
     def minx(self):
-        return self._get_limit_generic("x", min)
+        return self._get_limit_generic(0, False)
 
     @property
     def maxx(self):
-        return self._get_limit_generic("x", max)
+        return self._get_limit_generic(0, True)
 
     @property
     def miny(self):
-        return self._get_limit_generic("y", min)
+        return self._get_limit_generic(1, False)
 
     @property
     def maxy(self):
-        return self._get_limit_generic("y", max)
+        return self._get_limit_generic(1, True)
 
     @property
     def minz(self):
-        return self._get_limit_generic("z", min)
+        return self._get_limit_generic(2, False)
 
     @property
     def maxz(self):
-        return self._get_limit_generic("z", max)
+        return self._get_limit_generic(2, True)
 
     def get_meta_data(self):
         meta = self.toolpath_settings.get_string()
@@ -119,44 +215,11 @@ class Toolpath(object):
         end_marker = self.toolpath_settings.META_MARKER_END
         return os.linesep.join((start_marker, meta, end_marker))
 
-    def get_moves(self, safety_height, max_movement=None):
-        class MoveContainer(object):
-            def __init__(self, max_movement):
-                self.max_movement = max_movement
-                self.moved_distance = 0
-                self.moves = []
-                self.last_pos = None
-                if max_movement is None:
-                    self.append = self.append_without_movement_limit
-                else:
-                    self.append = self.append_with_movement_limit
-            def append_with_movement_limit(self, new_position, rapid):
-                if self.last_pos is None:
-                    # first move with unknown start position - ignore it
-                    self.moves.append((new_position, rapid))
-                    self.last_pos = new_position
-                    return True
-                else:
-                    distance = new_position.sub(self.last_pos).norm
-                    if self.moved_distance + distance > self.max_movement:
-                        partial = (self.max_movement - self.moved_distance) / \
-                                distance
-                        partial_dest = self.last_pos.add(new_position.sub(
-                                self.last_pos).mul(partial))
-                        self.moves.append((partial_dest, rapid))
-                        self.last_pos = partial_dest
-                        # we are finished
-                        return False
-                    else:
-                        self.moves.append((new_position, rapid))
-                        self.moved_distance += distance
-                        self.last_pos = new_position
-                        return True
-            def append_without_movement_limit(self, new_position, rapid):
-                self.moves.append((new_position, rapid))
-                return True
+    def _iter_all_moves(self, safety_height):
+        """ generate all moves of the toolpath (including the moves to and from
+        the safety height)
+        """
         p_last = None
-        result = MoveContainer(max_movement)
         for path in self.paths:
             if not path:
                 # ignore empty paths
@@ -164,8 +227,7 @@ class Toolpath(object):
             p_next = path.points[0]
             if p_last is None:
                 p_last = Point(p_next.x, p_next.y, safety_height)
-                if not result.append(p_last, True):
-                    return result.moves
+                yield p_last, True
             if ((abs(p_last.x - p_next.x) > epsilon) \
                     or (abs(p_last.y - p_next.y) > epsilon)):
                 # Draw the connection between the last and the next path.
@@ -176,20 +238,124 @@ class Toolpath(object):
                     # The distance between these two points is too far.
                     # This condition helps to prevent moves up/down for
                     # adjacent lines.
-                    safety_last = Point(p_last.x, p_last.y, safety_height)
-                    safety_next = Point(p_next.x, p_next.y, safety_height)
-                    if not result.append(safety_last, True):
-                        return result.moves
-                    if not result.append(safety_next, True):
-                        return result.moves
+                    yield Point(p_last.x, p_last.y, safety_height), True
+                    yield Point(p_next.x, p_next.y, safety_height), True
             for p in path.points:
-                if not result.append(p, False):
-                    return result.moves
+                yield p, False
             p_last = path.points[-1]
         if not p_last is None:
-            p_last_safety = Point(p_last.x, p_last.y, safety_height)
-            result.append(p_last_safety, True)
-        return result.moves
+            yield Point(p_last.x, p_last.y, safety_height), True
+
+    def iter_moves(self, safety_height, max_movement=None):
+        """ return the moves of the toolpath one by one
+
+        This is the preferred way of processing the moves of huge toolpaths,
+        since no list of all moves is kept in memory. Columnar toolpaths
+        return their compact move arrays (see "get_moves").
+
+        @value safety_height: the safety height configured for this toolpath
+        @type safety_height: float
+        @value max_movement: stop after the given distance (the last move is
+            shortened accordingly)
+        @type max_movement: float
+        @returns: tuples of (location, rapid)
+        @rtype: iterable((Point, bool))
+        """
+        if self.is_columnar():
+            return self.get_moves(safety_height, max_movement=max_movement)
+        else:
+            return self._iter_moves(safety_height, max_movement)
+
+    def _iter_moves(self, safety_height, max_movement):
+        moves = self._iter_all_moves(safety_height)
+        if max_movement is None:
+            for move in moves:
+                yield move
+            return
+        moved_distance = 0
+        last_pos = None
+        for new_position, rapid in moves:
+            if last_pos is None:
+                # first move with unknown start position - ignore it
+                yield new_position, rapid
+                last_pos = new_position
+                continue
+            distance = new_position.sub(last_pos).norm
+            if moved_distance + distance > max_movement:
+                partial = (max_movement - moved_distance) / distance
+                partial_dest = last_pos.add(new_position.sub(last_pos).mul(
+                        partial))
+                yield partial_dest, rapid
+                # we are finished
+                return
+            yield new_position, rapid
+            moved_distance += distance
+            last_pos = new_position
+
+    def get_moves(self, safety_height, max_movement=None):
+        """ return the sequence of moves (see "iter_moves")
+
+        Columnar toolpaths return a MoveArrays object (see
+        pycam.Toolpath.PathArrays). It behaves like a list of moves, but the
+        Point objects are created on demand.
+        """
+        if self.is_columnar():
+            moves = self._paths.get_moves(number(safety_height),
+                    self._max_safe_distance)
+            if not max_movement is None:
+                moves = moves.get_truncated(max_movement)
+            return moves
+        else:
+            return list(self._iter_moves(safety_height, max_movement))
+
+    def get_move_statistics(self, safety_height=0.0):
+        """ calculate the length, the machine time and the bounds of all moves
+        (including the moves to and from the safety height)
+
+        The result is calculated in a single pass over all moves and it is
+        cached until the paths are changed.
+
+        @value safety_height: the safety height configured for this toolpath
+        @type safety_height: float
+        @returns: a dictionary with the keys "distance", "machine_time" (in
+            minutes), "minx", "maxx", "miny", "maxy", "minz" and "maxz" (the
+            limits are None for an empty toolpath)
+        @rtype: dict
+        """
+        safety_height = number(safety_height)
+        if safety_height in self._move_statistics:
+            return dict(self._move_statistics[safety_height])
+        minx = miny = minz = maxx = maxy = maxz = None
+        if self.is_columnar():
+            moves = self.get_moves(safety_height)
+            distance = float(moves.get_distances().sum())
+            if len(moves) > 0:
+                (minx, miny, minz) = moves.positions.min(axis=0).tolist()
+                (maxx, maxy, maxz) = moves.positions.max(axis=0).tolist()
+        else:
+            distance = 0
+            last_pos = None
+            for new_pos, rapid in self._iter_all_moves(safety_height):
+                if last_pos is None:
+                    minx = maxx = new_pos.x
+                    miny = maxy = new_pos.y
+                    minz = maxz = new_pos.z
+                else:
+                    distance += new_pos.sub(last_pos).norm
+                    minx = min(minx, new_pos.x)
+                    maxx = max(maxx, new_pos.x)
+                    miny = min(miny, new_pos.y)
+                    maxy = max(maxy, new_pos.y)
+                    minz = min(minz, new_pos.z)
+                    maxz = max(maxz, new_pos.z)
+                last_pos = new_pos
+        statistics = {"distance": distance,
+                "machine_time": distance / self._feedrate,
+                "minx": minx, "maxx": maxx,
+                "miny": miny, "maxy": maxy,
+                "minz": minz, "maxz": maxz}
+        self._move_statistics[safety_height] = statistics
+        return dict(statistics)
 
     def get_machine_time(self, safety_height=0.0):
         """ calculate an estimation of the time required for processing the
@@ -200,26 +366,80 @@ class Toolpath(object):
         @rtype: float
         @returns: the machine time used for processing the toolpath in minutes
         """
-        result = 0
-        safety_height = number(safety_height)
-        current_position = None
-        # go through all points of the path
-        for new_pos, rapid in self.get_moves(safety_height):
-            if not current_position is None:
-                result += new_pos.sub(current_position).norm / self._feedrate
-            current_position = new_pos
-        return result
+        return self.get_move_statistics(safety_height)["machine_time"]
 
     def get_machine_movement_distance(self, safety_height=0.0):
-        result = 0
-        safety_height = number(safety_height)
-        current_position = None
-        # go through all points of the path
-        for new_pos, rapid in self.get_moves(safety_height):
-            if not current_position is None:
-                result += new_pos.sub(current_position).norm
-            current_position = new_pos
-        return result
+        return self.get_move_statistics(safety_height)["distance"]
+
+    def simplify(self, tolerance=None):
+        """ remove redundant points from all paths (see "simplify_toolpath")
+        """
+        if self.is_columnar():
+            self.paths = self._paths.get_simplified(tolerance)
+        else:
+            for path in self._paths:
+                simplify_toolpath(path, tolerance=tolerance)
+            self.reset_cache()
+
+    def optimize_path_order(self, safety_height=0.0, allow_reverse=False,
+            time_budget=PATH_ORDER_TIME_BUDGET, callback=None):
+        """ reorder the paths within each layer in order to reduce the
+        length of the rapid moves (see pycam.Toolpath.PathOrder)
+
+        The order is kept, if the machine time would not be reduced.
+
+        @value safety_height: the safety height configured for this toolpath
+        @type safety_height: float
+        @value allow_reverse: paths may be reversed (this changes the milling
+            style)
+        @type allow_reverse: bool
+        @value time_budget: the maximum time (in seconds) spent for improving
+            the order after the initial nearest neighbour search
+        @type time_budget: float
+        @value callback: a function for progress updates - returning True
+            stops the improvement of the order
+        @returns: the machine time (in minutes) before and after the
+            optimization
+        @rtype: tuple(float)
+        """
+        time_before = self.get_machine_time(safety_height)
+        if get_layered_path_order is None:
+            log.warn("The optimization of the toolpath order requires the " \
+                    + "python package 'numpy'")
+            return time_before, time_before
+        original_paths = self._paths
+        if self.is_columnar():
+            path_indices, starts, ends, lows, highs = \
+                    self._paths.get_path_endpoints()
+        else:
+            paths = [path for path in self._paths if path.points]
+            starts = [(p.points[0].x, p.points[0].y, p.points[0].z)
+                    for p in paths]
+            ends = [(p.points[-1].x, p.points[-1].y, p.points[-1].z)
+                    for p in paths]
+            lows = [min([point.z for point in p.points]) for p in paths]
+            highs = [max([point.z for point in p.points]) for p in paths]
+        order, flipped = get_layered_path_order(starts, ends, lows, highs,
+                allow_reverse=allow_reverse, time_budget=time_budget,
+                callback=callback)
+        if self.is_columnar():
+            self.paths = self._paths.get_reordered(
+                    [path_indices[index] for index in order], flipped)
+        else:
+            new_paths = []
+            for index, flip in zip(order, flipped):
+                if flip:
+                    new_path = Path()
+                    new_path.points = paths[index].points[::-1]
+                    new_paths.append(new_path)
+                else:
+                    new_paths.append(paths[index])
+            self.paths = new_paths
+        time_after = self.get_machine_time(safety_height)
+        if time_after >= time_before:
+            self.paths = original_paths
+            time_after = time_before
+        return time_before, time_after
 
     def get_cropped_copy(self, polygons, callback=None):
         # create a deep copy of the current toolpath
@@ -248,28 +468,41 @@ class Toolpath(object):
                 new_open_lines.extend(outer)
             open_lines = new_open_lines
         # turn all "inner_lines" into toolpath moves
+        # The start points of the lines are stored in a spatial hash. Thus the
+        # next connected line is found without scanning all remaining lines.
+        starts = {}
+        for index, line in enumerate(inner_lines):
+            starts.setdefault(get_hash_key(line.p1), []).append(index)
+        used = [False] * len(inner_lines)
+        def get_connected_line(end):
+            # the first unused line starting at the given point
+            result = None
+            for key in get_hash_keys_near(end):
+                for index in starts.get(key, ()):
+                    if (not used[index]) and (inner_lines[index].p1 == end) \
+                            and ((result is None) or (index < result)):
+                        result = index
+            return result
         new_paths = []
         current_path = Path()
-        if inner_lines:
-            line = inner_lines.pop(0)
-            current_path.append(line.p1)
-            current_path.append(line.p2)
-        while inner_lines:
+        first_unused = 0
+        for count in range(len(inner_lines)):
             if callback and callback():
                 return
-            end = current_path.points[-1]
-            # look for the next connected point
-            for line in inner_lines:
-                if line.p1 == end:
-                    inner_lines.remove(line)
-                    current_path.append(line.p2)
-                    break
-            else:
-                new_paths.append(current_path)
-                current_path = Path()
-                line = inner_lines.pop(0)
-                current_path.append(line.p1)
-                current_path.append(line.p2)
+            index = None
+            if current_path.points:
+                # look for the next connected point
+                index = get_connected_line(current_path.points[-1])
+            if index is None:
+                if current_path.points:
+                    new_paths.append(current_path)
+                    current_path = Path()
+                while used[first_unused]:
+                    first_unused += 1
+                index = first_unused
+                current_path.append(inner_lines[index].p1)
+            used[index] = True
+            current_path.append(inner_lines[index].p2)
         if current_path.points:
             new_paths.append(current_path)
         self.paths = new_paths
@@ -24,7 +24,10 @@ import pycam.Utils.log
 import pycam.Utils
 # multiprocessing is imported later
 #import multiprocessing
+import traceback
+import collections
 import Queue
+import pickle
 import signal
 import socket
 import platform
@@ -39,19 +42,19 @@ log = pycam.Utils.log.get_logger()
 
 
 try:
-    from multiprocessing.managers import SyncManager as __SyncManager
+    from multiprocessing.managers import SyncManager as _SyncManager
 except ImportError:
     pass
 else:
     # this class definition needs to be at the top level - for pyinstaller
-    class TaskManager(__SyncManager):
+    class TaskManager(_SyncManager):
         @classmethod
         def _run_server(cls, *args):
             # make sure that the server ignores SIGINT (KeyboardInterrupt)
             signal.signal(signal.SIGINT, signal.SIG_IGN)
             # prevent connection errors to trigger exceptions
             try:
-                __SyncManager._run_server(*args)
+                _SyncManager._run_server(*args)
             except socket.error:
                 pass
 
@@ -70,11 +73,25 @@ __multiprocessing = None
 __num_of_processes = None
 
 __manager = None
+__manager_proxies = None
 __closing = None
+__spawner = None
+__local_pool = None
 __task_source_uuid = None
-__finished_jobs = []
 __issued_warnings = []
 
+# maximum number of tasks transferred to a worker at once
+MAX_TASK_BATCH_SIZE = 1024
+# the size of a batch of tasks is adjusted to this processing time (seconds)
+TARGET_BATCH_DURATION = 0.1
+# number of task batches per worker that are queued in advance
+QUEUED_BATCHES_PER_WORKER = 2
+# maximum number of cacheable arguments kept by every local worker
+MAX_CACHED_ITEMS_PER_WORKER = 8
+# interval for checking cancel requests and the shutdown of the pool
+# (this does not delay the delivery of tasks or results)
+POLL_INTERVAL = 0.5
+
 
 def run_in_parallel(*args, **kwargs):
     global __manager
@@ -135,35 +152,47 @@ def get_pool_statistics():
     if __manager is None:
         return []
     else:
-        return __manager.statistics().get_worker_statistics()
+        return _get_manager_proxies()["statistics"].get_worker_statistics()
 
 def get_task_statistics():
     global __manager
     result = {}
     if not __manager is None:
+        proxies = _get_manager_proxies()
         try:
-            result["tasks"] = __manager.tasks().qsize()
-            result["results"] = __manager.results().qsize()
+            result["tasks"] = proxies["tasks"].qsize()
         except NotImplementedError:
             # this can happen on MacOS (see multiprocessing doc)
             pass
-        result["pending"] = __manager.pending_tasks().length()
-        result["cache"] = __manager.cache().length()
+        result["results"] = proxies["job_results"].length()
+        result["pending"] = proxies["pending_tasks"].length()
+        result["cache"] = proxies["cache"].length()
     return result
 
+def _get_manager_proxies():
+    """ The creation of a proxy for a shared object takes quite some time.
+    Thus the proxies are kept for all following jobs.
+    """
+    global __manager, __manager_proxies
+    if __manager_proxies is None:
+        __manager_proxies = dict([(name, getattr(__manager, name)())
+                for name in ("tasks", "job_results", "statistics", "cache",
+                    "pending_tasks")])
+    return __manager_proxies
+
 class ManagerInfo(object):
     """ this separate class allows proper pickling for "multiprocesssing"
     """
-    def __init__(self, tasks, results, stats, cache, pending):
+    def __init__(self, tasks, job_results, stats, cache, pending):
         self.tasks_queue = tasks
-        self.results_queue = results
+        self.job_results = job_results
         self.statistics = stats
         self.cache = cache
         self.pending_tasks = pending
     def get_tasks_queue(self):
         return self.tasks_queue
-    def get_results_queue(self):
-        return self.results_queue
+    def get_job_results(self):
+        return self.job_results
     def get_statistics(self):
         return self.statistics
     def get_cache(self):
@@ -174,7 +203,7 @@ class ManagerInfo(object):
 def init_threading(number_of_processes=None, enable_server=False, remote=None,
         run_server=False, server_credentials="", local_port=DEFAULT_PORT):
     global __multiprocessing, __num_of_processes, __manager, __closing, \
-            __task_source_uuid
+            __spawner, __task_source_uuid
     if __multiprocessing:
         # kill the manager and clean everything up for a re-initialization
         cleanup()
@@ -285,21 +314,22 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None,
             address = (host, port)
         if remote is None:
             tasks_queue = multiprocessing.Queue()
-            results_queue = multiprocessing.Queue()
+            job_results = JobResults()
             statistics = ProcessStatistics()
             cache = ProcessDataCache()
             pending_tasks = PendingTasks()
-            info = ManagerInfo(tasks_queue, results_queue, statistics, cache,
+            info = ManagerInfo(tasks_queue, job_results, statistics, cache,
                     pending_tasks)
             TaskManager.register("tasks", callable=info.get_tasks_queue)
-            TaskManager.register("results", callable=info.get_results_queue)
+            TaskManager.register("job_results",
+                    callable=info.get_job_results)
             TaskManager.register("statistics", callable=info.get_statistics)
             TaskManager.register("cache", callable=info.get_cache)
             TaskManager.register("pending_tasks",
                     callable=info.get_pending_tasks)
         else:
             TaskManager.register("tasks")
-            TaskManager.register("results")
+            TaskManager.register("job_results")
             TaskManager.register("statistics")
             TaskManager.register("cache")
             TaskManager.register("pending_tasks")
@@ -320,35 +350,47 @@ def init_threading(number_of_processes=None, enable_server=False, remote=None,
             return "Failed to bind to socket for unknown reasons"
         # create the spawning process
         __closing = __manager.Value("b", False)
+        # create the proxies for the shared objects in advance
+        _get_manager_proxies()
         if __num_of_processes > 0:
             # only start the spawner, if we want to use local workers
-            spawner = __multiprocessing.Process(name="spawn",
+            __spawner = __multiprocessing.Process(name="spawn",
                     target=_spawn_daemon, args=(__manager, __num_of_processes,
                     worker_uuid_list))
-            spawner.start()
+            __spawner.start()
         else:
-            spawner = None
+            __spawner = None
         # wait forever - in case of a server
         if run_server:
             log.info("Running a local server and waiting for remote " + \
                     "connections.")
             # the server can be stopped via CTRL-C - it is caught later
-            if not spawner is None:
-                spawner.join()
+            if not __spawner is None:
+                __spawner.join()
 
 def cleanup():
-    global __multiprocessing, __manager, __closing
+    global __multiprocessing, __manager, __manager_proxies, __closing, \
+            __spawner, __local_pool
+    if not __local_pool is None:
+        log.debug("Shutting down local worker processes")
+        __local_pool.close()
+        __local_pool = None
+    # release the proxies while the manager is still available
+    __manager_proxies = None
     if __multiprocessing and __closing:
         log.debug("Shutting down process handler")
         try:
             __closing.set(True)
         except (IOError, EOFError):
             log.debug("Connection to manager lost during cleanup")
+        # release the proxy while the manager is still available
+        __closing = None
+        # wait for the spawner and the worker threads to go down
+        if not __spawner is None:
+            __spawner.join(2.5)
         # Only managers that were started via ".start()" implement a "shutdown".
         # Managers started via ".connect" may skip this.
         if hasattr(__manager, "shutdown"):
-            # wait for the spawner and the worker threads to go down
-            time.sleep(2.5)
             #__manager.shutdown()
             time.sleep(0.1)
             # check if it is still alive and kill it if necessary
@@ -356,14 +398,15 @@ def cleanup():
                 __manager._process.terminate()
     __manager = None
     __closing = None
+    __spawner = None
     __multiprocessing = None
 
 def _spawn_daemon(manager, number_of_processes, worker_uuid_list):
-    """ wait for items in the 'tasks' queue to appear and then spawn workers
+    """ start the workers and keep them alive until the pool is closed
     """
     global __multiprocessing, __closing
     tasks = manager.tasks()
-    results = manager.results()
+    job_results = manager.job_results()
     stats = manager.statistics()
     cache = manager.cache()
     pending_tasks = manager.pending_tasks()
@@ -373,27 +416,25 @@ def _spawn_daemon(manager, number_of_processes, worker_uuid_list):
     last_cache_update = time.time()
     # use only the hostname (for brevity) - no domain part
     hostname = platform.node().split(".", 1)[0]
+    workers = {}
     try:
         while not __closing.get():
             # check the expire timeout of the cache from time to time
             if last_cache_update + 30 < time.time():
                 cache.expire_cache_items()
                 last_cache_update = time.time()
-            if not tasks.empty():
-                workers = []
-                for task_id in worker_uuid_list:
-                    task_name = "%s-%s" % (hostname, task_id)
-                    worker = __multiprocessing.Process(
-                            name=task_name, target=_handle_tasks,
-                            args=(tasks, results, stats, cache,
-                                    pending_tasks, __closing))
-                    worker.start()
-                    workers.append(worker)
-                # wait until all workers are finished
-                for worker in workers:
-                    worker.join()
-            else:
-                time.sleep(1.0)
+            # The workers wait for tasks on their own. Thus we only need to
+            # (re)start them.
+            for task_id in worker_uuid_list:
+                if (task_id in workers) and workers[task_id].is_alive():
+                    continue
+                task_name = "%s-%s" % (hostname, task_id)
+                worker = __multiprocessing.Process(name=task_name,
+                        target=_handle_tasks, args=(tasks, job_results, stats,
+                                cache, pending_tasks, __closing))
+                worker.start()
+                workers[task_id] = worker
+            time.sleep(POLL_INTERVAL)
     except KeyboardInterrupt:
         log.info("Spawner daemon killed by keyboard interrupt")
         # set the "closing" flag and just exit
@@ -404,197 +445,263 @@ def _spawn_daemon(manager, number_of_processes, worker_uuid_list):
     except (IOError, EOFError):
         # the connection was closed
         log.info("Spawner daemon lost connection to server")
+    # wait until all workers are finished
+    for worker in workers.values():
+        worker.join()
+
+def _get_cached_value(item_id, local_cache, cache):
+    try:
+        return local_cache.get(item_id)
+    except KeyError:
+        # TODO: we will break hard, if the item is expired
+        value = cache.get(item_id)
+        local_cache.add(item_id, value)
+        return value
+
+def _get_real_args(args, local_cache, cache):
+    """ replace all references to cached items with their real values
+    """
+    real_args = []
+    for arg in args:
+        if isinstance(arg, ProcessDataCacheItemID):
+            real_args.append(_get_cached_value(arg, local_cache, cache))
+        elif isinstance(arg, (list, tuple)) and [True for item in arg \
+                if isinstance(item, ProcessDataCacheItemID)]:
+            # check if any item in the list is cacheable
+            args_list = []
+            for item in arg:
+                if isinstance(item, ProcessDataCacheItemID):
+                    args_list.append(_get_cached_value(item, local_cache,
+                            cache))
+                else:
+                    args_list.append(item)
+            if isinstance(arg, tuple):
+                args_list = tuple(args_list)
+            real_args.append(args_list)
+        else:
+            real_args.append(arg)
+    return real_args
 
-def _handle_tasks(tasks, results, stats, cache, pending_tasks, closing):
+def _handle_tasks(tasks, job_results, stats, cache, pending_tasks, closing):
     global __multiprocessing
     name = __multiprocessing.current_process().name
     local_cache = ProcessDataCache()
-    timeout_limit = 60
-    timeout_counter = 0
     last_worker_notification = 0
     log.debug("Worker thread started: %s" % name)
     try:
-        while (timeout_counter < timeout_limit) and not closing.get():
+        while not closing.get():
             if last_worker_notification + 30 < time.time():
                 stats.worker_notification(name)
                 last_worker_notification = time.time()
-            start_time = time.time()
+            # wait for the next batch of tasks (without delay)
             try:
-                job_id, task_id, func, args = tasks.get(timeout=0.2)
+                job_id, batch_id, func, batch = tasks.get(
+                        timeout=POLL_INTERVAL)
             except Queue.Empty:
-                time.sleep(1.8)
-                timeout_counter += 1
+                continue
+            start_time = time.time()
+            if not job_results.is_open(job_id):
+                # the job was finished or cancelled meanwhile
                 continue
             # TODO: if the client aborts/disconnects between "tasks.get" and
             # "pending_tasks.add", the task is lost. We should better use some
             # backup.
-            pending_tasks.add(job_id, task_id, (func, args))
-            log.debug("Worker %s processes %s / %s" % (name, job_id, task_id))
-            # reset the timeout counter, if we found another item in the queue
-            timeout_counter = 0
-            real_args = []
-            for arg in args:
-                if isinstance(arg, ProcessDataCacheItemID):
-                    try:
-                        value = local_cache.get(arg)
-                    except KeyError:
-                        # TODO: we will break hard, if the item is expired
-                        value = cache.get(arg)
-                        local_cache.add(arg, value)
-                    real_args.append(value)
-                elif isinstance(arg, list) and [True for item in arg \
-                        if isinstance(item, ProcessDataCacheItemID)]:
-                    # check if any item in the list is cacheable
-                    args_list = []
-                    for item in arg:
-                        if isinstance(item, ProcessDataCacheItemID):
-                            try:
-                                value = local_cache.get(item)
-                            except KeyError:
-                                value = cache.get(item)
-                                local_cache.add(item, value)
-                            args_list.append(value)
-                        else:
-                            args_list.append(item)
-                    real_args.append(args_list)
-                else:
-                    real_args.append(arg)
+            pending_tasks.add(job_id, batch_id, (func, batch))
+            log.debug("Worker %s processes %s / %s (%d tasks)" \
+                    % (name, job_id, batch_id, len(batch[1])))
+            real_batch = _get_real_batch(batch, local_cache, cache)
             stats.add_transfer_time(name, time.time() - start_time)
             start_time = time.time()
-            results.put((job_id, task_id, func(real_args)))
-            pending_tasks.remove(job_id, task_id)
-            stats.add_process_time(name, time.time() - start_time)
+            results = [(task_id, func(real_args))
+                    for task_id, real_args in real_batch]
+            duration = time.time() - start_time
+            job_results.put(job_id, (duration, results))
+            pending_tasks.remove(job_id, batch_id)
+            stats.add_process_time(name, duration, count=len(results))
     except KeyboardInterrupt:
         pass
-    log.debug("Worker thread finished after %d seconds of inactivity: %s" \
-            % (timeout_counter, name))
+    except (IOError, EOFError):
+        # the connection was closed
+        pass
+    log.debug("Worker thread finished: %s" % name)
+
+def _get_real_batch(batch, local_cache, cache):
+    """ return the tasks of a batch (see TaskBatches) with the real values
+    of all arguments (including the shared ones)
+    """
+    shared_args, tasks = batch
+    shared_values = _get_real_args([value for position, value in shared_args],
+            local_cache, cache)
+    real_batch = []
+    for task_id, args, args_type in tasks:
+        if args_type is None:
+            # the argument was not split (see TaskBatches)
+            real_batch.append((task_id, args))
+            continue
+        real_args = _get_real_args(args, local_cache, cache)
+        # the positions are sorted in ascending order
+        for (position, value), real_value in zip(shared_args, shared_values):
+            real_args.insert(position, real_value)
+        real_batch.append((task_id, args_type(real_args)))
+    return real_batch
+
+def _get_cached_item_ids(batch):
+    """ return the references to all cached items used by a batch of tasks
+    """
+    shared_args, tasks = batch
+    result = []
+    all_args = [[value for position, value in shared_args]] \
+            + [args for task_id, args, args_type in tasks
+                if not args_type is None]
+    for args in all_args:
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                items = arg
+            else:
+                items = [arg]
+            for item in items:
+                if isinstance(item, ProcessDataCacheItemID) and \
+                        not item.value in [known.value for known in result]:
+                    result.append(item)
+    return result
+
+def _get_cacheable_args(args, remote_cache, job_id):
+    """ move all cacheable arguments (having an "uuid" attribute) to the
+    remote cache and return a list of references instead
+    """
+    result_args = []
+    for arg in args:
+        # add the argument to the cache if possible
+        if hasattr(arg, "uuid"):
+            data_uuid = ProcessDataCacheItemID(arg.uuid)
+            if not remote_cache.contains(data_uuid):
+                log.debug("Adding cache item for job %s: %s - %s" % \
+                        (job_id, arg.uuid, arg.__class__))
+                remote_cache.add(data_uuid, arg)
+            result_args.append(data_uuid)
+        elif isinstance(arg, (list, set, tuple)):
+            # a list with - maybe containing cacheable items
+            new_arg_list = []
+            for item in arg:
+                try:
+                    data_uuid = ProcessDataCacheItemID(item.uuid)
+                except AttributeError:
+                    # non-cacheable item
+                    new_arg_list.append(item)
+                    continue
+                if not remote_cache.contains(data_uuid):
+                    log.debug("Adding cache item from list for " \
+                            + "job %s: %s - %s" \
+                            % (job_id, item.uuid, item.__class__))
+                    remote_cache.add(data_uuid, item)
+                new_arg_list.append(data_uuid)
+            if not [True for item in new_arg_list
+                    if isinstance(item, ProcessDataCacheItemID)]:
+                # keep the original argument (including its type)
+                result_args.append(arg)
+            elif isinstance(arg, tuple):
+                result_args.append(tuple(new_arg_list))
+            else:
+                result_args.append(new_arg_list)
+        else:
+            result_args.append(arg)
+    return result_args
 
 def run_in_parallel_remote(func, args_list, unordered=False,
         disable_multiprocessing=False, callback=None):
     global __multiprocessing, __num_of_processes, __manager, \
-            __task_source_uuid, __finished_jobs
+            __task_source_uuid
     if __multiprocessing is None:
         # threading was not configured before
         init_threading()
     if __multiprocessing and not disable_multiprocessing:
         job_id = str(uuid.uuid1())
         log.debug("Starting parallel tasks: %s" % job_id)
-        tasks_queue = __manager.tasks()
-        results_queue = __manager.results()
-        remote_cache = __manager.cache()
-        stats = __manager.statistics()
-        pending_tasks = __manager.pending_tasks()
-        # add all tasks of this job to the queue
-        for index, args in enumerate(args_list):
-            if callback:
-                callback()
-            start_time = time.time()
-            result_args = []
-            for arg in args:
-                # add the argument to the cache if possible
-                if hasattr(arg, "uuid"):
-                    data_uuid = ProcessDataCacheItemID(arg.uuid)
-                    if not remote_cache.contains(data_uuid):
-                        log.debug("Adding cache item for job %s: %s - %s" % \
-                                (job_id, arg.uuid, arg.__class__))
-                        remote_cache.add(data_uuid, arg)
-                    result_args.append(data_uuid)
-                elif isinstance(arg, (list, set, tuple)):
-                    # a list with - maybe containing cacheable items
-                    new_arg_list = []
-                    for item in arg:
-                        try:
-                            data_uuid = ProcessDataCacheItemID(item.uuid)
-                        except AttributeError:
-                            # non-cacheable item
-                            new_arg_list.append(item)
-                            continue
-                        if not remote_cache.contains(data_uuid):
-                            log.debug("Adding cache item from list for " \
-                                    + "job %s: %s - %s" \
-                                    % (job_id, item.uuid, item.__class__))
-                            remote_cache.add(data_uuid, item)
-                        new_arg_list.append(data_uuid)
-                    result_args.append(new_arg_list)
-                else:
-                    result_args.append(arg)
-            tasks_queue.put((job_id, index, func, result_args))
-            stats.add_queueing_time(__task_source_uuid,
-                    time.time() - start_time)
-        log.debug("Added %d tasks for job %s" % (len(args_list), job_id))
+        proxies = _get_manager_proxies()
+        tasks_queue = proxies["tasks"]
+        job_results = proxies["job_results"]
+        remote_cache = proxies["cache"]
+        stats = proxies["statistics"]
+        pending_tasks = proxies["pending_tasks"]
+        job_results.open(job_id)
+        number_of_workers = max(1, __num_of_processes,
+                len(stats.get_worker_statistics()))
+        batches = TaskBatches(args_list, number_of_workers,
+                lambda args: _get_cacheable_args(args, remote_cache, job_id))
+        # limit the number of queued batches (reduces the memory usage of the
+        # queue and allows early cancelling)
+        max_queued_batches = QUEUED_BATCHES_PER_WORKER * number_of_workers
+        next_batch = 0
+        received_batches = 0
         result_buffer = {}
         index = 0
         cancelled = False
-        # wait for all results of this job
-        while (index < len(args_list)) and not cancelled:
-            if callback and callback():
-                # cancel requested
-                cancelled = True
-                break
-            # re-inject stale tasks if necessary
-            stale_task = pending_tasks.get_stale_task()
-            if stale_task:
-                stale_job_id, stale_task_id = stale_task[:2]
-                if stale_job_id in __finished_jobs:
-                    log.debug("Throwing away stale task of an old " + \
-                            "job: %s" % stale_job_id)
-                    pending_tasks.remove(stale_job_id, stale_task_id)
-                elif stale_job_id == job_id:
-                    log.debug("Reinjecting stale task: %s / %s" % \
-                            (job_id, stale_task_id))
-                    stale_func, stale_args = stale_task[2]
-                    tasks_queue.put((job_id, stale_task_id, stale_func,
-                            stale_args))
-                    pending_tasks.remove(job_id, stale_task_id)
-                else:
-                    # non-local task
-                    log.debug("Ignoring stale non-local task: %s / %s" \
-                            % (stale_job_id, stale_task_id))
-            try:
-                result_job_id, task_id, result = results_queue.get(
-                        timeout=1.0)
-            except Queue.Empty:
-                time.sleep(1.0)
-                continue
-            if result_job_id == job_id:
-                log.debug("Received the result of a task: %s / %s" % \
-                        (job_id, task_id))
-                try:
+        try:
+            while (index < batches.get_number_of_tasks()) \
+                    or not batches.is_finished():
+                if callback and callback():
+                    # cancel requested
+                    cancelled = True
+                    break
+                # add more tasks of this job to the queue
+                while (not batches.is_finished()) and \
+                        (next_batch - received_batches < max_queued_batches):
+                    start_time = time.time()
+                    batch = batches.get_next_batch()
+                    tasks_queue.put((job_id, next_batch, func, batch))
+                    stats.add_queueing_time(__task_source_uuid,
+                            time.time() - start_time)
+                    next_batch += 1
+                # re-inject stale tasks if necessary
+                stale_task = pending_tasks.get_stale_task()
+                if stale_task:
+                    stale_job_id, stale_batch_id = stale_task[:2]
+                    if not job_results.is_open(stale_job_id):
+                        log.debug("Throwing away stale task of an old " + \
+                                "job: %s" % stale_job_id)
+                        pending_tasks.remove(stale_job_id, stale_batch_id)
+                    elif stale_job_id == job_id:
+                        log.debug("Reinjecting stale task: %s / %s" % \
+                                (job_id, stale_batch_id))
+                        stale_func, stale_batch = stale_task[2]
+                        tasks_queue.put((job_id, stale_batch_id, stale_func,
+                                stale_batch))
+                        pending_tasks.remove(job_id, stale_batch_id)
+                    else:
+                        # non-local task
+                        log.debug("Ignoring stale non-local task: %s / %s" \
+                                % (stale_job_id, stale_batch_id))
+                # wait for the next results of this job
+                received = job_results.get(job_id, POLL_INTERVAL)
+                if received is None:
+                    continue
+                duration, results = received
+                batches.add_duration(len(results), duration)
+                received_batches += 1
+                log.debug("Received the results of %d tasks: %s" % \
+                        (len(results), job_id))
+                for task_id, result in results:
                     if unordered:
                         # just return the values in any order
                         yield result
                         index += 1
-                    else:
+                    elif task_id == index:
                         # return the results in order (based on task_id)
-                        if task_id == index:
-                            yield result
+                        yield result
+                        index += 1
+                        while index in result_buffer:
+                            yield result_buffer.pop(index)
                             index += 1
-                            while index in result_buffer.keys():
-                                yield result_buffer[index]
-                                del result_buffer[index]
-                                index += 1
-                        else:
-                            result_buffer[task_id] = result
-                except GeneratorExit:
-                    # This exception is triggered when the caller stops
-                    # requesting more items from the generator.
-                    log.debug("Parallel processing cancelled: %s" % job_id)
-                    _cleanup_job(job_id, tasks_queue, pending_tasks,
-                            __finished_jobs)
-                    # re-raise the GeneratorExit exception to finish destruction
-                    raise
-            elif result_job_id in __finished_jobs:
-                # throw away this result of an old job
-                log.debug("Throwing away one result of an old job: %s" % \
-                        result_job_id)
-            else:
-                log.debug("Skipping result of non-local job: %s" % \
-                        result_job_id)
-                # put the result back to the queue for the next manager
-                results_queue.put((result_job_id, task_id, result))
-                # wait a little bit to get some idle CPU cycles
-                time.sleep(0.2)
-        _cleanup_job(job_id, tasks_queue, pending_tasks, __finished_jobs)
+                    else:
+                        result_buffer[task_id] = result
+        except GeneratorExit:
+            # This exception is triggered when the caller stops
+            # requesting more items from the generator.
+            log.debug("Parallel processing cancelled: %s" % job_id)
+            _cleanup_job(job_id, job_results, pending_tasks)
+            # re-raise the GeneratorExit exception to finish destruction
+            raise
+        _cleanup_job(job_id, job_results, pending_tasks)
         if cancelled:
             log.debug("Parallel processing cancelled: %s" % job_id)
         else:
@@ -603,34 +710,12 @@ def run_in_parallel_remote(func, args_list, unordered=False,
         for args in args_list:
             yield func(args)
 
-def _cleanup_job(job_id, tasks_queue, pending_tasks, finished_jobs):
-    # flush the task queue
-    try:
-        queue_len = tasks_queue.qsize()
-    except NotImplementedError:
-        # this can happen on MacOS (according to the multiprocessing doc)
-        # -> no cleanup of old processes
-        queue_len = 0
-    # remove all remaining tasks with the current job id
-    removed_job_counter = 0
-    for index in range(queue_len):
-        try:
-            this_job_id, task_id, func, args = tasks_queue.get(timeout=0.1)
-        except Queue.Empty:
-            break
-        if this_job_id != job_id:
-            tasks_queue.put((this_job_id, task_id, func, args))
-        else:
-            removed_job_counter += 1
-    if removed_job_counter > 0:
-        log.debug("Removed %d remaining tasks for %s" % (removed_job_counter,
-                job_id))
+def _cleanup_job(job_id, job_results, pending_tasks):
+    # Remaining tasks of this job are skipped by the workers and late results
+    # are discarded.
+    job_results.close(job_id)
     # remove all stale tasks
     pending_tasks.remove(job_id)
-    # limit the number of stored finished jobs
-    finished_jobs.append(job_id)
-    while len(finished_jobs) > 30:
-        finished_jobs.pop(0)
 
 
 def run_in_parallel_local(func, args, unordered=False,
@@ -640,31 +725,345 @@ def run_in_parallel_local(func, args, unordered=False,
         # threading was not configured before
         init_threading()
     if __multiprocessing and not disable_multiprocessing:
-        # use the number of CPUs as the default number of worker threads
-        pool = __multiprocessing.Pool(__num_of_processes)
-        if unordered:
-            imap_func = pool.imap_unordered
+        # the pool of worker processes is kept for all following jobs
+        for result in _get_local_pool().run(func, args, unordered=unordered,
+                callback=callback):
+            yield result
+    else:
+        for arg in args:
+            if callback and callback():
+                # cancel requested
+                break
+            yield func(arg)
+
+def _get_local_pool():
+    global __multiprocessing, __num_of_processes, __local_pool
+    if __local_pool is None:
+        __local_pool = LocalWorkerPool(__multiprocessing, __num_of_processes)
+    return __local_pool
+
+def _handle_local_tasks(tasks, results, worker_index):
+    # the main process is responsible for handling KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # the main process decides about the content of this cache
+    local_cache = ProcessDataCache(timeout=None)
+    while True:
+        item = tasks.get()
+        if item is None:
+            # the pool is closed
+            break
+        action = item[0]
+        if action == "add":
+            local_cache.add(item[1], item[2])
+        elif action == "remove":
+            local_cache.remove(item[1])
         else:
-            imap_func = pool.imap
-        # We need to use try/finally here to ensure the garbage collection
-        # of "pool". Otherwise a memory overflow is caused for Python 2.7.
+            job_id, batch_id, func, batch = item[1:]
+            start_time = time.time()
+            try:
+                job_results = [(task_id, func(real_args))
+                        for task_id, real_args in _get_real_batch(batch,
+                            local_cache, None)]
+                error = None
+            except Exception, error:
+                log.error("Failed to process a task: %s" % \
+                        traceback.format_exc())
+                job_results = None
+                try:
+                    pickle.dumps(error)
+                except Exception:
+                    # the original exception can't be transferred
+                    error = RuntimeError(str(error))
+            results.put((worker_index, job_id, batch_id, job_results,
+                    time.time() - start_time, error))
+
+
+class LocalWorkerPool(object):
+    """ A pool of local worker processes, that is kept alive for all jobs.
+
+    In contrast to multiprocessing.Pool every worker has its own queue of
+    tasks. Thus we know which cacheable arguments (objects with an "uuid"
+    attribute - e.g. models and cutters) are available for every worker.
+    These arguments are transferred only once to every worker.
+    """
+
+    def __init__(self, multiprocessing, number_of_processes):
+        self._multiprocessing = multiprocessing
+        self._results = multiprocessing.Queue()
+        self._workers = [None] * number_of_processes
+        # the cached items of every worker (in the order of their transfer)
+        self._worker_items = [None] * number_of_processes
+        # the batches of tasks, that are waiting to be processed by a worker
+        self._assigned_batches = [None] * number_of_processes
+        for index in range(number_of_processes):
+            self._start_worker(index)
+        # results of the currently running jobs, that were not requested yet
+        self._job_results = {}
+
+    def _start_worker(self, index):
+        tasks = self._multiprocessing.Queue()
+        worker = self._multiprocessing.Process(name="worker-%d" % index,
+                target=_handle_local_tasks,
+                args=(tasks, self._results, index))
+        worker.daemon = True
+        worker.start()
+        self._workers[index] = (worker, tasks)
+        self._worker_items[index] = []
+        self._assigned_batches[index] = {}
+
+    def close(self):
+        for worker, tasks in self._workers:
+            tasks.put(None)
+        for worker, tasks in self._workers:
+            worker.join(1.0)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+            if worker.exitcode != 0:
+                # Don't wait for the transfer of remaining items. Otherwise a
+                # dead worker would block the main process.
+                tasks.cancel_join_thread()
+            # The feeder thread of the queue must finish before the
+            # interpreter exits. Otherwise it fails during the shutdown.
+            tasks.close()
+            tasks.join_thread()
+        self._results.close()
+        self._results.join_thread()
+
+    def _send_batch(self, index, job_id, batch_id, func, batch, items):
+        worker, tasks = self._workers[index]
+        worker_items = self._worker_items[index]
+        item_ids = [item_id.value for item_id in _get_cached_item_ids(batch)]
+        for item_id in item_ids:
+            if not item_id in worker_items:
+                tasks.put(("add", item_id, items.get(item_id)))
+                worker_items.append(item_id)
+        # remove the oldest items - except for the ones used by this batch
+        for item_id in list(worker_items):
+            if len(worker_items) <= MAX_CACHED_ITEMS_PER_WORKER:
+                break
+            if not item_id in item_ids:
+                tasks.put(("remove", item_id))
+                worker_items.remove(item_id)
+        tasks.put(("tasks", job_id, batch_id, func, batch))
+        self._assigned_batches[index][(job_id, batch_id)] = \
+                (func, batch, items)
+
+    def _check_workers(self):
+        """ restart dead workers and send their unfinished tasks again """
+        for index, (worker, tasks) in enumerate(self._workers):
+            if worker.is_alive():
+                continue
+            log.info("Restarting a dead worker process: %s" % worker.name)
+            # the remaining items of the old queue can't be delivered anymore
+            tasks.cancel_join_thread()
+            unfinished = self._assigned_batches[index]
+            self._start_worker(index)
+            for (job_id, batch_id), (func, batch, items) in \
+                    unfinished.iteritems():
+                if job_id in self._job_results:
+                    self._send_batch(index, job_id, batch_id, func, batch,
+                            items)
+
+    def _receive(self, job_id, timeout):
+        """ return the next results of the given job (results, duration and
+        error) or None
+        """
+        job_results = self._job_results[job_id]
+        while not job_results:
+            try:
+                worker_index, result_job_id, batch_id, results, duration, \
+                        error = self._results.get(timeout=timeout)
+            except Queue.Empty:
+                self._check_workers()
+                return None
+            self._assigned_batches[worker_index].pop((result_job_id,
+                    batch_id), None)
+            if result_job_id in self._job_results:
+                self._job_results[result_job_id].append((results, duration,
+                        error))
+            else:
+                # this job was closed (e.g. cancelled) - discard the results
+                pass
+        return job_results.pop(0)
+
+    def _get_number_of_queued_batches(self, index):
+        return len(self._assigned_batches[index])
+
+    def run(self, func, args_list, unordered=False, callback=None):
+        job_id = str(uuid.uuid1())
+        # collect the cacheable items of this job
+        items = ProcessDataCache(timeout=None)
+        number_of_workers = len(self._workers)
+        batches = TaskBatches(args_list, number_of_workers,
+                lambda args: _get_cacheable_args(args, items, job_id))
+        self._job_results[job_id] = []
+        next_batch = 0
+        result_buffer = {}
+        index = 0
         try:
-            # Beware: we may not return "pool.imap" or "pool.imap_unordered"
-            # directly. It would somehow loose the focus and just hang infinitely.
-            # Thus we wrap our own generator around it.
-            for result in imap_func(func, args):
+            while (index < batches.get_number_of_tasks()) \
+                    or not batches.is_finished():
                 if callback and callback():
                     # cancel requested
                     break
-                yield result
+                # fill the queues of the workers
+                while not batches.is_finished():
+                    worker_index = min(range(number_of_workers),
+                            key=self._get_number_of_queued_batches)
+                    if self._get_number_of_queued_batches(worker_index) \
+                            >= QUEUED_BATCHES_PER_WORKER:
+                        break
+                    self._send_batch(worker_index, job_id, next_batch, func,
+                            batches.get_next_batch(), items)
+                    next_batch += 1
+                received = self._receive(job_id, POLL_INTERVAL)
+                if received is None:
+                    continue
+                results, duration, error = received
+                if not error is None:
+                    raise error
+                batches.add_duration(len(results), duration)
+                for task_id, result in results:
+                    if unordered:
+                        # just return the values in any order
+                        yield result
+                        index += 1
+                    elif task_id == index:
+                        # return the results in order (based on task_id)
+                        yield result
+                        index += 1
+                        while index in result_buffer:
+                            yield result_buffer.pop(index)
+                            index += 1
+                    else:
+                        result_buffer[task_id] = result
         finally:
-            pool.terminate()
-    else:
-        for arg in args:
-            if callback and callback():
-                # cancel requested
+            # the remaining results of this job are discarded
+            del self._job_results[job_id]
+
+
+def _is_args_sequence(args):
+    """ only plain lists and tuples of arguments are split into items """
+    return type(args) in (list, tuple)
+
+
+class TaskBatches(object):
+    """ Split the arguments of a job into batches of tasks.
+
+    The arguments are retrieved from the given iterable only when they are
+    needed (plus a small look-ahead). Thus a generator of arguments is never
+    kept in memory completely.
+    Arguments, that are shared by all tasks of a batch (the same object at the
+    same position - e.g. the model or the cutter), are removed from the single
+    tasks and transferred only once per batch.
+    The size of the batches is adjusted to the measured processing time of
+    the tasks (see TARGET_BATCH_DURATION). Smaller batches are used at the
+    end of the job - otherwise the load would not be balanced.
+    A batch is a tuple of the shared arguments (a list of positions and
+    values) and the tasks (a list of task IDs, the remaining arguments and
+    their original type).
+    Only arguments of type list or tuple are split. All other arguments
+    are passed to the function unchanged (their type is None).
+    """
+
+    def __init__(self, args_list, number_of_workers, convert_args=None):
+        self._args_iter = iter(args_list)
+        self._pending_args = collections.deque()
+        self._all_args_fetched = False
+        self._number_of_workers = number_of_workers
+        if convert_args is None:
+            convert_args = list
+        self._convert_args = convert_args
+        self._next_task = 0
+        self._task_duration = None
+
+    def _fetch_args(self, count):
+        """ retrieve arguments until 'count' of them are waiting """
+        while (not self._all_args_fetched) \
+                and (len(self._pending_args) < count):
+            try:
+                self._pending_args.append(self._args_iter.next())
+            except StopIteration:
+                self._all_args_fetched = True
+
+    @staticmethod
+    def _get_shared_positions(args_list):
+        if len(args_list) < 2:
+            return []
+        first = args_list[0]
+        if not _is_args_sequence(first):
+            return []
+        positions = range(len(first))
+        for args in args_list[1:]:
+            if not _is_args_sequence(args) or (len(args) != len(first)):
+                return []
+            positions = [position for position in positions
+                    if args[position] is first[position]]
+            if not positions:
                 break
-            yield func(arg)
+        return positions
+
+    def get_number_of_tasks(self):
+        """ return the number of tasks that were handed out so far """
+        return self._next_task
+
+    def is_finished(self):
+        self._fetch_args(1)
+        return not self._pending_args
+
+    def add_duration(self, count, duration):
+        """ store the processing time of a number of tasks """
+        if count < 1:
+            return
+        task_duration = float(duration) / count
+        if self._task_duration is None:
+            self._task_duration = task_duration
+        else:
+            # smooth the variation of the processing time
+            self._task_duration = 0.5 * (self._task_duration + task_duration)
+
+    def _get_batch_size(self):
+        if self._task_duration is None:
+            # start with single tasks - the measurement is available soon
+            size = 1
+        elif self._task_duration <= 0:
+            size = MAX_TASK_BATCH_SIZE
+        else:
+            size = int(TARGET_BATCH_DURATION / self._task_duration)
+        size = max(1, min(size, MAX_TASK_BATCH_SIZE))
+        # every worker should get a few more batches
+        self._fetch_args(2 * self._number_of_workers * size)
+        if self._all_args_fetched:
+            limit = len(self._pending_args) // (2 * self._number_of_workers)
+            size = max(1, min(size, limit))
+        return size
+
+    def get_next_batch(self):
+        batch_args = []
+        for index in range(self._get_batch_size()):
+            if not self._pending_args:
+                break
+            batch_args.append(self._pending_args.popleft())
+        shared_positions = self._get_shared_positions(batch_args)
+        if shared_positions:
+            shared_values = self._convert_args([batch_args[0][position]
+                    for position in shared_positions])
+            shared_args = zip(shared_positions, shared_values)
+        else:
+            shared_args = []
+        tasks = []
+        for task_id, args in enumerate(batch_args, self._next_task):
+            if not _is_args_sequence(args):
+                tasks.append((task_id, args, None))
+                continue
+            args_type = type(args)
+            if shared_positions:
+                args = [arg for position, arg in enumerate(args)
+                        if not position in shared_positions]
+            tasks.append((task_id, self._convert_args(args), args_type))
+        self._next_task += len(batch_args)
+        return (shared_args, tasks)
 
 
 class OneProcess(object):
@@ -728,10 +1127,10 @@ class ProcessStatistics(object):
         self.processes[name].transfer_count += 1
         self.processes[name].transfer_time += amount
 
-    def add_process_time(self, name, amount):
+    def add_process_time(self, name, amount, count=1):
         if not name in self.processes.keys():
             self.processes[name] = OneProcess(name)
-        self.processes[name].process_count += 1
+        self.processes[name].process_count += count
         self.processes[name].process_time += amount
 
     def add_queueing_time(self, name, amount):
@@ -822,6 +1221,54 @@ class PendingTasks(object):
         return len(self._jobs)
 
 
+class JobResults(object):
+    """ A separate results queue for every job. The clients wait for the
+    results of their own jobs only. The results of closed (finished or
+    cancelled) jobs are discarded.
+    """
+
+    def __init__(self):
+        self._queues = {}
+
+    def open(self, job_id):
+        # we assume that multiprocessing was imported before
+        import multiprocessing
+        # Beware: a timeout for Queue.Queue.get is implemented via polling,
+        # while multiprocessing.Queue.get waits for its pipe.
+        if not job_id in self._queues:
+            self._queues[job_id] = multiprocessing.Queue()
+
+    def close(self, job_id):
+        # the queue is closed as soon as it is garbage collected
+        self._queues.pop(job_id, None)
+
+    def is_open(self, job_id):
+        return job_id in self._queues
+
+    def put(self, job_id, results):
+        try:
+            self._queues[job_id].put(results)
+        except KeyError:
+            # the job is closed
+            pass
+
+    def get(self, job_id, timeout):
+        """ wait for the next list of results of a job
+        Returns None if the timeout is exceeded (or the job is closed).
+        """
+        try:
+            return self._queues[job_id].get(timeout=timeout)
+        except (KeyError, Queue.Empty):
+            return None
+
+    def length(self):
+        try:
+            return sum([queue.qsize() for queue in self._queues.values()])
+        except NotImplementedError:
+            # this can happen on MacOS (see multiprocessing doc)
+            return 0
+
+
 class ProcessDataCache(object):
 
     def __init__(self, timeout=600):
@@ -839,6 +1286,9 @@ class ProcessDataCache(object):
             pass
 
     def expire_cache_items(self):
+        if self.timeout is None:
+            # the items never expire
+            return
         expired = time.time() - self.timeout
         for key in self.cache.keys():
             try:
@@ -862,6 +1312,11 @@ class ProcessDataCache(object):
         self.expire_cache_items()
         self.cache[name] = [value, now]
 
+    def remove(self, name):
+        if isinstance(name, ProcessDataCacheItemID):
+            name = name.value
+        self.cache.pop(name, None)
+
     def get(self, name):
         if isinstance(name, ProcessDataCacheItemID):
             name = name.value